@@ -5,56 +5,68 @@ from flask import Flask
 from dotenv import load_dotenv, find_dotenv
 import os
 
-# Find and load the .env file
-print("Debug - Current working directory:", os.getcwd())
-dotenv_path = find_dotenv(raise_error_if_not_found=True)
-print(f"Debug - Found .env at: {dotenv_path}")
-
-# Load environment variables with the found path
-success = load_dotenv(dotenv_path=dotenv_path, verbose=True, override=True)
-print(f"Debug - Load_dotenv success: {success}")
-print(f"Debug - Environment after loading:")
-print(f"Debug - OPENAI_API_KEY exists: {'OPENAI_API_KEY' in os.environ}")
-print(f"Debug - All environment variables:", list(os.environ.keys()))
+# Load a .env file if there is one; settings may also come from the environment
+load_dotenv(find_dotenv(), override=True)
 
 from app.db import db, init_db
-from app.routes.main_routes import main
-from app.routes.chat_routes import chat_bp
-from config import STORAGE_DIR
-import openai
+from app.routes.main_routes import main, seed_database
+from app.routes.chat_routes import chat_bp, warm_up_chat_stack
+from app.routes.api_routes import api_bp
+from app.services.popularity import start_flusher
+from app.services.llm_backends import LLM_BACKENDS
+import config
 
 def create_app():
     """Create and configure the Flask application."""
     app = Flask(__name__)
     
     # Configure SQLAlchemy
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{config.DATABASE_PATH}"
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-for-development-only')
-    app.config['STORAGE_DIR'] = STORAGE_DIR
+    # Load STORAGE_DIR and the tunable settings defined in config.py
+    app.config.from_object(config)
     
-    # Set OpenAI API key
+    # Only the OpenAI chat backend needs a key (see app/services/llm_backends.py)
+    llm_backend = app.config['LLM_BACKEND']
+    if llm_backend not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND '{llm_backend}', expected one of {LLM_BACKENDS}")
     openai_api_key = os.getenv('OPENAI_API_KEY')
-    if not openai_api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set")
-    print(f"Debug - First 10 chars of API key: {openai_api_key[:10]}")
-    
-    # Ensure we're not using a default or placeholder value
-    if openai_api_key.startswith('your-api'):
-        raise ValueError("Invalid API key detected: using placeholder value")
+    if llm_backend == 'openai':
+        if not openai_api_key:
+            raise ValueError("OPENAI_API_KEY environment variable is not set (or set LLM_BACKEND=fake)")
+        # Ensure we're not using a default or placeholder value
+        if openai_api_key.startswith('your-api'):
+            raise ValueError("Invalid API key detected: using placeholder value")
         
+    # LangChain's ChatOpenAI is given the key from app.config (see chroma_utils)
     app.config['OPENAI_API_KEY'] = openai_api_key
-    openai.api_key = openai_api_key  # Set it globally for the openai package
     
     # Initialize extensions
     db.init_app(app)
     
     # Ensure the instance folder exists
+    os.makedirs(os.path.dirname(config.DATABASE_PATH), exist_ok=True)
     with app.app_context():
         init_db()
+        # Seed once here rather than on every homepage request
+        seed_database()
+        # Download and chat counts are written in batches by a background thread
+        start_flusher(db.engine)
+    
+    @app.cli.command('seed-db')
+    def seed_db_command():
+        """Seed the books table from data/books_data.csv if it is empty."""
+        added = seed_database()
+        print(f"Seeded {added} book(s)." if added else "Books table already populated; nothing to seed.")
     
     # Register blueprints
     app.register_blueprint(main)
     app.register_blueprint(chat_bp)
+    app.register_blueprint(api_bp)
+    
+    # The chat stack is imported on first use unless warm-up is requested
+    if app.config.get('CHAT_WARMUP'):
+        warm_up_chat_stack(app)
     
     return app
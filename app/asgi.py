@@ -0,0 +1,52 @@
+"""
+ASGI entry point for the Digital Bookstore application.
+
+Usage:
+    uvicorn app.asgi:application --workers 2
+
+POST /chat and /chat/stream are served asynchronously (see
+app/services/async_chat.py), so many chats share each worker's event loop
+while they wait on the LLM. Every other route is served by the Flask app
+through a2wsgi, on a pool of ASGI_WSGI_THREADS threads, as a threaded
+WSGI server would serve it.
+"""
+from a2wsgi import WSGIMiddleware
+from app import create_app
+from app.services.async_chat import AsyncChat
+
+
+async def _lifespan(receive, send) -> None:
+    # create_app() has done the startup work already
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+class ChatASGIApp:
+    """Route the chat endpoints to AsyncChat and everything else to the Flask app."""
+
+    def __init__(self, flask_app):
+        config = flask_app.config
+        self.chat = AsyncChat(
+            flask_app,
+            max_concurrency=config['CHAT_MAX_CONCURRENCY'],
+            timeout=config['CHAT_TIMEOUT'],
+            queue_timeout=config['CHAT_QUEUE_TIMEOUT']
+        )
+        self.wsgi = WSGIMiddleware(flask_app, workers=config['ASGI_WSGI_THREADS'])
+        # Reported by /chat/stats
+        flask_app.extensions['async_chat'] = self.chat
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await _lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in AsyncChat.PATHS:
+            return await self.chat(scope, receive, send)
+        await self.wsgi(scope, receive, send)
+
+
+application = ChatASGIApp(create_app())
@@ -6,10 +6,16 @@ from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy()
 
 def init_db():
-    """Initialize the database by creating all tables."""
+    """
+    Bring the database schema up to date.
+
+    Applies only the pending migrations from app/migrations.py; existing
+    data is never dropped. When the schema is current this is a single
+    PRAGMA read.
+    """
     # Import models here to avoid circular imports
     from . import models
-    
-    # Create all tables
-    db.drop_all()  # Drop existing tables
-    db.create_all()  # Create new tables with updated schema
+    from .migrations import migrate
+
+    for version, description in migrate(db.engine):
+        print(f"Debug - Applied migration {version}: {description}")
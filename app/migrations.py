@@ -0,0 +1,199 @@
+"""
+Schema migrations for the SQLite database.
+
+The schema version is kept in SQLite's PRAGMA user_version. At startup
+migrate() compares it with the number of migrations below and, if any are
+pending, applies them in order inside one BEGIN IMMEDIATE transaction and
+bumps user_version in the same transaction. When the schema is current,
+startup costs a single PRAGMA read, whatever the size of the catalog.
+Several workers starting together serialize on the write lock; whoever
+gets it second re-reads the version and finds nothing left to do.
+
+Migrations never drop user data. Each one is written to be safe on
+databases created before migrations existed (by db.create_all() or by
+the old update_schema.py), which all report user_version 0.
+
+To change the schema, append a migration; never edit an applied one.
+"""
+from app.services.catalog_search import ensure_search_index
+from app.services.catalog_version import ensure_catalog_state
+from app.services import catalog_version
+
+
+def _columns(conn, table: str) -> set:
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _table_exists(conn, table: str) -> bool:
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).first() is not None
+
+
+def _has_unique_index(conn, table: str, column: str) -> bool:
+    for index in conn.exec_driver_sql(f"PRAGMA index_list({table})").all():
+        name, unique = index[1], index[2]
+        if unique and [row[2] for row in conn.exec_driver_sql(f"PRAGMA index_info('{name}')")] == [column]:
+            return True
+    return False
+
+
+def _create_books(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS books (
+            id INTEGER NOT NULL PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            author VARCHAR(255) NOT NULL,
+            category VARCHAR(100),
+            language VARCHAR(50),
+            description TEXT,
+            file_path VARCHAR(255),
+            image_path VARCHAR(255),
+            rating FLOAT,
+            reviews_count INTEGER
+        )
+    """)
+
+
+# Columns of books_data.csv that the first books schema did not have
+_CSV_COLUMNS = (
+    ('publisher', 'VARCHAR(255)'),
+    ('isbn', 'VARCHAR(20)'),
+    ('publish_date', 'VARCHAR(10)'),
+    ('pages', 'INTEGER'),
+    ('top_downloads', 'INTEGER'),
+    ('most_discussed', 'INTEGER'),
+)
+
+
+def _add_csv_columns(conn):
+    existing = _columns(conn, 'books')
+    for name, column_type in _CSV_COLUMNS:
+        if name not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE books ADD COLUMN {name} {column_type}")
+    # ISBN is the natural key catalog imports upsert on
+    if not _has_unique_index(conn, 'books', 'isbn'):
+        conn.exec_driver_sql("CREATE UNIQUE INDEX ix_books_isbn ON books (isbn)")
+
+
+def _merge_legacy_book_table(conn):
+    """
+    Fold the old singular 'book' table (update_schema.py, import_csv.py) into books.
+
+    Books with the same title and author get their missing columns filled
+    in from the legacy row; legacy books with no match are inserted.
+    """
+    if not _table_exists(conn, 'book'):
+        return
+    legacy = _columns(conn, 'book')
+    filled = [name for name, _ in _CSV_COLUMNS if name in legacy]
+    match = "book.title = books.title AND book.author = books.author"
+    for name in filled:
+        conn.exec_driver_sql(
+            f"UPDATE books SET {name} = (SELECT book.{name} FROM book WHERE {match} "
+            f"AND book.{name} IS NOT NULL LIMIT 1) "
+            f"WHERE {name} IS NULL AND EXISTS (SELECT 1 FROM book WHERE {match} AND book.{name} IS NOT NULL)"
+        )
+    columns = [c for c in ('title', 'author', 'category', 'language', 'description', 'file_path',
+                           'image_path', 'rating', 'reviews_count', *filled) if c in legacy]
+    column_list = ", ".join(columns)
+    # OR IGNORE skips legacy rows whose ISBN is already taken
+    conn.exec_driver_sql(
+        f"INSERT OR IGNORE INTO books ({column_list}) SELECT {column_list} FROM book "
+        f"WHERE NOT EXISTS (SELECT 1 FROM books WHERE {match})"
+    )
+    conn.exec_driver_sql("DROP TABLE book")
+
+
+def _create_listing_indexes(conn):
+    # Names match Book.__table_args__
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_language_id ON books (language, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_language_rating_id ON books (language, rating, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_rating_id ON books (rating, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_category_id ON books (category, id)")
+
+
+def _add_popularity_indexes(conn):
+    # Names match Book.__table_args__; leaderboards walk these instead of sorting books
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_top_downloads ON books (top_downloads, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_most_discussed ON books (most_discussed, id)")
+    # Counter updates no longer bump the catalog version; recreate the
+    # update trigger with its column list
+    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {catalog_version.TRIGGERS[2]}")
+    ensure_catalog_state(conn)
+
+
+def _create_book_indexes(conn):
+    # Written by the ingestion scripts (see app/services/book_index.py)
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS book_indexes (
+            book_id INTEGER NOT NULL PRIMARY KEY REFERENCES books (id) ON DELETE CASCADE,
+            index_dir VARCHAR(255) NOT NULL,
+            collection_name VARCHAR(255) NOT NULL,
+            chunk_count INTEGER NOT NULL,
+            embedding_model VARCHAR(255),
+            pipeline_version INTEGER,
+            ingested_at VARCHAR(32) NOT NULL
+        )
+    """)
+
+
+def _add_book_indexes_cleanup(conn):
+    # foreign_keys is off on the app's connections, so ON DELETE CASCADE never
+    # runs, and books ids are reused; without this a new book could inherit
+    # a deleted book's index
+    conn.exec_driver_sql("DELETE FROM book_indexes WHERE book_id NOT IN (SELECT id FROM books)")
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS book_indexes_books_ad AFTER DELETE ON books BEGIN "
+        "DELETE FROM book_indexes WHERE book_id = old.id; END"
+    )
+
+
+# (version, description, apply); versions are 1-based and consecutive
+MIGRATIONS = [
+    (1, "create books table", _create_books),
+    (2, "add publisher, isbn, publish_date, pages, top_downloads, most_discussed", _add_csv_columns),
+    (3, "merge legacy book table into books", _merge_legacy_book_table),
+    (4, "add listing indexes", _create_listing_indexes),
+    (5, "add full-text search index", ensure_search_index),
+    (6, "add catalog version counter", ensure_catalog_state),
+    (7, "add popularity indexes; counter updates keep the catalog version", _add_popularity_indexes),
+    (8, "add book_indexes registry of ingested books", _create_book_indexes),
+    (9, "delete a book's book_indexes row with the book", _add_book_indexes_cleanup),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine) -> list:
+    """
+    Apply pending migrations.
+
+    Returns:
+        list: (version, description) of each migration applied; empty if
+        the schema was already current.
+    """
+    with engine.connect() as conn:
+        # Transactions are managed explicitly so the version check and the
+        # migrations happen under one write lock
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        if schema_version(conn) >= SCHEMA_VERSION:
+            return []
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            current = schema_version(conn)
+            applied = []
+            for version, description, apply in MIGRATIONS:
+                if version > current:
+                    apply(conn)
+                    applied.append((version, description))
+            if applied:
+                conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.exec_driver_sql("COMMIT")
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+    return applied
@@ -16,22 +16,77 @@ class Book(db.Model):
         category (str): Category or genre of the book.
         language (str): Language of the book.
         description (str): Short description or summary of the book.
+        publisher (str): Publisher of the book.
+        isbn (str): ISBN; the natural key catalog imports upsert on.
+        publish_date (str): Publication date (YYYY-MM-DD).
+        pages (int): Number of pages.
         file_path (str): Path to the book file in storage.
         image_path (str): Path to the book cover image.
         rating (float): Average rating of the book.
         reviews_count (int): Number of reviews the book has received.
+        top_downloads (int): Download count used for the Top Downloads ranking.
+        most_discussed (int): Discussion count used for the Most Discussed ranking.
     """
     __tablename__ = 'books'
+    # The schema itself is created by app/migrations.py; these mirror it.
+    # Composite indexes matching the homepage filters and their keyset sort
+    # order: id for the plain listing, (rating, id) once a rating filter is set.
+    __table_args__ = (
+        db.Index('ix_books_isbn', 'isbn', unique=True),
+        db.Index('ix_books_language_id', 'language', 'id'),
+        db.Index('ix_books_language_rating_id', 'language', 'rating', 'id'),
+        db.Index('ix_books_rating_id', 'rating', 'id'),
+        db.Index('ix_books_category_id', 'category', 'id'),
+        # Leaderboards read these backwards, highest count first
+        db.Index('ix_books_top_downloads', 'top_downloads', 'id'),
+        db.Index('ix_books_most_discussed', 'most_discussed', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
     author = db.Column(db.String(255), nullable=False)
     category = db.Column(db.String(100))
     language = db.Column(db.String(50))
     description = db.Column(db.Text)
+    publisher = db.Column(db.String(255))
+    isbn = db.Column(db.String(20))
+    publish_date = db.Column(db.String(10))
+    pages = db.Column(db.Integer)
     file_path = db.Column(db.String(255))
     image_path = db.Column(db.String(255))
     rating = db.Column(db.Float)
     reviews_count = db.Column(db.Integer)
+    top_downloads = db.Column(db.Integer)
+    most_discussed = db.Column(db.Integer)
 
     def __repr__(self):
         return f'<Book {self.title} by {self.author}>'
+
+
+class BookIndex(db.Model):
+    """
+    Chat index of an ingested book, written by the ingestion scripts.
+
+    Deleting a book deletes its row (trigger book_indexes_books_ad; SQLite
+    foreign keys are not enforced on the app's connections).
+
+    Attributes:
+        book_id (int): The book; one row per ingested book.
+        index_dir (str): Book directory relative to STORAGE_DIR; its
+            chroma_db subdirectory holds the Chroma store.
+        collection_name (str): Chroma collection of the book's chunks.
+        chunk_count (int): Chunks stored in the collection.
+        embedding_model (str): Model the chunks were embedded with, if known.
+        pipeline_version (int): ingest_pipeline.PIPELINE_VERSION that built the index.
+        ingested_at (str): ISO timestamp of the ingestion.
+    """
+    __tablename__ = 'book_indexes'
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True)
+    index_dir = db.Column(db.String(255), nullable=False)
+    collection_name = db.Column(db.String(255), nullable=False)
+    chunk_count = db.Column(db.Integer, nullable=False)
+    embedding_model = db.Column(db.String(255))
+    pipeline_version = db.Column(db.Integer)
+    ingested_at = db.Column(db.String(32), nullable=False)
+
+    def __repr__(self):
+        return f'<BookIndex {self.book_id}: {self.collection_name} ({self.chunk_count} chunks)>'
@@ -0,0 +1,176 @@
+"""
+JSON catalog API.
+
+GET /api/books returns the catalog one page at a time, with the same
+search, language, category and rating filters as the homepage. Only the
+requested columns are selected, rows are fetched from SQLite in batches
+and written to the response as they arrive, so memory stays constant no
+matter how large the catalog or the page is.
+
+GET /api/books/top returns the most downloaded or most discussed books
+from the in-memory leaderboards (see popularity.py).
+"""
+import json
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from app.db import db
+from app.models import Book
+from app.services.catalog_query import like_search, apply_filters, listing_order
+from app.services.catalog_search import match_expression, search_subquery
+from app.services.catalog_pages import keyset_condition, encode_cursor, decode_cursor
+from app.services.popularity import popularity, COUNTERS
+
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+# Columns clients may ask for with ?fields=
+BOOK_FIELDS = ('id', 'title', 'author', 'category', 'language', 'description',
+               'rating', 'reviews_count', 'file_path', 'image_path')
+# Returned when ?fields= is omitted; description is large and left out
+DEFAULT_FIELDS = ('id', 'title', 'author', 'category', 'language', 'rating', 'reviews_count')
+# Rows fetched from SQLite per round trip while streaming
+FETCH_BATCH = 500
+# Largest offset a search cursor may hold, far past any search's results
+MAX_SEARCH_OFFSET = 1_000_000
+
+
+def _error(message: str, status: int = 400):
+    return jsonify({'error': message}), status
+
+
+def _requested_fields():
+    """Columns named by ?fields=, as (fields, unknown field names)."""
+    fields = request.args.get('fields', '')
+    fields = tuple(f.strip() for f in fields.split(',') if f.strip()) if fields else DEFAULT_FIELDS
+    return fields, [f for f in fields if f not in BOOK_FIELDS]
+
+
+def _search_statement(columns, search_query, language, rating, category, offset, limit):
+    """Ranked full-text search (or substring search without FTS5), paged by offset."""
+    match = match_expression(search_query)
+    if match:
+        fts_results = search_subquery(match)
+        stmt = (select(*columns).join(fts_results, fts_results.c.id == Book.id)
+                .order_by(fts_results.c.score, Book.id))
+    else:
+        stmt = like_search(select(*columns), search_query).order_by(Book.id)
+    return apply_filters(stmt, language, rating, category).offset(offset).limit(limit + 1)
+
+
+@api_bp.route('/books')
+def list_books():
+    """
+    List books as JSON.
+
+    Query parameters:
+        fields: Comma-separated columns to return (default: DEFAULT_FIELDS).
+        limit: Books per page (default API_PAGE_SIZE, at most API_MAX_PAGE_SIZE).
+        after: Cursor from the previous page's "next"; 400 if it is not one.
+        search, language, category, rating: Same filters as the homepage.
+
+    Returns:
+        {"books": [...], "next": cursor or null}, streamed.
+    """
+    config = current_app.config
+    fields, unknown = _requested_fields()
+    if unknown:
+        return _error(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(BOOK_FIELDS)}")
+
+    limit = request.args.get('limit', config.get('API_PAGE_SIZE', 100), type=int)
+    limit = max(1, min(limit, config.get('API_MAX_PAGE_SIZE', 1000)))
+    search_query = ' '.join(request.args.get('search', '').split())
+    language = request.args.get('language', '').strip()
+    category = request.args.get('category', '').strip()
+    rating = request.args.get('rating', '').strip()
+    try:
+        if rating:
+            float(rating)
+    except ValueError:
+        return _error("rating must be a number")
+
+    after = request.args.get('after')
+    if search_query:
+        # Ranked results have no stable sort key, so the cursor is an offset
+        sort_columns = [Book.id]
+        cursor = decode_cursor(after, 1)
+        if after and (cursor is None or not isinstance(cursor[0], int)
+                      or not 0 <= cursor[0] <= MAX_SEARCH_OFFSET):
+            return _error("after is not a valid cursor for this search")
+        offset = cursor[0] if cursor else 0
+        columns = list(dict.fromkeys([getattr(Book, f) for f in fields] + sort_columns))
+        stmt = _search_statement(columns, search_query, language, rating, category, offset, limit)
+    else:
+        sort_columns, descending = listing_order(rating)
+        cursor = decode_cursor(after, len(sort_columns))
+        if after and cursor is None:
+            return _error("after is not a valid cursor for this listing")
+        columns = list(dict.fromkeys([getattr(Book, f) for f in fields] + sort_columns))
+        stmt = apply_filters(select(*columns), language, rating, category)
+        if cursor is not None:
+            stmt = stmt.where(keyset_condition(sort_columns, descending, cursor))
+        stmt = stmt.order_by(*[c.desc() if descending else c.asc() for c in sort_columns]).limit(limit + 1)
+
+    try:
+        result = db.session.execute(stmt, execution_options={'yield_per': FETCH_BATCH})
+    except OperationalError:
+        if not search_query:
+            raise
+        # No FTS5 in this SQLite build: fall back to substring matching
+        db.session.rollback()
+        stmt = apply_filters(like_search(select(*columns), search_query), language, rating, category)
+        stmt = stmt.order_by(Book.id).offset(offset).limit(limit + 1)
+        result = db.session.execute(stmt, execution_options={'yield_per': FETCH_BATCH})
+
+    def generate():
+        yield '{"books": ['
+        sent = 0
+        last = None
+        for row in result:
+            if sent == limit:
+                # The extra row only tells us there is a next page
+                if search_query:
+                    next_cursor = encode_cursor([offset + limit])
+                else:
+                    next_cursor = encode_cursor(last[c.key] for c in sort_columns)
+                yield f'], "next": {json.dumps(next_cursor)}}}'
+                return
+            mapping = row._mapping
+            book = {f: mapping[f] for f in fields}
+            yield (',' if sent else '') + json.dumps(book, ensure_ascii=False)
+            last = mapping
+            sent += 1
+        yield '], "next": null}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+@api_bp.route('/books/top')
+def top_books():
+    """
+    Leaderboard of the most downloaded or most discussed books.
+
+    Query parameters:
+        by: 'downloads' (default) or 'discussed'.
+        limit: Books to return (default 10, at most POPULARITY_TOP_SIZE).
+        fields: Comma-separated columns to return (default: DEFAULT_FIELDS).
+
+    Returns:
+        {"by": str, "books": [...]} highest count first; each book has a "count".
+    """
+    by = request.args.get('by', 'downloads')
+    if by not in COUNTERS:
+        return _error(f"by must be one of: {', '.join(COUNTERS)}")
+    fields, unknown = _requested_fields()
+    if unknown:
+        return _error(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(BOOK_FIELDS)}")
+    limit = max(1, request.args.get('limit', 10, type=int))
+
+    ranked = popularity.leaderboards[COUNTERS[by]].top(db.session.connection(), limit)
+    # Primary-key lookups for at most POPULARITY_TOP_SIZE books
+    columns = list(dict.fromkeys([getattr(Book, f) for f in fields] + [Book.id]))
+    rows = {row.id: row._mapping for row in db.session.execute(
+        select(*columns).where(Book.id.in_([book_id for book_id, _ in ranked]))
+    )}
+    books = [dict({f: rows[book_id][f] for f in fields}, count=count)
+             for book_id, count in ranked if book_id in rows]
+    return jsonify({'by': by, 'books': books})
@@ -1,47 +1,251 @@
-from flask import Blueprint, jsonify, request, session, current_app
-from app.services.openai_utils import get_chat_response
-from app.services.chroma_utils import get_qa_chain
-import os
+"""
+Chat routes.
+
+The chat stack (LangChain, Chroma, sentence-transformers, the OpenAI client)
+takes seconds to import and is only needed once someone opens a book, so it
+is imported inside the handlers on first use rather than when the app
+starts. Set CHAT_WARMUP to load it in the background right after startup
+instead (see warm_up_chat_stack).
+"""
+from flask import Blueprint, jsonify, request, session, current_app, Response, stream_with_context
+import json
+import sys
+import threading
+import time
+from contextlib import closing
+from typing import NamedTuple, Optional
+from app.db import db
+from app.services.book_index import get_book_index
+from app.services.popularity import popularity
 
 # Create the Blueprint object
 chat_bp = Blueprint('chat', __name__)
 
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    # Stop nginx from buffering the stream
+    'X-Accel-Buffering': 'no'
+}
+
+def warm_up_chat_stack(app) -> threading.Thread:
+    """
+    Import the chat stack and load the embedding model in a background thread.
+
+    Startup does not wait for it; a chat request arriving before it finishes
+    simply blocks on the same imports and model load it would have done anyway.
+
+    Returns:
+        threading.Thread: The started daemon thread.
+    """
+    model_name = app.config.get('EMBEDDING_MODEL')
+
+    def warm_up():
+        started = time.perf_counter()
+        try:
+            from app.services.chroma_utils import get_embeddings, DEFAULT_EMBEDDING_MODEL
+            import app.services.chat_streaming  # noqa: F401
+            import app.services.answer_cache  # noqa: F401
+            get_embeddings(model_name or DEFAULT_EMBEDDING_MODEL)
+        except Exception as e:
+            print(f"Debug - Chat warm-up failed: {e}")
+            return
+        print(f"Debug - Chat stack warmed up in {time.perf_counter() - started:.1f}s")
+
+    thread = threading.Thread(target=warm_up, name="chat-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def _get_book_index():
+    """
+    Return ((chroma_db_path, collection_name), None) for the book selected in
+    the session, or (None, error response) if no book is selected or it has
+    not been ingested.
+    """
+    book_id = session.get('book_id')
+    if book_id is None:
+        return None, (jsonify({'error': 'No book selected'}), 400)
+
+    # Registry rows are cached briefly, so most questions cost only the catalog version read
+    index = get_book_index(db.session, book_id, current_app.config['STORAGE_DIR'])
+    if index is None:
+        # Refuse before any Chroma store is opened
+        return None, (jsonify({'error': 'This book has not been prepared for chat yet'}), 409)
+    return (index.chroma_db_path, index.collection_name), None
+
+def _lookup_cached_answer(chroma_db_path: str, collection_name: str, query: str):
+    """
+    Look query up in the book's semantic answer cache.
+
+    Returns:
+        tuple: (cache, embedding, hit) where hit is {'response', 'pages'} or None.
+        cache and embedding are None when the answer cache is disabled.
+    """
+    config = current_app.config
+    if not config.get('ANSWER_CACHE_ENABLED', True):
+        return None, None, None
+
+    from app.services.answer_cache import answer_caches
+    from app.services.chroma_utils import get_embeddings, DEFAULT_EMBEDDING_MODEL
+    cache = answer_caches.get(
+        chroma_db_path,
+        collection_name,
+        threshold=config.get('ANSWER_CACHE_THRESHOLD', 0.92),
+        ttl=config.get('ANSWER_CACHE_TTL', 86400),
+        max_entries=config.get('ANSWER_CACHE_MAX_ENTRIES', 256),
+        persist=config.get('ANSWER_CACHE_PERSIST', False),
+        flush_interval=config.get('ANSWER_CACHE_FLUSH_INTERVAL', 30.0)
+    )
+    embedding = get_embeddings(config.get('EMBEDDING_MODEL', DEFAULT_EMBEDDING_MODEL)).embed_query(query)
+    return cache, embedding, cache.lookup(embedding)
+
+def _record_question():
+    """Count a question toward the session book's Most Discussed ranking."""
+    popularity.record('most_discussed', session['book_id'])
+
+class PreparedChat(NamedTuple):
+    """
+    A validated chat request: the question and either a cached answer or the
+    chain to run (with the answer cache and query embedding to store into).
+    """
+    query: str
+    cached: Optional[dict]
+    qa_chain: object
+    cache: object
+    embedding: object
+
+def prepare_chat():
+    """
+    Validate the current chat request and find its cached answer or QA chain.
+
+    Shared by the WSGI views below and the async views in app/asgi.py; needs
+    a request context.
+
+    Returns:
+        tuple: (PreparedChat, None), or (None, error response).
+    """
+    book_index, error = _get_book_index()
+    if error is not None:
+        return None, error
+
+    data = request.get_json()
+    query = data.get('message', '')
+    if not query:
+        return None, (jsonify({'error': 'No message provided'}), 400)
+    _record_question()
+
+    # Answer repeated questions from the semantic cache
+    cache, embedding, cached = _lookup_cached_answer(*book_index, query)
+    qa_chain = None
+    if cached is None:
+        from app.services.chroma_utils import get_qa_chain
+        qa_chain = get_qa_chain(*book_index)
+    return PreparedChat(query, cached, qa_chain, cache, embedding), None
+
+def finish_answer(prepared: PreparedChat, result: dict) -> dict:
+    """Turn a chain result into the {'response', 'pages'} reply, caching it."""
+    answer = result["result"]
+    # Extract unique page numbers from source documents
+    pages = _extract_pages(result.get("source_documents", []))
+    if prepared.cache is not None:
+        prepared.cache.store(prepared.embedding, prepared.query, answer, pages)
+    return {'response': answer, 'pages': pages}
+
+def _extract_pages(sources):
+    """Extract unique, sorted page numbers from source documents."""
+    return sorted(list(set(
+        doc.metadata.get("page")
+        for doc in sources
+        if doc.metadata.get("page") is not None
+    )))
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @chat_bp.route('/chat', methods=['POST'])
 def chat():
     try:
-        # Get book info from session
-        book_directory = session.get('book_directory')
-        if not book_directory:
-            return jsonify({'error': 'Book directory not found in session'}), 400
-
-        # Construct paths and get QA chain
-        chroma_db_path = os.path.join(book_directory, "chroma_db")
-        collection_name = os.path.basename(book_directory)
-        qa_chain = get_qa_chain(chroma_db_path, collection_name)
-
-        # Process the chat message
-        data = request.get_json()
-        query = data.get('message', '')
-        
-        if not query:
-            return jsonify({'error': 'No message provided'}), 400
-
-        result = qa_chain.invoke({"query": query})
-        answer = result["result"]
-        sources = result.get("source_documents", [])
-        
-        # Extract unique page numbers from source documents
-        pages = sorted(list(set(
-            doc.metadata.get("page") 
-            for doc in sources 
-            if doc.metadata.get("page") is not None
-        )))
-
-        return jsonify({
-            'response': answer,
-            'pages': pages
-        })
+        prepared, error = prepare_chat()
+        if error is not None:
+            return error
+        if prepared.cached is not None:
+            return jsonify(prepared.cached)
+
+        result = prepared.qa_chain.invoke({"query": prepared.query})
+        return jsonify(finish_answer(prepared, result))
 
     except Exception as e:
         print(f"Error in chat route: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
+
+@chat_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming variant of /chat using Server-Sent Events.
+
+    Events:
+        token: {"text": str} for each generated token.
+        reset: {} when the chain starts a new LLM call; discard the partial answer.
+        pages: {"pages": [int]} cited pages, sent once the answer is complete.
+        done: {"response": str} the final answer.
+        error: {"error": str} if the chain fails mid-stream.
+    """
+    try:
+        prepared, error = prepare_chat()
+        if error is not None:
+            return error
+        if prepared.cached is None:
+            from app.services.chat_streaming import stream_chain
+    except Exception as e:
+        print(f"Error in chat stream route: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+    def generate():
+        cached = prepared.cached
+        if cached is not None:
+            yield sse_event('token', {'text': cached['response']})
+            yield sse_event('pages', {'pages': cached['pages']})
+            yield sse_event('done', {'response': cached['response']})
+            return
+        try:
+            # Closed with the response when the client disconnects, which stops the chain
+            with closing(stream_chain(prepared.qa_chain, prepared.query)) as events:
+                for event, payload in events:
+                    if event == 'token':
+                        yield sse_event('token', {'text': payload})
+                    elif event == 'reset':
+                        yield sse_event('reset', {})
+                    elif event == 'done':
+                        reply = finish_answer(prepared, payload)
+                        yield sse_event('pages', {'pages': reply['pages']})
+                        yield sse_event('done', {'response': reply['response']})
+        except Exception as e:
+            print(f"Error in chat stream route: {str(e)}")
+            yield sse_event('error', {'error': 'Internal server error'})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
+@chat_bp.route('/chat/stats', methods=['GET'])
+def chat_stats():
+    """Report QA chain cache counters and per-strategy latency for monitoring."""
+    # Present when serving through app/asgi.py
+    async_chat = current_app.extensions.get('async_chat')
+    async_stats = async_chat.stats() if async_chat is not None else {}
+    # Polling this must not drag the chat stack into a worker that never chatted
+    if 'app.services.chroma_utils' not in sys.modules:
+        return jsonify({'loaded': False, 'qa_cache': {}, 'qa_chains': {}, 'answer_cache': {},
+                        'async_chat': async_stats})
+    from app.services.answer_cache import answer_caches
+    from app.services.qa_registry import registry
+    from app.services.qa_metrics import chain_stats
+    return jsonify({
+        'loaded': True,
+        'qa_cache': registry.stats(),
+        'qa_chains': chain_stats.snapshot(),
+        'answer_cache': answer_caches.stats(),
+        'async_chat': async_stats
+    })
@@ -6,41 +6,138 @@ This module handles the main routes for the bookstore application, including:
 - Book data retrieval and filtering
 - Database seeding from CSV data
 """
-import csv
-from flask import Blueprint, render_template, request, send_file, abort, current_app, url_for, session
+from flask import Blueprint, render_template, request, send_file, send_from_directory, abort, current_app, url_for, session, make_response, redirect
 from app.models import Book
 from app.db import db
+from app.services.static_index import resolve_cover, get_static_index
+from app.services.catalog_import import import_catalog
+from app.services.thumbnails import generate_catalog_thumbnails, get_thumbnail_index, THUMBS_DIR, THUMB_NAME
+from app.services.catalog_search import match_expression, search_subquery, highlight
+from app.services.catalog_query import like_search, apply_filters, listing_order
+from app.services.catalog_pages import keyset_page, decode_cursor, count_cache
+from app.services.catalog_version import catalog_version
+from app.services.catalog_facets import compute_facets, facet_cache
+from app.services.popularity import popularity
+from app.services.book_files import BookFile, book_files, resolve_book_file
+from app.services.book_index import get_book_index
+from app.services.page_cache import page_cache, page_etag
+from sqlalchemy.exc import OperationalError
 import os
-from werkzeug.utils import safe_join
+from urllib.parse import quote
+from werkzeug.http import is_resource_modified
 
 main = Blueprint('main', __name__)
 
 def seed_database():
     """
     Seed the database with initial book data from books_data.csv.
-    This function is called when the application starts if the database is empty.
-    """
-    if Book.query.first() is None:
-        csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 
-                               'data', 'books_data.csv')
-        
-        if os.path.exists(csv_path):
-            with open(csv_path, 'r', encoding='utf-8') as f:
-                csv_reader = csv.DictReader(f)
-                for row in csv_reader:
-                    book = Book(
-                        title=row['title'],
-                        author=row['author'],
-                        category=row['category'],
-                        language=row['language'],
-                        description=row['description'],
-                        file_path=row['file_path'],
-                        image_path=row['image_path'],
-                        rating=float(row['rating']),
-                        reviews_count=int(row['reviews_count'])
-                    )
-                    db.session.add(book)
-                db.session.commit()
+    This function is called once when the application starts (and by the
+    `flask seed-db` command) if the database is empty.
+
+    Returns:
+        int: Number of books added.
+    """
+    csv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 
+                           'data', 'books_data.csv')
+    # Cheap check first, so a populated database never takes the write lock
+    if db.session.query(Book.id).first() is not None or not os.path.exists(csv_path):
+        return 0
+    report = import_catalog(db.engine.url.database, csv_path, only_if_empty=True)
+    if report['inserted']:
+        generate_catalog_thumbnails(db.engine.url.database)
+    return report['inserted']
+
+def cover_paths(books):
+    """
+    Map book ids to static-relative cover paths, or None if the cover file is missing.
+
+    Existence is answered by the in-memory static file index, so no
+    filesystem calls are made per book and the ORM objects stay untouched.
+    """
+    static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static')
+    return {book.id: resolve_cover(book.image_path, static_dir) for book in books}
+
+def cover_thumbnails(covers):
+    """
+    Map book ids to thumbnail sources for their covers, or None if a cover has none.
+
+    Each value has 'webp' and 'jpeg' srcset strings, 'src' (the smallest
+    JPEG) and that variant's 'width' and 'height'. URLs point at the
+    /covers route, which serves them with immutable cache headers.
+    """
+    static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static')
+    index = get_thumbnail_index(static_dir)
+    thumbs = {}
+    for book_id, cover in covers.items():
+        entry = index.get(cover) if cover else None
+        if entry is None:
+            thumbs[book_id] = None
+            continue
+        srcsets = {
+            name: ', '.join(f"{url_for('main.cover', filename=file_name)} {width}w"
+                            for width, file_name in variants)
+            for name, variants in entry['variants'].items()
+        }
+        thumbs[book_id] = dict(srcsets,
+                               src=url_for('main.cover', filename=entry['variants']['jpeg'][0][1]),
+                               width=entry['width'], height=entry['height'])
+    return thumbs
+
+def search_page(search_query, language, rating, category, page, per_page, version):
+    """
+    One page of search results, ranked by relevance.
+
+    Search result sets are small and ordered by score, so they are paged
+    with OFFSET; the count is cached per catalog version, query and filters.
+
+    Returns:
+        tuple: (books, snippets by book id, total matches)
+    """
+    match = match_expression(search_query)
+    offset = (page - 1) * per_page
+    if match:
+        # Full-text search, ranked by BM25, over title, author, category and description
+        fts_results = search_subquery(match)
+        query = apply_filters(
+            db.session.query(Book, fts_results.c.snippet).join(fts_results, fts_results.c.id == Book.id),
+            language, rating, category
+        )
+        try:
+            total = count_cache.get((version, 'search', match.lower(), language, rating, category), query.count)
+            rows = query.order_by(fts_results.c.score, Book.id).offset(offset).limit(per_page).all()
+        except OperationalError:
+            # No FTS5 in this SQLite build: fall back to substring matching
+            db.session.rollback()
+        else:
+            books = [book for book, _ in rows]
+            return books, {book.id: highlight(snippet) for book, snippet in rows}, total
+
+    query = apply_filters(like_search(Book.query, search_query), language, rating, category)
+    total = count_cache.get((version, 'like', search_query.lower(), language, rating, category), query.count)
+    return query.order_by(Book.id).offset(offset).limit(per_page).all(), {}, total
+
+def listing_page(language, rating, category, page, per_page, after, before, version):
+    """
+    One page of the filtered catalog listing, paged by keyset.
+
+    The sort key comes from listing_order() and matches a composite index,
+    so every page costs the same. A page number without a cursor (old
+    ?page=N links) is served once with OFFSET; the links it renders carry
+    cursors again.
+
+    Returns:
+        tuple: (books, next_cursor, prev_cursor, total)
+    """
+    columns, descending = listing_order(rating)
+    query = apply_filters(Book.query, language, rating, category)
+    total = count_cache.get((version, 'list', language, rating, category), query.count)
+
+    after = decode_cursor(after, len(columns))
+    before = None if after is not None else decode_cursor(before, len(columns))
+    offset = (page - 1) * per_page if after is None and before is None else 0
+    books, next_cursor, prev_cursor = keyset_page(query, columns, descending, per_page,
+                                                  after=after, before=before, offset=offset)
+    return books, next_cursor, prev_cursor, total
 
 @main.route('/')
 def home():
@@ -48,130 +145,200 @@ def home():
     Display the homepage with book listings and filters.
 
     Supports filtering by:
-    - Search query: Matches title or author.
+    - Search query: Full-text match on title, author, category or description,
+      ranked by relevance, with highlighted description snippets.
     - Language: Filters books by selected language.
+    - Category: Browses one category.
     - Rating: Filters books with a rating greater than or equal to the selected rating.
 
+    The listing is paged with opaque 'after'/'before' cursors; 'page' only
+    tracks the page number shown. Search results are paged by 'page'.
+
+    The page depends only on these parameters, the catalog version, the
+    cover files and the thumbnail manifest, so it is cached per process
+    under that key, sent with an ETag and Last-Modified that every worker
+    computes alike, and repeat visits get 304 Not Modified.
+
     Returns:
         Rendered HTML template for the homepage.
     """
-    # Initialize database if empty
-    seed_database()
-    
     # Get query parameters
-    search_query = request.args.get('search', '').strip()
+    search_query = ' '.join(request.args.get('search', '').split())
     language = request.args.get('language', '').strip()
+    category = request.args.get('category', '').strip()
     rating = request.args.get('rating', '').strip()
-    page = request.args.get('page', 1, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    after = request.args.get('after', '')
+    before = request.args.get('before', '')
+    
+    version, last_modified = catalog_version(db.session)
+    static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static')
+    # Which covers exist and their thumbnails, identical in every worker
+    images_digest, images_modified = get_static_index(static_dir).images_state()
+    thumbs_digest, thumbs_modified = get_thumbnail_index(static_dir).state()
+    key = (version, images_digest, thumbs_digest,
+           search_query, language, rating, category, page, after, before)
+    etag = page_etag(key)
+    last_modified = max(last_modified, images_modified, thumbs_modified)
+    
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = make_response('', 304)
+    else:
+        body = page_cache.get(key)
+        if body is None:
+            body = render_home(search_query, language, rating, category, page, after, before,
+                               version).encode('utf-8')
+            page_cache.put(key, body)
+        response = make_response(body)
+    
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Browsers may keep the page but must revalidate it on every visit
+    response.cache_control.no_cache = True
+    return response
+
+def render_home(search_query, language, rating, category, page, after, before, version):
+    """Query the catalog and render main.html for one set of homepage parameters."""
     per_page = 12  # Number of books per page
     
-    # Build query
-    query = Book.query
+    # Filters carried over into the pagination links
+    filter_args = {key: value for key, value in
+                   (('search', search_query), ('language', language), ('category', category),
+                    ('rating', rating)) if value}
+    snippets = {}
+    next_args = prev_args = None
     
     if search_query:
-        query = query.filter(
-            (Book.title.ilike(f'%{search_query}%')) |
-            (Book.author.ilike(f'%{search_query}%'))
+        books, snippets, total = search_page(search_query, language, rating, category, page, per_page, version)
+        if page * per_page < total:
+            next_args = dict(filter_args, page=page + 1)
+        if page > 1:
+            prev_args = dict(filter_args, page=page - 1)
+    else:
+        books, next_cursor, prev_cursor, total = listing_page(
+            language, rating, category, page, per_page, after, before, version
         )
-    if language:
-        # Filter books by the selected language
-        query = query.filter(Book.language == language)
-    if rating:
-        # Filter books with a rating greater than or equal to the selected rating
-        query = query.filter(Book.rating >= float(rating))
-
-    # Execute query with pagination
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    books = pagination.items
+        if next_cursor:
+            next_args = dict(filter_args, after=next_cursor, page=page + 1)
+        if prev_cursor:
+            prev_args = dict(filter_args, before=prev_cursor, page=max(page - 1, 1))
     
-    # Server-side check for cover images
-    static_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static')
-    
-    for book in books:
-        if book.image_path:
-            # Ensure the image_path doesn't start with 'static/'
-            if book.image_path.startswith('static/'):
-                book.image_path = book.image_path[7:]  # Remove 'static/' prefix
-            
-            # Check if file exists
-            cover_fullpath = os.path.join(static_dir, book.image_path)
-            if not os.path.isfile(cover_fullpath):
-                book.image_path = None
+    covers = cover_paths(books)
+    thumbs = cover_thumbnails(covers)
+    # Sidebar counts over the whole catalog, computed once per catalog version
+    facets = facet_cache.get(version, lambda: compute_facets(db.session))
     
     return render_template('main.html',
                          books=books,
+                         covers=covers,
+                         thumbs=thumbs,
+                         snippets=snippets,
                          search_query=search_query,
                          language=language,
+                         category=category,
                          rating=rating,
+                         facets=facets,
                          current_page=page,
-                         total_pages=pagination.pages)
+                         total_pages=max(1, -(-total // per_page)),
+                         total_books=total,
+                         next_args=next_args,
+                         prev_args=prev_args)
+
+@main.route('/covers/<path:filename>')
+def cover(filename):
+    """
+    Serve a cover thumbnail.
+
+    Thumbnail names contain a hash of their content, so a URL never
+    changes meaning and browsers and proxies may keep it for a year
+    without revalidating. Only such names are served: anything else in
+    thumbs/, like manifest.json, changes in place and must not be cached
+    that way.
+    """
+    if not THUMB_NAME.fullmatch(filename):
+        abort(404)
+    thumbs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', THUMBS_DIR)
+    response = send_from_directory(thumbs_dir, filename, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @main.route('/books')
 def list_books():
-    """List all books in the library."""
-    books = Book.query.all()
-    return render_template('main.html', books=books)
+    """Old full-catalog page; the paged homepage and /api/books replace it."""
+    return redirect(url_for('main.home', **request.args), code=301)
 
-@main.route('/book/<int:book_id>/download')
-def download_book(book_id):
-    # Get the book from the database
-    book = Book.query.get(book_id)
-    if not book:
+def _book_file(book_id):
+    """
+    The BookFile for book_id from the process-wide cache.
+
+    The cache is emptied whenever the catalog version changes, since a
+    deleted book's id can be reused by the next book inserted. Aborts with
+    404 if the book does not exist, or 400 if its file path points outside
+    STORAGE_DIR.
+    """
+    def load():
+        row = db.session.query(Book.title, Book.file_path).filter(Book.id == book_id).first()
+        if row is None:
+            return None
+        resolved = resolve_book_file(row.file_path, current_app.config['STORAGE_DIR'])
+        return BookFile(*(resolved or (None, None)), title=row.title)
+
+    book_files.sync(catalog_version(db.session)[0])
+    book_file = book_files.get(book_id, load)
+    if book_file is None:
         abort(404, "Book not found")
-    
-    # Remove leading slashes from file path
-    file_path = book.file_path.lstrip('/')
-    
-    # Get the storage directory from app config
-    storage_dir = current_app.config['STORAGE_DIR']
-    
-    # Construct the absolute path to the PDF file
-    pdf_path = safe_join(storage_dir, file_path)
-    
-    if pdf_path is None:
+    if book_file.path is None:
         abort(400, "Invalid file path")
-    
-    # Convert to absolute path
-    pdf_path = os.path.abspath(pdf_path)
-    
-    # Print the path for debugging (remove in production)
-    print(f"Attempting to access PDF at: {pdf_path}")
-    
-    # Check if the file exists
-    if not os.path.isfile(pdf_path):
-        abort(404, "File not found")
-    
-    # Return the file as an attachment
-    return send_file(pdf_path, as_attachment=True, download_name=os.path.basename(pdf_path))
+    return book_file
 
-@main.route('/chat/<int:book_id>')
-def chat(book_id):
-    book = Book.query.get(book_id)
-    if not book:
-        abort(404, "Book not found")
+def _send_pdf(book_id, as_attachment):
+    """
+    Send a book's PDF with Range, ETag and Last-Modified support.
 
-    # Extract book details
-    book_title = book.title
-    file_path = book.file_path  # e.g., 'app/static/storage/books/Cybersecurity/Cybersecurity-Handbook-English-version.pdf'
+    With X_ACCEL_REDIRECT_PREFIX set, nginx is told to send the file (and
+    handle ranges and revalidation) itself; with USE_X_SENDFILE, Flask
+    hands it over via X-Sendfile. Either way the worker sends no bytes.
+    """
+    book_file = _book_file(book_id)
+    download_name = os.path.basename(book_file.path)
+    accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        response = make_response('')
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(book_file.rel_path)}"
+        response.mimetype = 'application/pdf'
+        if as_attachment:
+            response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        return response
+    try:
+        return send_file(book_file.path, mimetype='application/pdf', as_attachment=as_attachment,
+                         download_name=download_name, conditional=True, etag=True)
+    except (FileNotFoundError, IsADirectoryError):
+        # Look the book up again next time, in case its file_path was fixed
+        book_files.invalidate(book_id)
+        abort(404, "File not found")
 
-    # For iframe display
-    relative_path = file_path.replace("app/static/", "")
-    pdf_url = url_for('static', filename=relative_path)
+@main.route('/book/<int:book_id>/download')
+def download_book(book_id):
+    response = _send_pdf(book_id, as_attachment=True)
+    # Count full downloads only, not resumed ranges or 304 revalidations
+    if response.status_code == 200:
+        # Counted in memory; written to books.top_downloads in the next batch
+        popularity.record('top_downloads', book_id)
+    return response
 
-    # Correctly determine the actual book_directory on disk for Chroma
-    storage_dir = current_app.config['STORAGE_DIR']  # Should point to 'app/static'
-    # Remove 'app/static/' from file_path before joining
-    fixed_file_path = file_path.replace('app/static/', '')
-    abs_pdf_path = os.path.abspath(os.path.join(storage_dir, fixed_file_path))
-    book_directory = os.path.dirname(abs_pdf_path)
+@main.route('/book/<int:book_id>/pdf')
+def book_pdf(book_id):
+    """The book's PDF for inline viewing; the viewer fetches the pages it shows with Range requests."""
+    return _send_pdf(book_id, as_attachment=False)
 
-    # Debug prints to confirm paths
-    print(f"Debug - file_path: {file_path}")
-    print(f"Debug - storage_dir: {storage_dir}")
-    print(f"Debug - fixed_file_path: {fixed_file_path}")
-    print(f"Debug - abs_pdf_path: {abs_pdf_path}")
-    print(f"Debug - book_directory: {book_directory}")
+@main.route('/chat/<int:book_id>')
+def chat(book_id):
+    book_file = _book_file(book_id)
+    index = get_book_index(db.session, book_id, current_app.config['STORAGE_DIR'])
 
-    session['book_directory'] = book_directory
+    # The chat API looks the book's index up in the book_indexes registry
+    session['book_id'] = book_id
 
-    return render_template('chat.html', book_title=book_title, pdf_url=pdf_url)
+    return render_template('chat.html', book_title=book_file.title, chat_ready=index is not None,
+                           pdf_url=url_for('main.book_pdf', book_id=book_id))
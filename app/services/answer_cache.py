@@ -0,0 +1,280 @@
+"""
+Semantic answer cache per book.
+
+Readers of the same book keep asking near-identical questions. Each
+collection gets a SemanticAnswerCache that stores previous questions as
+normalized MiniLM embeddings together with the answer and cited pages; a
+new question whose cosine similarity to a stored one reaches the threshold
+is answered from the cache without retrieval or LLM calls.
+
+Caches are tied to the index stamp written by the ingestion scripts (see
+qa_registry.touch_index_stamp). When a book's Chroma collection is rebuilt
+the stamp changes and the cache for that book is dropped, both in memory
+and on disk.
+
+With persistence on, a new answer only marks its cache dirty. Dirty caches
+are written every ANSWER_CACHE_FLUSH_INTERVAL seconds by a daemon thread,
+and once more at exit, from a snapshot taken under the cache lock, so
+lookups never wait for the file to be written.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import numpy as np
+from app.services.qa_registry import index_stamp
+
+ANSWER_CACHE_FILE = "answer_cache.json"
+
+
+class SemanticAnswerCache:
+    """
+    Similarity-keyed answer cache for one collection.
+
+    Attributes:
+        threshold (float): Minimum cosine similarity for a hit.
+        ttl (float): Seconds an answer stays valid; 0 disables expiry.
+        max_entries (int): Entries kept before the least recently used is evicted.
+        stamp: Index stamp the cached answers were produced against.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl: float = 86400, max_entries: int = 256,
+                 stamp=None, persist_path: str = None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self.stamp = stamp
+        self.persist_path = persist_path
+        self._lock = threading.Lock()
+        # Serializes writers of persist_path; never held together with _lock by lookups
+        self._save_lock = threading.Lock()
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._entries = []
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding):
+        """
+        Return the cached {'response', 'pages'} for the most similar question, or None.
+        """
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._drop_expired(now)
+            if self._entries:
+                scores = self._vectors @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry = self._entries[best]
+                    entry['last_used'] = now
+                    self.hits += 1
+                    return {'response': entry['response'], 'pages': entry['pages']}
+            self.misses += 1
+            return None
+
+    def store(self, embedding, query: str, response: str, pages) -> None:
+        """Cache the answer to query, evicting expired and least recently used entries."""
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._drop_expired(now)
+            if len(self._entries) >= self.max_entries:
+                lru = min(range(len(self._entries)), key=lambda i: self._entries[i]['last_used'])
+                self._remove(lru)
+            self._entries.append({
+                'query': query,
+                'response': response,
+                'pages': list(pages),
+                'created_at': now,
+                'last_used': now,
+            })
+            if self._vectors.size:
+                self._vectors = np.vstack([self._vectors, vector[np.newaxis, :]])
+            else:
+                self._vectors = vector[np.newaxis, :]
+            self._dirty = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = []
+            self._vectors = np.zeros((0, 0), dtype=np.float32)
+            self._dirty = False
+        if self.persist_path:
+            remove_persisted_answers(os.path.dirname(self.persist_path))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop_expired(self, now: float) -> None:
+        if not self.ttl:
+            return
+        expired = [i for i, e in enumerate(self._entries) if now - e['created_at'] > self.ttl]
+        for i in reversed(expired):
+            self._remove(i)
+
+    def _remove(self, index: int) -> None:
+        del self._entries[index]
+        self._vectors = np.delete(self._vectors, index, axis=0)
+
+    def save(self) -> bool:
+        """
+        Write the cache to persist_path atomically if it changed since the last save.
+
+        Returns:
+            bool: True if the file was written.
+        """
+        if not self.persist_path:
+            return False
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                entries = [dict(entry) for entry in self._entries]
+                vectors = self._vectors.copy()
+                self._dirty = False
+            # Serialized outside _lock, so lookups and stores carry on meanwhile
+            data = {
+                'stamp': self.stamp,
+                'entries': [dict(entry, embedding=vectors[i].tolist()) for i, entry in enumerate(entries)]
+            }
+            try:
+                tmp_path = self.persist_path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.persist_path)
+            except OSError:
+                with self._lock:
+                    self._dirty = True
+                raise
+            return True
+
+    def load(self) -> None:
+        """Load entries from persist_path if it was written against the current stamp."""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning - Ignoring unreadable answer cache {self.persist_path}: {e}")
+            return
+        if data.get('stamp') != self.stamp:
+            return
+        with self._lock:
+            entries = data.get('entries', [])[-self.max_entries:]
+            self._entries = []
+            vectors = []
+            for entry in entries:
+                vectors.append(self._normalize(entry.pop('embedding')))
+                self._entries.append(entry)
+            if vectors:
+                self._vectors = np.vstack(vectors)
+            self._drop_expired(time.time())
+
+
+def remove_persisted_answers(chroma_db_path: str) -> None:
+    """
+    Delete the on-disk answer cache of an index, unless it was written against
+    the current index stamp. Called when the index is rebuilt, so a file
+    another worker already wrote for the new index is kept.
+    """
+    path = os.path.join(chroma_db_path, ANSWER_CACHE_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            stamp = json.load(f).get('stamp')
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError):
+        stamp = None
+    if stamp is not None and stamp == index_stamp(chroma_db_path):
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class AnswerCacheRegistry:
+    """Hand out one SemanticAnswerCache per collection, resetting it when the index is rebuilt."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._caches = {}
+        # Counters of caches dropped after a rebuild, so totals survive invalidation
+        self._retired_hits = 0
+        self._retired_misses = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def get(self, chroma_db_path: str, collection_name: str, threshold: float, ttl: float,
+            max_entries: int, persist: bool = False, flush_interval: float = 30.0) -> SemanticAnswerCache:
+        key = (os.path.abspath(chroma_db_path), collection_name)
+        stamp = index_stamp(chroma_db_path)
+        with self._lock:
+            cache = self._caches.get(key)
+            if cache is not None and cache.stamp == stamp:
+                return cache
+            if cache is not None:
+                print(f"Debug - Index for '{collection_name}' was rebuilt, dropping cached answers")
+                cache.clear()
+                self._retired_hits += cache.hits
+                self._retired_misses += cache.misses
+            persist_path = os.path.join(chroma_db_path, ANSWER_CACHE_FILE) if persist else None
+            cache = SemanticAnswerCache(threshold=threshold, ttl=ttl, max_entries=max_entries,
+                                        stamp=stamp, persist_path=persist_path)
+            cache.load()
+            self._caches[key] = cache
+            if persist:
+                self._start_flusher(flush_interval)
+            return cache
+
+    def flush(self) -> int:
+        """Write every persisted cache with new answers; returns the number written."""
+        with self._lock:
+            caches = list(self._caches.values())
+        written = 0
+        for cache in caches:
+            try:
+                written += cache.save()
+            except OSError as e:
+                print(f"Debug - Could not write answer cache {cache.persist_path}, will retry: {e}")
+        return written
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def _start_flusher(self, interval: float) -> None:
+        """Flush every interval seconds in a daemon thread, and once more at exit. Caller holds _lock."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval,),
+                                        name="answer-cache-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self._shutdown)
+
+    def _shutdown(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            caches = list(self._caches.values())
+            retired_hits, retired_misses = self._retired_hits, self._retired_misses
+        return {
+            'collections': len(caches),
+            'entries': sum(len(c) for c in caches),
+            'hits': retired_hits + sum(c.hits for c in caches),
+            'misses': retired_misses + sum(c.misses for c in caches),
+        }
+
+
+answer_caches = AnswerCacheRegistry()
@@ -0,0 +1,270 @@
+"""
+Asynchronous /chat and /chat/stream for the ASGI entry point (app/asgi.py).
+
+Under WSGI a chat request holds a worker for the whole chain run, most of
+which is spent waiting on the LLM API, so concurrent chats are capped at
+the number of workers. AsyncChat serves the two chat endpoints on an
+event loop instead: chains are awaited with ainvoke, and many chats wait
+on their LLM calls side by side in one process.
+
+The synchronous part of a request (session, index registry, answer cache,
+building the chain) is the prepare_chat() the WSGI views use, run in a
+thread inside a Flask request context. Then:
+
+- at most max_concurrency chains run at once; a request waits up to
+  queue_timeout seconds for a slot, then gets 503;
+- a chain still running after timeout seconds is cancelled (504, or an
+  error event once a stream has started);
+- a chain whose client disconnects is cancelled, so no further LLM calls
+  are paid for.
+"""
+import asyncio
+import json
+from typing import Optional
+from flask import jsonify
+from werkzeug.test import EnvironBuilder
+from app.routes.chat_routes import SSE_HEADERS, PreparedChat, finish_answer, prepare_chat, sse_event
+
+# Chat requests carry one question; anything larger is refused unread
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ChatBusy(Exception):
+    """No chain slot became free within the queue timeout."""
+
+
+class ChatTimeout(Exception):
+    """The chain ran longer than the request timeout."""
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the answer was sent."""
+
+
+async def _read_body(receive, limit: int) -> Optional[bytes]:
+    """The request body, or None if it exceeds limit bytes."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _wait_for_disconnect(receive) -> None:
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_json(send, status: int, body: bytes) -> None:
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _error_body(message: str) -> bytes:
+    return json.dumps({'error': message}).encode('utf-8')
+
+
+def _build_environ(scope, body: bytes) -> dict:
+    """WSGI environ for a chat request, enough for Flask's request and session."""
+    headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']]
+    host, port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    return EnvironBuilder(
+        path=scope['path'],
+        base_url=f"{scope.get('scheme', 'http')}://{host}:{port}{scope.get('root_path', '')}",
+        query_string=scope.get('query_string', b'').decode('latin-1'),
+        method=scope['method'],
+        headers=headers,
+        data=body,
+        environ_base={'REMOTE_ADDR': client[0]},
+    ).get_environ()
+
+
+class AsyncChat:
+    """
+    ASGI handler for POST /chat and /chat/stream of one Flask app.
+
+    Attributes:
+        max_concurrency (int): Chains allowed to run at once.
+        timeout (float): Seconds a chain may run before it is cancelled; 0 for no limit.
+        queue_timeout (float): Seconds a request may wait for a free slot.
+        running (int): Chains running now.
+        waiting (int): Requests waiting for a slot now.
+        counts (dict): Requests 'answered', refused as 'busy', cancelled on
+            'timeouts' and 'disconnects', and 'failures'.
+    """
+
+    PATHS = ('/chat', '/chat/stream')
+
+    def __init__(self, flask_app, max_concurrency: int = 32, timeout: float = 120.0,
+                 queue_timeout: float = 10.0):
+        self.flask_app = flask_app
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.running = 0
+        self.waiting = 0
+        self.counts = {'answered': 0, 'busy': 0, 'timeouts': 0, 'disconnects': 0, 'failures': 0}
+
+    async def __call__(self, scope, receive, send):
+        try:
+            body = await _read_body(receive, MAX_BODY_BYTES)
+        except ClientDisconnected:
+            self.counts['disconnects'] += 1
+            return
+        if body is None:
+            return await _send_json(send, 413, _error_body('Message too large'))
+
+        prepared, error = await asyncio.to_thread(self._prepare, _build_environ(scope, body))
+        if error is not None:
+            return await _send_json(send, *error)
+        if scope['path'] == '/chat/stream':
+            await self.stream(prepared, receive, send)
+        else:
+            await self.answer(prepared, receive, send)
+
+    def _prepare(self, environ):
+        """Run prepare_chat in a request context: (prepared, None) or (None, (status, body))."""
+        with self.flask_app.request_context(environ):
+            try:
+                prepared, error = prepare_chat()
+            except Exception as e:
+                print(f"Error in async chat route: {str(e)}")
+                error = jsonify({'error': 'Internal server error'}), 500
+            if error is None:
+                return prepared, None
+            response, status = error
+            return None, (status, response.get_data())
+
+    async def _run_in_slot(self, run):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise ChatBusy from None
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await asyncio.wait_for(run(), self.timeout or None)
+        except asyncio.TimeoutError:
+            raise ChatTimeout from None
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    async def _run(self, run, receive):
+        """
+        Await run() in a slot and within the timeout, cancelling it if the client disconnects.
+
+        Raises:
+            ChatBusy, ChatTimeout or ClientDisconnected, or whatever run() raises.
+        """
+        task = asyncio.ensure_future(self._run_in_slot(run))
+        disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            await asyncio.wait((task, disconnect), return_when=asyncio.FIRST_COMPLETED)
+            if not task.done():
+                raise ClientDisconnected
+            return task.result()
+        finally:
+            task.cancel()
+            disconnect.cancel()
+
+    def _failure(self, error: Exception):
+        """Count a failed run; (status, message) for the client, or None if it is gone."""
+        if isinstance(error, ClientDisconnected):
+            self.counts['disconnects'] += 1
+            return None
+        if isinstance(error, ChatBusy):
+            self.counts['busy'] += 1
+            return 503, 'The assistant is busy, please try again shortly'
+        if isinstance(error, ChatTimeout):
+            self.counts['timeouts'] += 1
+            return 504, 'The assistant took too long to answer'
+        self.counts['failures'] += 1
+        print(f"Error in async chat route: {str(error)}")
+        return 500, 'Internal server error'
+
+    async def answer(self, prepared: PreparedChat, receive, send) -> None:
+        """Reply to a prepared /chat request with JSON, as the WSGI view does."""
+        if prepared.cached is not None:
+            self.counts['answered'] += 1
+            return await _send_json(send, 200, json.dumps(prepared.cached).encode('utf-8'))
+        try:
+            result = await self._run(lambda: prepared.qa_chain.ainvoke({"query": prepared.query}), receive)
+            # Storing into the answer cache can write its file
+            reply = await asyncio.to_thread(finish_answer, prepared, result)
+        except Exception as e:
+            failure = self._failure(e)
+            if failure is not None:
+                await _send_json(send, failure[0], _error_body(failure[1]))
+            return
+        self.counts['answered'] += 1
+        await _send_json(send, 200, json.dumps(reply).encode('utf-8'))
+
+    async def stream(self, prepared: PreparedChat, receive, send) -> None:
+        """Reply to a prepared /chat/stream request with Server-Sent Events, as the WSGI view does."""
+        started = False
+
+        async def send_event(event: str, data: dict) -> None:
+            nonlocal started
+            if not started:
+                headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+                headers += [(name.lower().encode(), value.encode()) for name, value in SSE_HEADERS.items()]
+                await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+                started = True
+            await send({'type': 'http.response.body', 'body': sse_event(event, data).encode('utf-8'),
+                        'more_body': True})
+
+        async def produce() -> None:
+            from app.services.chat_streaming import astream_chain
+            events = astream_chain(prepared.qa_chain, prepared.query)
+            try:
+                async for event, payload in events:
+                    if event == 'token':
+                        await send_event('token', {'text': payload})
+                    elif event == 'reset':
+                        await send_event('reset', {})
+                    elif event == 'done':
+                        reply = await asyncio.to_thread(finish_answer, prepared, payload)
+                        await send_event('pages', {'pages': reply['pages']})
+                        await send_event('done', {'response': reply['response']})
+            finally:
+                # Cancels the chain if we stopped early
+                await events.aclose()
+
+        cached = prepared.cached
+        try:
+            if cached is not None:
+                await send_event('token', {'text': cached['response']})
+                await send_event('pages', {'pages': cached['pages']})
+                await send_event('done', {'response': cached['response']})
+            else:
+                await self._run(produce, receive)
+            self.counts['answered'] += 1
+        except Exception as e:
+            failure = self._failure(e)
+            if failure is None:
+                return
+            if not started:
+                return await _send_json(send, failure[0], _error_body(failure[1]))
+            await send_event('error', {'error': failure[1]})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    def stats(self) -> dict:
+        return dict(self.counts, running=self.running, waiting=self.waiting,
+                    max_concurrency=self.max_concurrency)
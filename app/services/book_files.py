@@ -0,0 +1,104 @@
+"""
+Lookup of book PDF files by book id.
+
+The download and chat routes map a book id to its PDF on disk: a Book
+query and a safe_join against STORAGE_DIR. The result rarely changes, so
+a LookupCache keeps it per book id for a few minutes, and a request for a
+known book costs only a read of the catalog version and no path handling.
+Any catalog write empties the cache (LookupCache.sync), so an id reused
+after a delete never gets the deleted book's file. Unknown book ids are
+cached too, so repeated requests for them are cheap as well. Whether the
+file exists is left to send_file, which stats it anyway.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from werkzeug.utils import safe_join
+from config import BOOK_FILE_CACHE_TTL
+
+
+class BookFile(NamedTuple):
+    """
+    A book's PDF: absolute path and path relative to the storage directory
+    (both None if file_path points outside it), and the book's title.
+    """
+    path: Optional[str]
+    rel_path: Optional[str]
+    title: str
+
+
+def resolve_book_file(file_path: str, storage_dir: str) -> Optional[tuple]:
+    """
+    Resolve a books.file_path inside storage_dir.
+
+    Accepts paths stored relative to app/static, with or without a leading
+    slash or 'app/static/' prefix.
+
+    Returns:
+        tuple: (absolute path, path relative to storage_dir), or None if
+        the path is empty or escapes storage_dir.
+    """
+    if not file_path:
+        return None
+    rel_path = file_path.lstrip('/')
+    if rel_path.startswith('app/static/'):
+        rel_path = rel_path[len('app/static/'):]
+    path = safe_join(storage_dir, rel_path)
+    if path is None:
+        return None
+    path = os.path.abspath(path)
+    return path, os.path.relpath(path, os.path.abspath(storage_dir)).replace(os.sep, '/')
+
+
+class LookupCache:
+    """
+    LRU cache of per-book lookups (book id -> value, or None) with a TTL.
+
+    Attributes:
+        ttl (float): Seconds an entry is trusted before it is looked up again.
+        max_entries (int): Entries kept before the least recently used is evicted.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+    def sync(self, version) -> None:
+        """Drop every entry if version differs from the one last synced."""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def get(self, book_id: int, load):
+        """Return the cached value for book_id, calling load() when it is missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(book_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(book_id)
+                return entry[0]
+        value = load()
+        with self._lock:
+            self._entries[book_id] = (value, now)
+            self._entries.move_to_end(book_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, book_id: int) -> None:
+        with self._lock:
+            self._entries.pop(book_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by all requests in this process
+book_files = LookupCache(ttl=BOOK_FILE_CACHE_TTL)
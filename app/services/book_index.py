@@ -0,0 +1,224 @@
+"""
+Registry of ingested books (the book_indexes table).
+
+Usage:
+    python -m app.services.book_index [--db instance/app.db]
+
+The ingestion scripts record, for every book whose PDF they ingest, where
+its Chroma store is, the collection name, how many chunks it holds, the
+embedding model and when it was built. The chat API reads the registry
+(through a short-lived in-process cache) instead of deriving paths from
+the session, so a question about a book that was never ingested is
+refused at once instead of opening an empty Chroma store.
+
+Books are matched to PDFs by their file_path. Running this module
+registers books ingested before the registry existed, from the files the
+pipeline left next to each PDF.
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+from typing import NamedTuple, Optional
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from app.migrations import migrate
+from app.models import BookIndex
+from app.services.book_files import LookupCache, resolve_book_file
+from app.services.catalog_version import catalog_version
+from config import DATABASE_PATH, STORAGE_DIR, BOOK_INDEX_CACHE_TTL
+
+# Written next to each PDF by ingest_pipeline
+INGEST_MANIFEST_FILE = "ingest_manifest.json"
+
+_UPSERT_SQL = (
+    "INSERT INTO book_indexes (book_id, index_dir, collection_name, chunk_count, embedding_model, "
+    "pipeline_version, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(book_id) DO UPDATE SET index_dir = excluded.index_dir, "
+    "collection_name = excluded.collection_name, chunk_count = excluded.chunk_count, "
+    "embedding_model = excluded.embedding_model, pipeline_version = excluded.pipeline_version, "
+    "ingested_at = excluded.ingested_at"
+)
+
+
+class BookIndexEntry(NamedTuple):
+    """Where a book's chat index lives, as the chat API needs it."""
+    book_id: int
+    chroma_db_path: str
+    collection_name: str
+    chunk_count: int
+    embedding_model: Optional[str]
+    ingested_at: str
+
+
+def _file_path_forms(rel_path: str) -> tuple:
+    """The ways a books.file_path may spell a path relative to STORAGE_DIR."""
+    return rel_path, f"/{rel_path}", f"app/static/{rel_path}"
+
+
+def register_book_index(pdf_path: str, chunk_count: int, embedding_model: str = None,
+                        pipeline_version: int = None, ingested_at: str = None,
+                        db_path: str = DATABASE_PATH, storage_dir: str = STORAGE_DIR) -> list:
+    """
+    Record the Chroma index next to pdf_path for every book with that PDF.
+
+    The collection is named after the PDF's directory, as store_in_chroma
+    names it.
+
+    Returns:
+        list: Ids of the books registered; empty if no book has this PDF.
+    """
+    directory = os.path.dirname(os.path.abspath(pdf_path))
+    rel_pdf = os.path.relpath(os.path.abspath(pdf_path), os.path.abspath(storage_dir)).replace(os.sep, '/')
+    rel_dir = os.path.dirname(rel_pdf)
+    collection_name = os.path.basename(os.path.normpath(directory))
+    ingested_at = ingested_at or datetime.now().isoformat()
+
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={'timeout': 30})
+    try:
+        # Ingestion may run before the web app ever started on this database
+        migrate(engine)
+        with engine.begin() as conn:
+            forms = _file_path_forms(rel_pdf)
+            book_ids = [row[0] for row in conn.exec_driver_sql(
+                "SELECT id FROM books WHERE file_path IN (?, ?, ?)", forms)]
+            for book_id in book_ids:
+                conn.exec_driver_sql(_UPSERT_SQL, (book_id, rel_dir, collection_name, chunk_count,
+                                                   embedding_model, pipeline_version, ingested_at))
+    finally:
+        engine.dispose()
+    return book_ids
+
+
+def describe_ingested_pdf(directory: str) -> Optional[dict]:
+    """
+    Describe the ingested book in directory from the files ingestion left there.
+
+    Uses ingest_manifest.json when the pipeline wrote one, otherwise the
+    older extracted_metadata.json and final_chunks.json.
+
+    Returns:
+        dict: register_book_index() arguments ('pdf_path', 'chunk_count',
+        'embedding_model', 'pipeline_version', 'ingested_at'), or None if
+        the directory has no Chroma store or its PDF cannot be told.
+    """
+    if not os.path.isfile(os.path.join(directory, "chroma_db", "chroma.sqlite3")):
+        return None
+    manifest_path = os.path.join(directory, INGEST_MANIFEST_FILE)
+    try:
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            stages = manifest.get('stages', {})
+            extract, embed, store = stages.get('extract', {}), stages.get('embed', {}), stages.get('store', {})
+            if store.get('status') != 'done' or not extract.get('inputs'):
+                return None
+            return {
+                'pdf_path': os.path.join(directory, next(iter(extract['inputs']))),
+                'chunk_count': store.get('items') or 0,
+                'embedding_model': embed.get('params', {}).get('model'),
+                'pipeline_version': manifest.get('version'),
+                'ingested_at': store.get('completed_at'),
+            }
+        with open(os.path.join(directory, "extracted_metadata.json"), 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        with open(os.path.join(directory, "final_chunks.json"), 'r', encoding='utf-8') as f:
+            chunk_count = len(json.load(f))
+    except (OSError, ValueError):
+        return None
+    return {
+        'pdf_path': os.path.join(directory, f"{metadata.get('doc_title')}.pdf"),
+        'chunk_count': chunk_count,
+        'embedding_model': None,
+        'pipeline_version': None,
+        'ingested_at': metadata.get('processing_date'),
+    }
+
+
+def register_directory(directory: str, db_path: str = DATABASE_PATH, storage_dir: str = STORAGE_DIR) -> list:
+    """Register the ingested book in directory, if any. Returns the registered book ids."""
+    description = describe_ingested_pdf(directory)
+    if description is None:
+        return []
+    return register_book_index(db_path=db_path, storage_dir=storage_dir, **description)
+
+
+def backfill(db_path: str = DATABASE_PATH, storage_dir: str = STORAGE_DIR) -> dict:
+    """
+    Register every catalog book whose PDF directory holds an ingested index.
+
+    Returns:
+        dict: 'directories' with an index, 'registered' book ids, and
+        'unindexed' count of books without one.
+    """
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        with engine.connect() as conn:
+            file_paths = [row[0] for row in conn.exec_driver_sql(
+                "SELECT DISTINCT file_path FROM books WHERE file_path IS NOT NULL")]
+            total = conn.exec_driver_sql("SELECT COUNT(*) FROM books").scalar()
+    finally:
+        engine.dispose()
+
+    directories = set()
+    for file_path in file_paths:
+        resolved = resolve_book_file(file_path, storage_dir)
+        if resolved is not None:
+            directories.add(os.path.dirname(resolved[0]))
+    registered = []
+    indexed = 0
+    for directory in sorted(directories):
+        book_ids = register_directory(directory, db_path, storage_dir)
+        indexed += bool(book_ids)
+        registered.extend(book_ids)
+    return {'directories': indexed, 'registered': registered, 'unindexed': total - len(registered)}
+
+
+def load_book_index(session, book_id: int, storage_dir: str) -> Optional[BookIndexEntry]:
+    """Read book_id's registry row through a SQLAlchemy session; None if it has no usable index."""
+    row = session.get(BookIndex, book_id)
+    if row is None or not row.chunk_count:
+        return None
+    return BookIndexEntry(
+        book_id=book_id,
+        chroma_db_path=os.path.join(storage_dir, row.index_dir, "chroma_db"),
+        collection_name=row.collection_name,
+        chunk_count=row.chunk_count,
+        embedding_model=row.embedding_model,
+        ingested_at=row.ingested_at,
+    )
+
+
+# Shared by all requests in this process
+book_indexes = LookupCache(ttl=BOOK_INDEX_CACHE_TTL)
+
+
+def get_book_index(session, book_id: int, storage_dir: str) -> Optional[BookIndexEntry]:
+    """
+    book_id's registry entry through the shared cache; None if it has no usable index.
+
+    The cache is emptied whenever the catalog version changes: a deleted
+    book's id can be reused by the next book inserted, which must not be
+    answered from the old book's cached index.
+    """
+    book_indexes.sync(catalog_version(session.connection())[0])
+    return book_indexes.get(book_id, lambda: load_book_index(session, book_id, storage_dir))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.book_index",
+        description="Register books ingested before the book_indexes registry existed."
+    )
+    parser.add_argument("--db", default=DATABASE_PATH, help="SQLite database (default: instance/app.db)")
+    args = parser.parse_args()
+
+    try:
+        report = backfill(args.db)
+    except OperationalError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Registered {len(report['registered'])} book(s) from {report['directories']} indexed "
+          f"director{'y' if report['directories'] == 1 else 'ies'}; "
+          f"{report['unindexed']} book(s) have no chat index.")
@@ -0,0 +1,191 @@
+"""
+Ingest every book in the catalog with a bounded pool of worker processes.
+
+Usage:
+    python -m app.services.bulk_ingest [--catalog data/books_data.csv] [--workers N]
+
+Books are discovered from the catalog CSV's file_path column (relative to
+app/static). Each book runs through the resumable ingest pipeline, so books
+that are already up to date cost only a few file hashes. Every worker
+loads the embedding model once, in its initializer, and reuses it for all
+the books it processes. A failing book is recorded and the run moves on.
+If the pool itself breaks (a worker is killed, or the initializer cannot
+load the model), the books left unfinished are recorded as failed with the
+cause and the summary is still printed.
+"""
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from sentence_transformers import SentenceTransformer
+from app.services.ingest_pipeline import run_pipeline
+from app.services.generate_embeddings import EMBEDDING_MODEL
+from config import BASE_DIR, STORAGE_DIR
+
+DEFAULT_CATALOG = os.path.join(BASE_DIR, 'data', 'books_data.csv')
+
+# Embedding model of the current worker process, loaded by _init_worker
+_worker_model = None
+
+
+def discover_books(catalog_path: str, storage_dir: str = STORAGE_DIR):
+    """
+    Read the catalog and resolve each row's PDF.
+
+    Returns:
+        tuple: (books, problems). books is a list of {'title', 'pdf_path'};
+        problems is a list of failure reports for rows that cannot be ingested.
+    """
+    books, problems = [], []
+    seen_dirs = {}
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            title = row.get('title') or '(untitled)'
+            file_path = (row.get('file_path') or '').strip().lstrip('/')
+            if file_path.startswith('app/static/'):
+                file_path = file_path[len('app/static/'):]
+            if not file_path.lower().endswith('.pdf'):
+                continue
+            pdf_path = os.path.abspath(os.path.join(storage_dir, file_path))
+            if not os.path.isfile(pdf_path):
+                problems.append({'title': title, 'pdf_path': pdf_path, 'status': 'failed',
+                                 'error': 'PDF not found'})
+                continue
+            # Pipeline outputs live next to the PDF, so two PDFs cannot share a directory
+            directory = os.path.dirname(pdf_path)
+            if directory in seen_dirs:
+                if seen_dirs[directory] != pdf_path:
+                    problems.append({'title': title, 'pdf_path': pdf_path, 'status': 'failed',
+                                     'error': f'directory already used by {seen_dirs[directory]}'})
+                continue
+            seen_dirs[directory] = pdf_path
+            books.append({'title': title, 'pdf_path': pdf_path})
+    return books, problems
+
+
+def _init_worker():
+    global _worker_model
+    _worker_model = SentenceTransformer(EMBEDDING_MODEL)
+
+
+def ingest_book(book: dict, force: bool = False) -> dict:
+    """Run the pipeline for one book in a worker and summarize the outcome."""
+    started = time.perf_counter()
+    result = {'title': book['title'], 'pdf_path': book['pdf_path'], 'pages': 0, 'chunks': 0}
+    try:
+        # Each book gets one core; parallelism comes from the pool
+        reports = run_pipeline(book['pdf_path'], force=force, workers=1, model=_worker_model)
+    except Exception as e:
+        result.update(status='failed', error=f"{type(e).__name__}: {e}")
+    else:
+        ran = [r for r in reports if r['status'] == 'ran']
+        result['status'] = 'ingested' if ran else 'up to date'
+        for report in ran:
+            if report['stage'] == 'extract':
+                result['pages'] = report['items'] or 0
+            elif report['stage'] == 'chunk':
+                result['chunks'] = report['items'] or 0
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def bulk_ingest(catalog_path: str = DEFAULT_CATALOG, workers: int = None, force: bool = False,
+                limit: int = None, storage_dir: str = STORAGE_DIR) -> dict:
+    """
+    Ingest every catalog book across a process pool.
+
+    Args:
+        workers (int): Concurrent books (default: CPU count).
+        limit (int): Only ingest the first N discovered books.
+        storage_dir (str): Directory the catalog's file_path values are relative to.
+
+    Returns:
+        dict: 'books' (per-book results), 'wall_time', 'pages_per_second'
+        and 'chunks_per_second' over the newly processed pages and chunks.
+    """
+    books, results = discover_books(catalog_path, storage_dir)
+    if limit is not None:
+        books = books[:limit]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(books) or 1))
+    print(f"Ingesting {len(books)} book(s) with {workers} worker(s)...")
+
+    started = time.perf_counter()
+    if books:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            pending = {executor.submit(ingest_book, book, force): book for book in books}
+            try:
+                for done, future in enumerate(as_completed(pending), start=1):
+                    result = future.result()
+                    del pending[future]
+                    results.append(result)
+                    print(f"[{done}/{len(books)}] {result['status']:<10} {result['title']} "
+                          f"({result['seconds']:.1f}s)")
+            except BrokenProcessPool as e:
+                error = f"{type(e).__name__}: {e}"
+                print(f"Error: the worker pool broke, {len(pending)} book(s) left unfinished: {error}")
+                for future, book in pending.items():
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        # Finished before the pool broke
+                        results.append(future.result())
+                    else:
+                        results.append({'title': book['title'], 'pdf_path': book['pdf_path'], 'status': 'failed',
+                                        'pages': 0, 'chunks': 0, 'seconds': 0.0, 'error': error})
+    wall_time = time.perf_counter() - started
+
+    pages = sum(r.get('pages', 0) for r in results)
+    chunks = sum(r.get('chunks', 0) for r in results)
+    return {
+        'books': results,
+        'wall_time': wall_time,
+        'pages': pages,
+        'chunks': chunks,
+        'pages_per_second': pages / wall_time if wall_time else 0.0,
+        'chunks_per_second': chunks / wall_time if wall_time else 0.0,
+    }
+
+
+def print_summary(summary: dict) -> None:
+    results = summary['books']
+    failed = [r for r in results if r['status'] == 'failed']
+    counts = {}
+    for r in results:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+
+    print("\nBulk ingestion summary")
+    print("-" * 50)
+    for status, count in sorted(counts.items()):
+        print(f"{status:<12} {count}")
+    print(f"Wall time:   {summary['wall_time']:.1f}s")
+    print(f"Throughput:  {summary['pages_per_second']:.1f} pages/s, "
+          f"{summary['chunks_per_second']:.1f} chunks/s "
+          f"({summary['pages']} pages, {summary['chunks']} chunks processed)")
+    if failed:
+        print("\nFailures:")
+        for r in failed:
+            print(f"- {r['title']} ({r['pdf_path']}): {r['error']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.bulk_ingest",
+        description="Ingest every book listed in the catalog CSV."
+    )
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG, help="catalog CSV (default: data/books_data.csv)")
+    parser.add_argument("--workers", type=int, default=None, help="books ingested concurrently (default: CPU count)")
+    parser.add_argument("--limit", type=int, default=None, help="only ingest the first N books")
+    parser.add_argument("--force", action="store_true", help="re-run every stage of every book")
+    parser.add_argument("--report", help="also write the per-book results to this JSON file")
+    args = parser.parse_args()
+
+    summary = bulk_ingest(args.catalog, workers=args.workers, force=args.force, limit=args.limit)
+    print_summary(summary)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.report}")
+    if any(r['status'] == 'failed' for r in summary['books']):
+        sys.exit(1)
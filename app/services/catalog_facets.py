@@ -0,0 +1,82 @@
+"""
+Facet counts for the catalog sidebar.
+
+The sidebar shows how many books there are per language, per category and
+at or above each rating threshold. Counting those takes a GROUP BY scan
+of books per facet, so the counts are computed once per catalog version
+(see catalog_version.py) and kept in memory: until a Book write bumps the
+version, rendering the sidebar costs no queries beyond the version read
+home() already does. Each scan runs over a narrow index (language,
+category or rating) rather than the table.
+"""
+import threading
+from sqlalchemy import text
+
+# Minimum ratings offered by the sidebar's rating filter (rating >= threshold)
+RATING_THRESHOLDS = (5, 4, 3)
+
+
+def _grouped_counts(connection, column: str) -> list:
+    return [tuple(row) for row in connection.execute(text(
+        f"SELECT {column}, COUNT(*) FROM books WHERE {column} IS NOT NULL AND {column} != '' "
+        f"GROUP BY {column} ORDER BY COUNT(*) DESC, {column}"
+    ))]
+
+
+def compute_facets(connection) -> dict:
+    """
+    Count books per facet value.
+
+    Returns:
+        dict: 'languages' and 'categories' as [(value, count)], most
+        common first; 'ratings' as [(threshold, count of books rated at
+        least threshold)] for RATING_THRESHOLDS; 'total' books.
+    """
+    # Integer buckets, summed into the cumulative counts the ">= N" filter uses
+    buckets = dict(connection.execute(text(
+        "SELECT CAST(rating AS INTEGER), COUNT(*) FROM books WHERE rating IS NOT NULL GROUP BY 1"
+    )).all())
+    return {
+        'languages': _grouped_counts(connection, 'language'),
+        'categories': _grouped_counts(connection, 'category'),
+        'ratings': [(threshold, sum(count for bucket, count in buckets.items() if bucket >= threshold))
+                    for threshold in RATING_THRESHOLDS],
+        'total': connection.execute(text("SELECT COUNT(*) FROM books")).scalar(),
+    }
+
+
+class FacetCache:
+    """
+    Facet counts of the latest catalog version seen by this process.
+
+    Only one version is kept: once the catalog changes, older counts are
+    never asked for again. Concurrent requests for a new version wait for
+    a single computation instead of each running the scans.
+
+    Attributes:
+        computations (int): Times the facets were computed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._facets = None
+        self.computations = 0
+
+    def get(self, version, compute):
+        """Return the facets for version, calling compute() if they are not cached."""
+        with self._lock:
+            if self._version != version:
+                self._facets = compute()
+                self._version = version
+                self.computations += 1
+            return self._facets
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version = None
+            self._facets = None
+
+
+# Shared by all requests in this process
+facet_cache = FacetCache()
@@ -0,0 +1,304 @@
+"""
+Bulk import of a catalog CSV (data/books_data.csv format) into the books table.
+
+Usage:
+    python -m app.services.catalog_import [csv_path] [--db instance/app.db] [--batch-size N] [--no-thumbnails]
+
+This is the only catalog import path. Startup seeding, seed_data.py and
+import_csv.py all go through import_catalog(). The CSV is streamed and
+validated row by row and written with executemany() in batches, all inside
+one BEGIN IMMEDIATE transaction on a connection tuned for bulk loading.
+Books are upserted on ISBN, so re-importing an updated dump updates
+existing books in place, except for download and discussion counts already
+stored. Rows identical to the stored book are not rewritten, so they do not
+touch the search index or the catalog version.
+
+Loading a file with at least as many rows as the table already holds
+(or with rebuild_index=True) drops the full-text and catalog-version
+triggers for the duration of the load, then rebuilds the search index and
+bumps the version once, which is several times faster than maintaining
+both row by row. The triggers are dropped and recreated inside the same
+transaction, so no other connection ever sees the table without them.
+"""
+import os
+import csv
+import sys
+import time
+import argparse
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from app.services import catalog_search, catalog_version, thumbnails
+from config import BASE_DIR, DATABASE_PATH
+
+DEFAULT_CSV = os.path.join(BASE_DIR, 'data', 'books_data.csv')
+
+# books columns filled from the CSV, in insert order; isbn is the upsert key
+COLUMNS = ('title', 'author', 'category', 'language', 'description', 'publisher', 'isbn',
+           'publish_date', 'pages', 'rating', 'reviews_count', 'file_path', 'image_path',
+           'top_downloads', 'most_discussed')
+REQUIRED = ('title', 'author', 'isbn')
+INTEGER_COLUMNS = ('pages', 'reviews_count', 'top_downloads', 'most_discussed')
+
+# Popularity counters are counted live once a book exists (see popularity.py);
+# the CSV only seeds them and never overwrites a stored count
+COUNTER_COLUMNS = ('top_downloads', 'most_discussed')
+
+_UPDATED = [c for c in COLUMNS if c != 'isbn' and c not in COUNTER_COLUMNS]
+_ASSIGNMENTS = ([f'{c} = excluded.{c}' for c in _UPDATED] +
+                [f'{c} = COALESCE(books.{c}, excluded.{c})' for c in COUNTER_COLUMNS])
+_CHANGED = ([f'books.{c} IS NOT excluded.{c}' for c in _UPDATED] +
+            [f'(books.{c} IS NULL AND excluded.{c} IS NOT NULL)' for c in COUNTER_COLUMNS])
+UPSERT_SQL = (
+    f"INSERT INTO books ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)}) "
+    f"ON CONFLICT(isbn) DO UPDATE SET {', '.join(_ASSIGNMENTS)} "
+    f"WHERE {' OR '.join(_CHANGED)}"
+)
+
+# Per-connection settings for the import; nothing here persists in the file.
+# A crash mid-import rolls the whole transaction back, and the import can be re-run.
+BULK_PRAGMAS = (
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",  # 64 MiB page cache
+)
+
+# Validation errors kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(ValueError):
+    """A CSV row that cannot be imported."""
+
+
+_REQUIRED_POS = [COLUMNS.index(c) for c in REQUIRED]
+_INTEGER_POS = [(COLUMNS.index(c), c) for c in INTEGER_COLUMNS]
+_RATING_POS = COLUMNS.index('rating')
+_DATE_POS = COLUMNS.index('publish_date')
+
+
+def row_parser(header: list):
+    """
+    Build a function that validates one CSV row (a list, in header order)
+    and converts it to a books parameter tuple.
+
+    Columns are located by header name once, so rows are parsed without
+    building a dict each. Columns missing from the header import as NULL.
+
+    Raises:
+        ValueError: If the header lacks a required column.
+    """
+    index = {name.strip(): i for i, name in enumerate(header)}
+    missing = [c for c in REQUIRED if c not in index]
+    if missing:
+        raise ValueError(f"CSV header is missing required column(s): {', '.join(missing)}")
+    positions = [index.get(c) for c in COLUMNS]
+    width = len(header)
+
+    def parse(row: list) -> tuple:
+        """
+        Raises:
+            RowError: If a required field is missing or a value has the wrong type.
+        """
+        if len(row) < width:
+            row = row + [''] * (width - len(row))
+        values = [None if i is None else (row[i].strip() or None) for i in positions]
+
+        for pos in _REQUIRED_POS:
+            if values[pos] is None:
+                raise RowError(f"missing {COLUMNS[pos]}")
+        for pos, column in _INTEGER_POS:
+            if values[pos] is not None:
+                try:
+                    values[pos] = int(values[pos])
+                except ValueError:
+                    raise RowError(f"{column} is not an integer: {values[pos]!r}")
+                if values[pos] < 0:
+                    raise RowError(f"{column} is negative: {values[pos]}")
+        if values[_RATING_POS] is not None:
+            try:
+                values[_RATING_POS] = float(values[_RATING_POS])
+            except ValueError:
+                raise RowError(f"rating is not a number: {values[_RATING_POS]!r}")
+            if not 0 <= values[_RATING_POS] <= 5:
+                raise RowError(f"rating out of range 0-5: {values[_RATING_POS]}")
+        if values[_DATE_POS] is not None:
+            try:
+                date.fromisoformat(values[_DATE_POS])
+            except ValueError:
+                raise RowError(f"publish_date is not YYYY-MM-DD: {values[_DATE_POS]!r}")
+        return tuple(values)
+
+    return parse
+
+
+def _batches(reader, batch_size: int, report: dict):
+    """Yield lists of validated parameter tuples, recording invalid rows in report."""
+    parse = row_parser(next(reader, []))
+    batch = []
+    for row in reader:
+        if not row:
+            continue
+        report['rows'] += 1
+        try:
+            batch.append(parse(row))
+        except RowError as e:
+            report['invalid'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append(f"line {reader.line_num}: {e}")
+            continue
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_TITLE_POS = COLUMNS.index('title')
+_AUTHOR_POS = COLUMNS.index('author')
+_ISBN_POS = COLUMNS.index('isbn')
+
+
+def _adopt_isbns(conn, batch: list, unkeyed: dict) -> None:
+    """
+    Give ISBN-less books the ISBN of the matching CSV row, so the upsert
+    updates them instead of inserting duplicates.
+
+    Args:
+        unkeyed (dict): {(title, author): book id} of books without an ISBN;
+            matched entries are removed.
+    """
+    updates = []
+    for row in batch:
+        book_id = unkeyed.pop((row[_TITLE_POS], row[_AUTHOR_POS]), None)
+        if book_id is not None:
+            updates.append((row[_ISBN_POS], book_id, row[_ISBN_POS]))
+    if updates:
+        conn.exec_driver_sql(
+            "UPDATE books SET isbn = ? WHERE id = ? AND NOT EXISTS (SELECT 1 FROM books WHERE isbn = ?)",
+            updates
+        )
+
+
+def estimate_rows(csv_path: str, sample_bytes: int = 1 << 16) -> int:
+    """Rough row count of a CSV from its size and the line length of its first bytes."""
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as f:
+        sample = f.read(sample_bytes)
+    lines = sample.count(b'\n')
+    if not lines:
+        return 1 if size else 0
+    return max(1, int(size / (len(sample) / lines)) - 1)
+
+
+def import_catalog(db_path: str = DATABASE_PATH, csv_path: str = DEFAULT_CSV, batch_size: int = 5000,
+                   only_if_empty: bool = False, rebuild_index: bool = False) -> dict:
+    """
+    Upsert every valid row of csv_path into the books table of db_path.
+
+    Args:
+        batch_size (int): Rows per executemany() call.
+        only_if_empty (bool): Do nothing if books already has rows (startup seeding).
+        rebuild_index (bool): Rebuild the search index once after the load
+            instead of updating it per row; implied when the CSV has about
+            as many rows as books or more.
+
+    Returns:
+        dict: 'rows' read, 'inserted', 'updated', 'unchanged', 'invalid',
+        'errors' (first MAX_REPORTED_ERRORS messages), 'seconds' and
+        'rows_per_second'.
+    """
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Catalog CSV not found at {csv_path}")
+
+    report = {'rows': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'invalid': 0, 'errors': [],
+              'seconds': 0.0, 'rows_per_second': 0.0}
+    started = time.perf_counter()
+    # AUTOCOMMIT: the transaction is managed explicitly below
+    engine = create_engine(f"sqlite:///{db_path}", isolation_level="AUTOCOMMIT",
+                           connect_args={'timeout': 30})
+    try:
+        with engine.connect() as conn:
+            for pragma in BULK_PRAGMAS:
+                conn.exec_driver_sql(pragma)
+            # Take the write lock up front so concurrent seeders queue instead of interleaving
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                if only_if_empty and conn.exec_driver_sql("SELECT 1 FROM books LIMIT 1").first():
+                    conn.exec_driver_sql("ROLLBACK")
+                    return report
+                before = conn.exec_driver_sql("SELECT COUNT(*) FROM books").scalar()
+
+                # A rebuild costs about as much per stored book as the triggers cost per written row
+                bulk = rebuild_index or estimate_rows(csv_path) >= before
+                if bulk:
+                    for trigger in catalog_search.TRIGGERS + catalog_version.TRIGGERS:
+                        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+
+                # Books stored before ISBNs were imported are matched on title and author once
+                unkeyed = {}
+                for book_id, title, author in conn.exec_driver_sql(
+                        "SELECT id, title, author FROM books WHERE isbn IS NULL"):
+                    unkeyed.setdefault((title, author), book_id)
+
+                written = 0
+                with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+                    for batch in _batches(csv.reader(f), batch_size, report):
+                        if unkeyed:
+                            _adopt_isbns(conn, batch, unkeyed)
+                        written += conn.exec_driver_sql(UPSERT_SQL, batch).rowcount
+
+                if bulk:
+                    # Recreating the triggers rebuilds the index and bumps the version
+                    catalog_search.ensure_search_index(conn)
+                    catalog_version.ensure_catalog_state(conn)
+                after = conn.exec_driver_sql("SELECT COUNT(*) FROM books").scalar()
+                conn.exec_driver_sql("COMMIT")
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+    finally:
+        engine.dispose()
+
+    report['inserted'] = after - before
+    report['updated'] = written - report['inserted']
+    report['unchanged'] = report['rows'] - report['invalid'] - written
+    report['seconds'] = time.perf_counter() - started
+    report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] else 0.0
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"Read {report['rows']} rows in {report['seconds']:.2f}s "
+          f"({report['rows_per_second']:,.0f} rows/s)")
+    print(f"Inserted: {report['inserted']}, updated: {report['updated']}, "
+          f"unchanged: {report['unchanged']}, invalid: {report['invalid']}")
+    for error in report['errors']:
+        print(f"- {error}")
+    if report['invalid'] > len(report['errors']):
+        print(f"... and {report['invalid'] - len(report['errors'])} more invalid rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.catalog_import",
+        description="Upsert a catalog CSV into the books table, keyed on ISBN."
+    )
+    parser.add_argument("csv_path", nargs="?", default=DEFAULT_CSV,
+                        help="catalog CSV (default: data/books_data.csv)")
+    parser.add_argument("--db", default=DATABASE_PATH, help="SQLite database (default: instance/app.db)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per executemany() batch")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="rebuild the search index once after the load (faster for large dumps)")
+    parser.add_argument("--no-thumbnails", action="store_true",
+                        help="skip generating cover thumbnails after the import")
+    args = parser.parse_args()
+
+    try:
+        print_report(import_catalog(args.db, args.csv_path, batch_size=args.batch_size,
+                                    rebuild_index=args.rebuild_index))
+        if not args.no_thumbnails:
+            thumbnails.print_report(thumbnails.generate_catalog_thumbnails(args.db))
+    except (FileNotFoundError, ValueError, OperationalError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
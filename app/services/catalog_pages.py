@@ -0,0 +1,144 @@
+"""
+Keyset pagination and cached result counts for the catalog listing.
+
+query.paginate() runs COUNT(*) plus LIMIT/OFFSET on every page, and OFFSET
+makes SQLite step over every skipped row, so deep pages get slower
+linearly. keyset_page() instead remembers the sort key of the last (or
+first) row shown and asks for the rows after (or before) it, which an
+index on the sort key answers in the same time on any page. Counts are
+cached per filter combination, so the page-of-pages display does not cost
+a COUNT(*) per request.
+"""
+import json
+import math
+import time
+import base64
+import threading
+from collections import OrderedDict
+from sqlalchemy import tuple_
+from config import CATALOG_COUNT_TTL
+
+# Range of SQLite's 64-bit INTEGER; larger Python ints cannot be bound
+SQLITE_MIN_INT, SQLITE_MAX_INT = -2 ** 63, 2 ** 63 - 1
+
+
+def encode_cursor(values) -> str:
+    """Opaque URL-safe token for a row's sort key."""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, size: int):
+    """
+    Sort key from a cursor token, or None if the token is missing or malformed.
+
+    Args:
+        size (int): Number of sort key columns the token must contain.
+    """
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return None
+    # Crafted values SQLite cannot bind or compare: out-of-range integers, inf and nan
+    if not all(SQLITE_MIN_INT <= v <= SQLITE_MAX_INT if isinstance(v, int) else math.isfinite(v)
+               for v in values):
+        return None
+    return tuple(values)
+
+
+def keyset_condition(columns, descending: bool, cursor):
+    """WHERE clause selecting the rows that come after cursor in (columns) order."""
+    key = tuple_(*columns)
+    return key < tuple_(*cursor) if descending else key > tuple_(*cursor)
+
+
+def keyset_page(query, columns, descending: bool, per_page: int, after=None, before=None,
+                offset: int = 0):
+    """
+    Fetch one page of query in (columns) order, starting after or before a cursor.
+
+    columns must be a unique sort key (end with the primary key) whose
+    values are never NULL in the result set.
+
+    Args:
+        columns (list): Sort key columns, e.g. [Book.rating, Book.id].
+        descending (bool): Sort direction for all columns.
+        after (tuple): Sort key of the last row of the previous page.
+        before (tuple): Sort key of the first row of the next page.
+        offset (int): Rows to skip when neither cursor is given; only for
+            resolving plain page numbers.
+
+    Returns:
+        tuple: (items, next_cursor, prev_cursor); a cursor is None if there
+        is no page in that direction.
+    """
+    backwards = before is not None
+    if after is not None:
+        query = query.filter(keyset_condition(columns, descending, after))
+    elif backwards:
+        query = query.filter(keyset_condition(columns, not descending, before))
+
+    # Walking backwards reverses the order; the rows are flipped back below
+    reverse = descending != backwards
+    query = query.order_by(*[c.desc() if reverse else c.asc() for c in columns])
+    if offset and after is None and not backwards:
+        query = query.offset(offset)
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return rows, None, None
+    first = encode_cursor(getattr(rows[0], c.key) for c in columns)
+    last = encode_cursor(getattr(rows[-1], c.key) for c in columns)
+    if backwards:
+        return rows, last, first if has_more else None
+    return rows, last if has_more else None, first if after is not None or offset else None
+
+
+class CountCache:
+    """
+    Result counts per filter combination with a TTL and LRU eviction.
+
+    Attributes:
+        ttl (float): Seconds a cached count stays valid.
+        max_entries (int): Counts kept before the least recently used is evicted.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, compute):
+        """Return the cached count for key, calling compute() when it is missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                return entry[0]
+        count = compute()
+        with self._lock:
+            self._entries[key] = (count, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by all requests in this process
+count_cache = CountCache(ttl=CATALOG_COUNT_TTL)
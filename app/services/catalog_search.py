@@ -0,0 +1,130 @@
+"""
+Full-text search over the book catalog with SQLite FTS5.
+
+books_fts is an external-content FTS5 table over books(title, author,
+category, description): it stores only the inverted index and reads the
+text back from books. Triggers on books keep it in sync with every insert,
+update and delete, whichever code path writes the row.
+
+Queries are ranked with BM25 (title matches weigh most, then author,
+category and description) and every term is matched as a prefix, so
+"cyber" finds "Cybersecurity". Snippets of the matching description
+text are returned with the matched terms highlighted.
+"""
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import text, Integer, Float, String
+from sqlalchemy.exc import OperationalError
+
+FTS_TABLE = "books_fts"
+
+# Column weights for bm25(), in the order the FTS table declares them
+BM25_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+DESCRIPTION_COLUMN = 3
+SNIPPET_TOKENS = 16
+
+# Snippet markers; control characters never occur in catalog text and are
+# replaced by <mark> tags after the rest of the snippet is HTML-escaped
+_MARK_OPEN = "\x02"
+_MARK_CLOSE = "\x03"
+
+_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author, category, description,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author, category, description)
+        VALUES (new.id, new.title, new.author, new.category, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, category, description)
+        VALUES ('delete', old.id, old.title, old.author, old.category, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, category, description ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, category, description)
+        VALUES ('delete', old.id, old.title, old.author, old.category, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, author, category, description)
+        VALUES (new.id, new.title, new.author, new.category, new.description);
+    END""",
+]
+
+# Sync triggers on books; bulk imports drop them and let ensure_search_index() rebuild
+TRIGGERS = ("books_fts_ai", "books_fts_ad", "books_fts_au")
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_search_index(connection) -> bool:
+    """
+    Create the FTS table and its sync triggers if they are missing.
+
+    The index is rebuilt from books whenever the table or any trigger had
+    to be (re)created, since rows may have been written without them (for
+    example after the books table was dropped and recreated).
+
+    Args:
+        connection: SQLAlchemy connection inside a transaction.
+
+    Returns:
+        bool: False if this SQLite build lacks FTS5; search then falls
+        back to LIKE matching.
+    """
+    existing = set(connection.execute(text(
+        "SELECT name FROM sqlite_master WHERE name IN (:t, :ai, :ad, :au)"
+    ), {'t': FTS_TABLE, 'ai': TRIGGERS[0], 'ad': TRIGGERS[1], 'au': TRIGGERS[2]}).scalars())
+    try:
+        for statement in _SCHEMA:
+            connection.execute(text(statement))
+    except OperationalError as e:
+        print(f"Debug - Full-text search unavailable, using LIKE search: {e}")
+        return False
+    if existing != {FTS_TABLE, *TRIGGERS}:
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+def match_expression(search_query: str):
+    """
+    Turn free text typed by a user into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term and all terms must match, so
+    FTS5 operators and punctuation in the input cannot cause syntax errors.
+    Returns None if the input has no searchable words.
+    """
+    terms = _TERM_RE.findall(search_query or "")
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_subquery(match: str):
+    """
+    Subquery of the books matching an FTS5 expression.
+
+    Columns: id (books.id), score (BM25, lower is better) and snippet
+    (description excerpt with highlight markers, see highlight()).
+    Join it to books on id and order by score.
+    """
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    return text(
+        f"SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS score, "
+        f"snippet({FTS_TABLE}, {DESCRIPTION_COLUMN}, :mark_open, :mark_close, '…', {SNIPPET_TOKENS}) AS snippet "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+    ).bindparams(match=match, mark_open=_MARK_OPEN, mark_close=_MARK_CLOSE).columns(
+        id=Integer, score=Float, snippet=String
+    ).subquery("fts_results")
+
+
+def highlight(snippet: str):
+    """
+    Render a search snippet as HTML with the matched terms in <mark> tags.
+
+    Returns None if the snippet has no matched terms (the match was in
+    another column), so the caller can show the plain description instead.
+    """
+    if not snippet or _MARK_OPEN not in snippet:
+        return None
+    html = str(escape(snippet)).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+    return Markup(html)
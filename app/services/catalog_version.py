@@ -0,0 +1,74 @@
+"""
+Catalog version counter for cache invalidation.
+
+catalog_state holds a single row whose version is bumped, together with
+updated_at, by triggers on every insert, update and delete on books. Any
+cache of data derived from the catalog (rendered pages, result counts,
+HTTP validators) keys on the version, so every Book write invalidates
+it, whichever code path made the write.
+
+Updates that only touch the popularity counters (see popularity.py) do
+not bump the version: nothing cached by version shows them, and they are
+written every few seconds.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import text
+
+_BUMP = ("UPDATE catalog_state SET version = version + 1, "
+         "updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE id = 1;")
+
+# Columns whose updates bump the version: every books column except the
+# popularity counters. A new column that cached pages show belongs here.
+VERSIONED_COLUMNS = ('title', 'author', 'category', 'language', 'description', 'publisher', 'isbn',
+                     'publish_date', 'pages', 'file_path', 'image_path', 'rating', 'reviews_count')
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS catalog_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    )""",
+    """INSERT OR IGNORE INTO catalog_state (id, version, updated_at)
+       VALUES (1, 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))""",
+    f"CREATE TRIGGER IF NOT EXISTS catalog_version_ai AFTER INSERT ON books BEGIN {_BUMP} END",
+    f"CREATE TRIGGER IF NOT EXISTS catalog_version_ad AFTER DELETE ON books BEGIN {_BUMP} END",
+    f"CREATE TRIGGER IF NOT EXISTS catalog_version_au AFTER UPDATE OF {', '.join(VERSIONED_COLUMNS)} "
+    f"ON books BEGIN {_BUMP} END",
+]
+
+# Bulk imports drop these and let ensure_catalog_state() bump the version once
+TRIGGERS = ("catalog_version_ai", "catalog_version_ad", "catalog_version_au")
+
+
+def ensure_catalog_state(connection) -> None:
+    """
+    Create catalog_state and the books triggers that bump it, if missing.
+
+    If any trigger had to be (re)created, books may have changed without
+    a bump (e.g. the table was dropped and recreated), so the version is
+    bumped once here.
+
+    Args:
+        connection: SQLAlchemy connection inside a transaction.
+    """
+    existing = set(connection.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (:ai, :ad, :au)"
+    ), {'ai': TRIGGERS[0], 'ad': TRIGGERS[1], 'au': TRIGGERS[2]}).scalars())
+    for statement in _SCHEMA:
+        connection.execute(text(statement))
+    if existing != set(TRIGGERS):
+        connection.execute(text(_BUMP))
+
+
+def catalog_version(connection):
+    """
+    Current catalog version.
+
+    Returns:
+        tuple: (version, updated_at) where updated_at is a timezone-aware
+        datetime of the last catalog write.
+    """
+    version, updated_at = connection.execute(
+        text("SELECT version, updated_at FROM catalog_state WHERE id = 1")
+    ).one()
+    return version, datetime.strptime(updated_at, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
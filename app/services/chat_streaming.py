@@ -0,0 +1,152 @@
+"""
+Token streaming for QA chains.
+
+stream_chain runs a chain synchronously in a worker thread and hands the
+LLM's tokens back through a queue as they arrive. A thread cannot be
+cancelled, so when the caller stops iterating (the client disconnected),
+the next LLM callback in the worker raises StreamCancelled, which aborts
+the chain instead of paying for the rest of its calls. astream_chain does
+the same for the async views (app/asgi.py): the chain is awaited as a task
+on the caller's event loop, and stopping the iteration cancels it.
+"""
+import asyncio
+import queue
+import threading
+from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackHandler
+from app.services.chroma_utils import MAP_STEP_TAG
+
+_DONE = object()
+
+
+class StreamCancelled(Exception):
+    """Raised in a streamed chain's LLM callbacks once nobody reads the stream."""
+
+
+class QueueCallbackHandler(BaseCallbackHandler):
+    """
+    Push LLM events onto a queue as ('reset', None) and ('token', text) tuples.
+
+    Once stop is set, every callback raises StreamCancelled instead.
+    """
+    # Let StreamCancelled propagate out of the callbacks, aborting the chain
+    raise_error = True
+
+    def __init__(self, events: queue.Queue, stop: threading.Event = None):
+        self.events = events
+        self.stop = stop or threading.Event()
+
+    def _check_stop(self) -> None:
+        if self.stop.is_set():
+            raise StreamCancelled()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._check_stop()
+        # Multi-step chains (refine) call the LLM several times; only the
+        # last call's tokens are the answer, so clients restart on 'reset'.
+        if not self._is_map_step(kwargs):
+            self.events.put(('reset', None))
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._check_stop()
+        if not self._is_map_step(kwargs):
+            self.events.put(('reset', None))
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        self._check_stop()
+        if token and not self._is_map_step(kwargs):
+            self.events.put(('token', token))
+
+    @staticmethod
+    def _is_map_step(kwargs) -> bool:
+        """Map calls of map_reduce run concurrently and never form the answer."""
+        return MAP_STEP_TAG in (kwargs.get('tags') or [])
+
+
+def stream_chain(qa_chain, query: str):
+    """
+    Run qa_chain for query and yield its events while it runs.
+
+    If the caller stops iterating early (closes the generator), the chain
+    is aborted at its next LLM callback, so no further LLM calls are made.
+
+    Yields:
+        tuple: ('reset', None) when a new LLM call starts, ('token', str) for
+        each generated token, and finally ('done', result) with the chain's
+        full result dict. Exceptions raised by the chain are re-raised here.
+    """
+    events = queue.Queue()
+    stop = threading.Event()
+    handler = QueueCallbackHandler(events, stop)
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = qa_chain.invoke({"query": query}, config={"callbacks": [handler]})
+        except StreamCancelled:
+            pass
+        except Exception as e:
+            outcome['error'] = e
+        finally:
+            events.put(_DONE)
+
+    worker = threading.Thread(target=run, name="qa-stream", daemon=True)
+    worker.start()
+
+    try:
+        while True:
+            event = events.get()
+            if event is _DONE:
+                break
+            yield event
+
+        if 'error' in outcome:
+            raise outcome['error']
+        yield ('done', outcome['result'])
+    finally:
+        # Closed early, e.g. by a client disconnect: abort the chain's remaining LLM work
+        stop.set()
+
+
+class AsyncQueueCallbackHandler(AsyncCallbackHandler):
+    """QueueCallbackHandler for chains awaited on an event loop, pushing onto an asyncio.Queue."""
+
+    def __init__(self, events: asyncio.Queue):
+        self.events = events
+
+    async def on_llm_start(self, serialized, prompts, **kwargs):
+        if not QueueCallbackHandler._is_map_step(kwargs):
+            self.events.put_nowait(('reset', None))
+
+    async def on_chat_model_start(self, serialized, messages, **kwargs):
+        if not QueueCallbackHandler._is_map_step(kwargs):
+            self.events.put_nowait(('reset', None))
+
+    async def on_llm_new_token(self, token: str, **kwargs):
+        if token and not QueueCallbackHandler._is_map_step(kwargs):
+            self.events.put_nowait(('token', token))
+
+
+async def astream_chain(qa_chain, query: str):
+    """
+    Async stream_chain: await qa_chain.ainvoke and yield its events while it runs.
+
+    If the caller stops iterating early (closes the generator or is
+    cancelled), the chain is cancelled too, so no further LLM calls are made.
+
+    Yields:
+        tuple: The same events as stream_chain.
+    """
+    events = asyncio.Queue()
+    handler = AsyncQueueCallbackHandler(events)
+    run = asyncio.ensure_future(qa_chain.ainvoke({"query": query}, config={"callbacks": [handler]}))
+    run.add_done_callback(lambda _: events.put_nowait(_DONE))
+    try:
+        while True:
+            event = await events.get()
+            if event is _DONE:
+                break
+            yield event
+        # Re-raises the chain's exception, if any
+        yield ('done', run.result())
+    finally:
+        run.cancel()
@@ -1,16 +1,32 @@
 # chroma_utils.py
 import os
+import threading
 from typing import List
+import tiktoken
 from sentence_transformers import SentenceTransformer
 from langchain.embeddings.base import Embeddings
-from langchain_openai import ChatOpenAI
 from langchain.chains import RetrievalQA
 from langchain_chroma import Chroma
 from langchain.prompts import PromptTemplate
+from langchain.schema import BaseRetriever, Document
 from flask import current_app
+from app.services.qa_registry import registry
+from app.services.qa_metrics import MeteredQAChain
+from app.services.llm_backends import llm_settings, make_chat_model
+
+DEFAULT_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+DEFAULT_CHAT_MODEL = "gpt-4o-mini"
+CHAIN_TYPES = ("refine", "stuff", "map_reduce")
+
+# Tag attached to the concurrent map calls of the map_reduce strategy, so
+# streaming handlers can ignore their interleaved tokens.
+MAP_STEP_TAG = "qa:map"
+
+_embeddings = {}
+_embeddings_lock = threading.Lock()
 
 class SentenceTransformerEmbeddings(Embeddings):
-    def __init__(self, model_name: str = 'sentence-transformers/all-MiniLM-L6-v2'):
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL):
         self.model = SentenceTransformer(model_name)
 
     def embed_query(self, text: str) -> List[float]:
@@ -19,20 +35,57 @@ class SentenceTransformerEmbeddings(Embeddings):
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         return self.model.encode(texts).tolist()
 
+def get_embeddings(model_name: str = DEFAULT_EMBEDDING_MODEL) -> SentenceTransformerEmbeddings:
+    """Return the process-wide embedding model, loading it from disk only once."""
+    with _embeddings_lock:
+        embeddings = _embeddings.get(model_name)
+        if embeddings is None:
+            embeddings = SentenceTransformerEmbeddings(model_name)
+            _embeddings[model_name] = embeddings
+        return embeddings
+
 def get_qa_chain(chroma_db_path: str, collection_name: str):
-    embeddings = SentenceTransformerEmbeddings()
+    """
+    Return a warm QA chain for the given Chroma collection.
+
+    Chains are cached process-wide in the QA registry, keyed by the index
+    location and the model settings, so repeated questions about the same
+    book reuse the open vector store and LLM client.
+    """
+    config = current_app.config
+    registry.resize(config.get('QA_CACHE_MAX_ENTRIES', registry.max_entries))
+
+    settings = {
+        'embedding_model': config.get('EMBEDDING_MODEL', DEFAULT_EMBEDDING_MODEL),
+        'chat_model': config.get('CHAT_MODEL', DEFAULT_CHAT_MODEL),
+        'temperature': config.get('CHAT_TEMPERATURE', 0.3),
+        'max_tokens': config.get('CHAT_MAX_TOKENS', 1200),
+        'k': config.get('RETRIEVER_K', 5),
+        'chain_type': config.get('QA_CHAIN_TYPE', 'refine'),
+        'stuff_token_budget': config.get('QA_STUFF_TOKEN_BUDGET', 3000),
+        'map_concurrency': config.get('QA_MAP_CONCURRENCY', 5),
+        **llm_settings(config),
+    }
+    if settings['chain_type'] not in CHAIN_TYPES:
+        raise ValueError(f"Unknown QA_CHAIN_TYPE '{settings['chain_type']}', expected one of {CHAIN_TYPES}")
+    key = (os.path.abspath(chroma_db_path), collection_name, tuple(sorted(settings.items())))
+
+    return registry.get_or_build(
+        key,
+        chroma_db_path,
+        lambda: _build_qa_chain(chroma_db_path, collection_name, settings, config.get('OPENAI_API_KEY'))
+    )
+
+def _build_qa_chain(chroma_db_path: str, collection_name: str, settings: dict, openai_api_key: str):
+    print(f"Debug - Building QA chain for collection '{collection_name}' at {chroma_db_path}")
+    embeddings = get_embeddings(settings['embedding_model'])
 
     vectorstore = Chroma(
         collection_name=collection_name,
         persist_directory=chroma_db_path,
         embedding_function=embeddings
     )
-
-    # Test retrieval directly
-    test_query = "What is the book about?"
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
-    docs = retriever.get_relevant_documents(test_query)
-    print(f"Debug - Retrieving docs for test query '{test_query}': {docs}")
+    retriever = vectorstore.as_retriever(search_kwargs={"k": settings['k']})
 
     # System instruction included at top of both templates
     # system_instruction = "Act as an expert. Reply to questions about this document. Self-reflect on your answers."
@@ -62,35 +115,156 @@ Additional context:
 {{context}}
 
 Question: {{question}}
+"""
+    map_template = """Extract the passages from the context below that help answer the question, verbatim or closely paraphrased.
+If nothing is relevant, reply with an empty line.
+
+Context:
+{context}
+
+Question: {question}
 """
     PROMPT = PromptTemplate(template=template, input_variables=["context", "question"])
+    MAP_PROMPT = PromptTemplate(template=map_template, input_variables=["context", "question"])
     REFINE_PROMPT = PromptTemplate(
         template=refine_template,
         input_variables=["existing_answer", "context", "question"]
     )
 
-    openai_api_key = current_app.config.get('OPENAI_API_KEY')
-    print(f"Debug - Using API key (first 10 chars): {openai_api_key[:10] if openai_api_key else 'None'}")
+    # ChatOpenAI, or the local fake when LLM_BACKEND=fake
+    llm = make_chat_model(settings, openai_api_key)
 
-    # Initialize ChatOpenAI without prefix_messages
-    llm = ChatOpenAI(
-        api_key=openai_api_key,
-        model_name="gpt-4o-mini",
-        temperature=0.3,
-        max_tokens=1200,
-        streaming=True
-    )
+    chain_type = settings['chain_type']
+    if chain_type == "stuff":
+        # One LLM call over as many retrieved chunks as fit in the budget
+        qa = RetrievalQA.from_chain_type(
+            llm=llm,
+            chain_type="stuff",
+            retriever=TokenBudgetRetriever(
+                retriever=retriever,
+                max_tokens=settings['stuff_token_budget']
+            ),
+            chain_type_kwargs={
+                "prompt": PROMPT,
+                "document_variable_name": "context"
+            },
+            return_source_documents=True
+        )
+    elif chain_type == "map_reduce":
+        qa = ConcurrentMapReduceQA(
+            llm=llm,
+            retriever=retriever,
+            map_prompt=MAP_PROMPT,
+            reduce_prompt=PROMPT,
+            max_concurrency=settings['map_concurrency']
+        )
+    else:
+        qa = RetrievalQA.from_chain_type(
+            llm=llm,
+            chain_type="refine",
+            retriever=retriever,
+            chain_type_kwargs={
+                "question_prompt": PROMPT,
+                "refine_prompt": REFINE_PROMPT,
+                "document_variable_name": "context"
+            },
+            return_source_documents=True
+        )
 
-    qa = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="refine",
-        retriever=retriever,
-        chain_type_kwargs={
-            "question_prompt": PROMPT,
-            "refine_prompt": REFINE_PROMPT,
-            "document_variable_name": "context"
-        },
-        return_source_documents=True
-    )
+    return MeteredQAChain(qa, chain_type)
+
+def count_tokens(text: str) -> int:
+    """Count cl100k_base tokens in text."""
+    return len(tiktoken.get_encoding("cl100k_base").encode_ordinary(text))
+
+class TokenBudgetRetriever(BaseRetriever):
+    """
+    Keep the top-ranked documents from another retriever until a token budget is spent.
+
+    The first document is always kept so a small budget never yields an empty context.
+    """
+    retriever: BaseRetriever
+    max_tokens: int
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        docs = self.retriever.get_relevant_documents(query)
+        kept = []
+        used = 0
+        for doc in docs:
+            tokens = count_tokens(doc.page_content)
+            if kept and used + tokens > self.max_tokens:
+                break
+            kept.append(doc)
+            used += tokens
+        return kept
+
+class ConcurrentMapReduceQA:
+    """
+    Map-reduce question answering with the map calls issued concurrently.
+
+    Each retrieved chunk is condensed against the question in parallel
+    (llm.batch runs the calls on a thread pool), then a single reduce call
+    answers from the condensed notes. Latency is roughly one map call plus
+    the reduce call instead of one call per chunk in sequence.
+    """
+
+    def __init__(self, llm, retriever, map_prompt, reduce_prompt, max_concurrency: int = 5):
+        self.llm = llm
+        self.retriever = retriever
+        self.map_prompt = map_prompt
+        self.reduce_prompt = reduce_prompt
+        self.max_concurrency = max_concurrency
+
+    def _map_inputs(self, docs, query: str) -> List[str]:
+        return [self.map_prompt.format(context=doc.page_content, question=query) for doc in docs]
+
+    def invoke(self, inputs, config=None):
+        query = inputs["query"]
+        callbacks = (config or {}).get("callbacks")
+        docs = self.retriever.get_relevant_documents(query)
+
+        notes = []
+        if docs:
+            map_inputs = self._map_inputs(docs, query)
+            map_outputs = self.llm.batch(map_inputs, config={
+                "callbacks": callbacks,
+                "tags": [MAP_STEP_TAG],
+                "max_concurrency": self.max_concurrency
+            })
+            notes = [output.content for output in map_outputs]
+
+        answer = self.llm.invoke(
+            self.reduce_prompt.format(context="\n\n".join(notes), question=query),
+            config={"callbacks": callbacks}
+        )
+        return {
+            "query": query,
+            "result": answer.content,
+            "source_documents": docs
+        }
+
+    async def ainvoke(self, inputs, config=None):
+        """Async invoke: the map calls run concurrently on the event loop (llm.abatch)."""
+        query = inputs["query"]
+        callbacks = (config or {}).get("callbacks")
+        docs = await self.retriever.aget_relevant_documents(query)
+
+        notes = []
+        if docs:
+            map_inputs = self._map_inputs(docs, query)
+            map_outputs = await self.llm.abatch(map_inputs, config={
+                "callbacks": callbacks,
+                "tags": [MAP_STEP_TAG],
+                "max_concurrency": self.max_concurrency
+            })
+            notes = [output.content for output in map_outputs]
 
-    return qa
+        answer = await self.llm.ainvoke(
+            self.reduce_prompt.format(context="\n\n".join(notes), question=query),
+            config={"callbacks": callbacks}
+        )
+        return {
+            "query": query,
+            "result": answer.content,
+            "source_documents": docs
+        }
@@ -0,0 +1,269 @@
+"""
+Compact on-disk format for embeddings handed from generate_embeddings.py
+to store_in_chroma.py.
+
+An artifact lives in the book directory as three files:
+- chroma_input.npy: an (n, dim) float32 or float16 matrix, loaded memory-mapped
+- chroma_input.jsonl: one {"id", "document", "metadata"} record per line,
+  in the same order as the matrix rows
+- chroma_input.meta.json: the embedding model, the dtype, the row count
+  and the SHA-256 of the other two, written last
+
+Readers stream the vectors and records in batches, so neither is ever
+materialized as full Python lists. The two data files cannot be replaced
+in one step, so readers check them against the sidecar and reject a
+pair left mismatched by a crash between the renames.
+
+Chunk ids are content-addressed (chunk_ids) and embeddings are cached per
+book by text hash (EmbeddingCache), so re-ingesting an edited book only
+embeds and stores the chunks that changed.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+
+EMBEDDINGS_FILE = "chroma_input.npy"
+RECORDS_FILE = "chroma_input.jsonl"
+META_FILE = "chroma_input.meta.json"
+LEGACY_JSON_FILE = "chroma_input.json"
+DTYPES = ("float32", "float16")
+CACHE_EMBEDDINGS_FILE = "embedding_cache.npy"
+CACHE_KEYS_FILE = "embedding_cache.json"
+
+
+def artifact_paths(directory: str):
+    """Return (embeddings_path, records_path) for the artifact in directory."""
+    return os.path.join(directory, EMBEDDINGS_FILE), os.path.join(directory, RECORDS_FILE)
+
+
+def artifact_exists(directory: str) -> bool:
+    return all(os.path.exists(p) for p in artifact_paths(directory))
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_artifact_meta(directory: str) -> dict:
+    """
+    Return the artifact's sidecar after checking the data files against it.
+
+    Raises:
+        ValueError: If the sidecar is missing, or the data files are not the
+            pair it describes (e.g. after a crash between their renames).
+    """
+    embeddings_path, records_path = artifact_paths(directory)
+    meta_path = os.path.join(directory, META_FILE)
+    if not os.path.exists(meta_path):
+        raise ValueError(f"Artifact in {directory} has no {META_FILE}; re-run generate_embeddings")
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if (_file_sha256(embeddings_path) != meta.get("embeddings_sha256")
+            or _file_sha256(records_path) != meta.get("records_sha256")):
+        raise ValueError(f"Artifact files in {directory} do not match {META_FILE} "
+                         "(interrupted write?); re-run generate_embeddings")
+    return meta
+
+
+def write_artifact(directory: str, ids, documents, metadatas, embeddings, dtype: str = "float32",
+                   model: str = "") -> None:
+    """
+    Write an embedding artifact.
+
+    Each file is written under a temporary name and renamed into place,
+    the sidecar last. A crash can still leave the new vectors next to the
+    old records, but readers then find that they do not match the sidecar
+    and refuse to use them.
+
+    Args:
+        embeddings: (n, dim) array-like, one row per record.
+        dtype (str): 'float32', or 'float16' to halve the file size.
+        model (str): Name of the embedding model that produced the vectors.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype '{dtype}', expected one of {DTYPES}")
+    matrix = np.asarray(embeddings, dtype=dtype)
+    if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+        raise ValueError(f"Expected {len(ids)} embedding rows, got shape {matrix.shape}")
+
+    embeddings_path, records_path = artifact_paths(directory)
+
+    tmp_embeddings_path = embeddings_path + ".tmp"
+    with open(tmp_embeddings_path, 'wb') as f:
+        np.save(f, matrix)
+
+    tmp_records_path = records_path + ".tmp"
+    with open(tmp_records_path, 'w', encoding='utf-8') as f:
+        for chunk_id, document, metadata in zip(ids, documents, metadatas):
+            f.write(json.dumps({"id": chunk_id, "document": document, "metadata": metadata},
+                               ensure_ascii=False))
+            f.write("\n")
+
+    meta = {
+        "model": model,
+        "dtype": dtype,
+        "rows": len(ids),
+        "embeddings_sha256": _file_sha256(tmp_embeddings_path),
+        "records_sha256": _file_sha256(tmp_records_path),
+    }
+    meta_path = os.path.join(directory, META_FILE)
+    tmp_meta_path = meta_path + ".tmp"
+    with open(tmp_meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    os.replace(tmp_embeddings_path, embeddings_path)
+    os.replace(tmp_records_path, records_path)
+    os.replace(tmp_meta_path, meta_path)
+
+
+def load_embeddings(directory: str) -> np.ndarray:
+    """Return the artifact's embedding matrix, memory-mapped read-only."""
+    embeddings_path, _ = artifact_paths(directory)
+    return np.load(embeddings_path, mmap_mode='r')
+
+
+def iter_ids(directory: str):
+    """Yield the artifact's record ids in row order."""
+    for record in iter_records(directory):
+        yield record["id"]
+
+
+def iter_records(directory: str):
+    """Yield the artifact's records one at a time."""
+    _, records_path = artifact_paths(directory)
+    with open(records_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def count_records(directory: str) -> int:
+    """Return the number of records, read from the .npy header without loading vectors."""
+    return load_embeddings(directory).shape[0]
+
+
+def iter_artifact_batches(directory: str, batch_size: int = 100):
+    """
+    Stream the artifact in batches ready for collection.add().
+
+    Yields:
+        tuple: (ids, documents, metadatas, embeddings) lists for each batch.
+        Embeddings are converted to float32 Python lists one batch at a time.
+
+    Raises:
+        ValueError: If the files do not match the artifact's sidecar.
+    """
+    read_artifact_meta(directory)
+    matrix = load_embeddings(directory)
+    ids, documents, metadatas = [], [], []
+    row = 0
+    for record in iter_records(directory):
+        ids.append(record["id"])
+        documents.append(record["document"])
+        metadatas.append(record["metadata"])
+        if len(ids) == batch_size:
+            yield ids, documents, metadatas, matrix[row:row + len(ids)].astype(np.float32).tolist()
+            row += len(ids)
+            ids, documents, metadatas = [], [], []
+    if ids:
+        yield ids, documents, metadatas, matrix[row:row + len(ids)].astype(np.float32).tolist()
+        row += len(ids)
+    if row != matrix.shape[0]:
+        raise ValueError(f"Artifact in {directory} has {matrix.shape[0]} vectors but {row} records")
+
+
+def iter_legacy_json_batches(directory: str, batch_size: int = 100):
+    """Batch a chroma_input.json written by earlier versions of generate_embeddings."""
+    with open(os.path.join(directory, LEGACY_JSON_FILE), 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    for start in range(0, len(data["ids"]), batch_size):
+        end = start + batch_size
+        yield (data["ids"][start:end], data["documents"][start:end],
+               data["metadatas"][start:end], data["embeddings"][start:end])
+
+
+def content_hash(text: str) -> str:
+    """Hex SHA-256 of text, used to key cached embeddings."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def chunk_ids(documents, metadatas):
+    """
+    Derive stable, content-addressed ids for chunks.
+
+    An id hashes the chunk text together with its page span, so an edited
+    chunk gets a new id while untouched chunks keep theirs across runs.
+    Identical chunks on the same pages get a -2, -3... suffix.
+    """
+    ids = []
+    seen = {}
+    for document, metadata in zip(documents, metadatas):
+        key = f"{metadata.get('start_page', '')}:{metadata.get('end_page', '')}:{document}"
+        chunk_id = f"chunk_{content_hash(key)[:24]}"
+        seen[chunk_id] = seen.get(chunk_id, 0) + 1
+        if seen[chunk_id] > 1:
+            chunk_id = f"{chunk_id}-{seen[chunk_id]}"
+        ids.append(chunk_id)
+    return ids
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache of one book directory, keyed by content_hash(text).
+
+    Stored as embedding_cache.npy (float32 rows, memory-mapped on load) plus
+    embedding_cache.json holding the model name and the row keys. A cache
+    written by a different model is ignored.
+    """
+
+    def __init__(self, directory: str, model_name: str):
+        self.directory = directory
+        self.model_name = model_name
+        self._vectors = None
+        self._rows = {}
+        self._load()
+
+    def _paths(self):
+        return (os.path.join(self.directory, CACHE_EMBEDDINGS_FILE),
+                os.path.join(self.directory, CACHE_KEYS_FILE))
+
+    def _load(self) -> None:
+        embeddings_path, keys_path = self._paths()
+        if not (os.path.exists(embeddings_path) and os.path.exists(keys_path)):
+            return
+        try:
+            with open(keys_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            vectors = np.load(embeddings_path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            print(f"Warning - Ignoring unreadable embedding cache in {self.directory}: {e}")
+            return
+        if index.get("model") != self.model_name or len(index.get("keys", [])) != vectors.shape[0]:
+            return
+        self._vectors = vectors
+        self._rows = {key: row for row, key in enumerate(index["keys"])}
+
+    def get(self, key: str):
+        """Return the cached vector for key, or None."""
+        row = self._rows.get(key)
+        return None if row is None else self._vectors[row]
+
+    def save(self, keys, vectors) -> None:
+        """Replace the cache with the given keys and (n, dim) vectors."""
+        embeddings_path, keys_path = self._paths()
+        tmp_embeddings_path = embeddings_path + ".tmp"
+        with open(tmp_embeddings_path, 'wb') as f:
+            np.save(f, np.asarray(vectors, dtype=np.float32))
+        tmp_keys_path = keys_path + ".tmp"
+        with open(tmp_keys_path, 'w', encoding='utf-8') as f:
+            json.dump({"model": self.model_name, "keys": list(keys)}, f)
+        # Drop the old memory map before replacing the file underneath it
+        self._vectors = None
+        self._rows = {}
+        os.replace(tmp_embeddings_path, embeddings_path)
+        os.replace(tmp_keys_path, keys_path)
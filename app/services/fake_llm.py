@@ -0,0 +1,79 @@
+"""
+Local stand-in for the chat LLM (LLM_BACKEND=fake).
+
+FakeStreamingChatModel answers any prompt with made-up words after
+`latency` seconds, then streams them at `tokens_per_second` through the
+usual on_llm_new_token callbacks, from invoke and ainvoke alike. The
+words are picked by a hash of the prompt, so the same prompt always
+gets the same answer, and timings depend only on the settings.
+"""
+import time
+import random
+import asyncio
+import hashlib
+from typing import List
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_VOCABULARY = (
+    "the book chapter section explains describes shows that this these key important "
+    "security data system network model method example process result approach risk "
+    "control policy user access analysis first second finally however therefore also "
+    "can should must often usually page context answer question based on in of and to"
+).split()
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Deterministic streaming chat model with configurable timing.
+
+    Attributes:
+        latency (float): Seconds before the first token.
+        tokens_per_second (float): Rate of the following tokens; 0 sends them at once.
+        answer_tokens (int): Tokens per answer.
+    """
+    latency: float = 0.5
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _tokens(self, messages) -> List[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).digest())
+        words = rng.choices(_VOCABULARY, k=max(1, self.answer_tokens))
+        words[0] = words[0].capitalize()
+        words[-1] += "."
+        return [words[0]] + [f" {word}" for word in words[1:]]
+
+    def _interval(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    @staticmethod
+    def _result(tokens: List[str]) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self._tokens(messages)
+        interval = self._interval()
+        time.sleep(self.latency)
+        for i, token in enumerate(tokens):
+            if i and interval:
+                time.sleep(interval)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token)
+        return self._result(tokens)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self._tokens(messages)
+        interval = self._interval()
+        await asyncio.sleep(self.latency)
+        for i, token in enumerate(tokens):
+            if i and interval:
+                await asyncio.sleep(interval)
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(token)
+        return self._result(tokens)
@@ -1,22 +1,35 @@
 import sys
 import os
 import json
+import argparse
+import numpy as np
 from sentence_transformers import SentenceTransformer
+from app.services.embedding_artifact import (
+    write_artifact, artifact_paths, chunk_ids, content_hash, EmbeddingCache, DTYPES
+)
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python -m app.services.generate_embeddings <directory_path>")
-        sys.exit(1)
+EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+
+def generate_embeddings(directory: str, dtype: str = "float32", model: SentenceTransformer = None) -> dict:
+    """
+    Embed final_chunks.json and write the chroma_input artifact.
 
-    directory = sys.argv[1]
+    Chunks whose text was embedded on a previous run are taken from the
+    book's embedding cache; only new or edited chunks go through the model.
 
+    Args:
+        model (SentenceTransformer): Already loaded EMBEDDING_MODEL to use;
+            loaded from disk on demand if omitted.
+
+    Returns:
+        dict: Chunk counts: 'chunks' in total, 'reused' from the cache and
+        'embedded' by the model.
+    """
     # Paths for input and output files
     final_chunks_path = os.path.join(directory, "final_chunks.json")
-    chroma_input_path = os.path.join(directory, "chroma_input.json")
 
     if not os.path.exists(final_chunks_path):
-        print(f"Error: final_chunks.json not found in {directory}")
-        sys.exit(1)
+        raise FileNotFoundError(f"final_chunks.json not found in {directory}")
 
     # Load final_chunks from JSON
     with open(final_chunks_path, 'r', encoding='utf-8') as f:
@@ -25,9 +38,8 @@ if __name__ == "__main__":
     # Extract the chunk texts and associated metadata
     documents = []
     metadatas = []
-    ids = []
 
-    for i, chunk_info in enumerate(final_chunks):
+    for chunk_info in final_chunks:
         chunk_text = chunk_info["chunk"]
         metadata = {
             "doc_title": chunk_info.get("doc_title", ""),
@@ -41,30 +53,65 @@ if __name__ == "__main__":
 
         documents.append(chunk_text)
         metadatas.append(metadata)
-        ids.append(f"chunk_{i}")
 
-    # Load a local embedding model from sentence-transformers
-    model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+    # Ids hash the chunk content, so unchanged chunks keep their ids
+    ids = chunk_ids(documents, metadatas)
+    keys = [content_hash(document) for document in documents]
+
+    cache = EmbeddingCache(directory, EMBEDDING_MODEL)
+    vectors = {}
+    for key in keys:
+        if key not in vectors:
+            cached = cache.get(key)
+            if cached is not None:
+                vectors[key] = np.array(cached, dtype=np.float32)
+    reused = len(vectors)
 
-    print("Generating embeddings...")
-    # Enable progress bar by passing show_progress_bar=True
-    embeddings = model.encode(documents, convert_to_numpy=True, show_progress_bar=True)
-    print("Embeddings generated.")
+    # Embed each new distinct text once
+    pending = {}
+    for key, document in zip(keys, documents):
+        if key not in vectors:
+            pending.setdefault(key, document)
 
-    # Convert embeddings (numpy array) to a list of lists for JSON serialization
-    embeddings_list = embeddings.tolist()
+    if pending:
+        if model is None:
+            # Load a local embedding model from sentence-transformers
+            model = SentenceTransformer(EMBEDDING_MODEL)
 
-    # Prepare the data to be saved
-    data_to_save = {
-        "documents": documents,
-        "metadatas": metadatas,
-        "ids": ids,
-        "embeddings": embeddings_list
-    }
+        print(f"Generating embeddings for {len(pending)} new chunk(s), reusing {reused} cached...")
+        # Enable progress bar by passing show_progress_bar=True
+        new_vectors = model.encode(list(pending.values()), convert_to_numpy=True, show_progress_bar=True)
+        vectors.update(zip(pending.keys(), new_vectors.astype(np.float32)))
+        print("Embeddings generated.")
+    else:
+        print(f"All {reused} distinct chunk(s) found in the embedding cache.")
 
-    # Save to a JSON file for later use with store_in_chroma.py
-    with open(chroma_input_path, 'w', encoding='utf-8') as out_f:
-        json.dump(data_to_save, out_f, ensure_ascii=False, indent=2)
+    embeddings = np.stack([vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
 
-    print(f"Data prepared and saved to {chroma_input_path}.")
-    print("This file can now be provided to store_in_chroma.py for insertion into Chroma.")
+    # Keep exactly the current chunks in the cache
+    cache.save(list(vectors.keys()), np.stack(list(vectors.values())) if vectors else embeddings)
+
+    # Save the vectors as a binary matrix plus a JSON Lines sidecar for
+    # later use with store_in_chroma.py
+    write_artifact(directory, ids, documents, metadatas, embeddings, dtype=dtype, model=EMBEDDING_MODEL)
+
+    embeddings_path, records_path = artifact_paths(directory)
+    print(f"Data prepared and saved to {embeddings_path} and {records_path}.")
+    print("These files can now be provided to store_in_chroma.py for insertion into Chroma.")
+    return {'chunks': len(ids), 'reused': reused, 'embedded': len(pending)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.generate_embeddings",
+        description="Embed final_chunks.json into a chroma_input artifact."
+    )
+    parser.add_argument("directory", help="book directory containing final_chunks.json")
+    parser.add_argument("--dtype", choices=DTYPES, default="float32",
+                        help="storage precision of the vectors (default: float32)")
+    args = parser.parse_args()
+
+    try:
+        generate_embeddings(args.directory, dtype=args.dtype)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,274 @@
+"""
+Single entry point for ingesting a book: extract -> chunk -> embed -> store.
+
+Usage:
+    python -m app.services.ingest_pipeline <path_to_pdf> [--force] [--workers N]
+
+Each stage records the SHA-256 of its inputs and outputs and its parameters
+(CHUNK_SIZE, OVERLAP, embedding model, ...) in ingest_manifest.json next to
+the PDF. A stage is skipped when its inputs, parameters and outputs still
+match the manifest. A stage interrupted by a crash has no completed entry
+(or its outputs no longer match), so the next run resumes from it; the
+embed and store stages then reuse the embedding cache and the existing
+Chroma collection for whatever they finished before the crash.
+
+Afterwards the catalog books with this PDF are recorded in the
+book_indexes registry (see book_index.py), which the chat API reads.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime
+from app.services.pdf_extractor import extract_text_from_pdf
+from app.services.prepare_for_chunking import prepare_chunks, CHUNK_SIZE, OVERLAP
+from app.services.generate_embeddings import generate_embeddings, EMBEDDING_MODEL
+from app.services.store_in_chroma import store_in_chroma
+from app.services.embedding_artifact import EMBEDDINGS_FILE, RECORDS_FILE, META_FILE, DTYPES
+from app.services.book_index import register_book_index
+from sqlalchemy.exc import OperationalError
+
+MANIFEST_FILE = "ingest_manifest.json"
+# Bump when a stage's output format changes, to force it to re-run
+PIPELINE_VERSION = 1
+
+
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_stages(pdf_path: str, workers: int = None, dtype: str = "float32", model=None):
+    """
+    Describe the pipeline for one book.
+
+    Each stage lists the stages it depends on, its input and output files
+    (relative to the book directory), the parameters that affect its
+    output, and a run() callable returning (items processed, unit).
+    """
+    directory = os.path.dirname(os.path.abspath(pdf_path))
+    pdf_name = os.path.basename(pdf_path)
+
+    def run_extract():
+        return extract_text_from_pdf(os.path.join(directory, pdf_name), workers=workers)['pages'], "pages"
+
+    def run_chunk():
+        return prepare_chunks(directory, chunk_size=CHUNK_SIZE, overlap=OVERLAP), "chunks"
+
+    def run_embed():
+        report = generate_embeddings(directory, dtype=dtype, model=model)
+        print(f"Embedding cache: {report['reused']} reused, {report['embedded']} embedded")
+        return report['chunks'], "chunks"
+
+    def run_store():
+        report = store_in_chroma(directory)
+        return report['added'] + report['updated'] + report['reused'], "chunks"
+
+    return directory, [
+        {
+            'name': 'extract',
+            'deps': [],
+            'inputs': [pdf_name],
+            'outputs': ["extracted.txt", "extracted_metadata.json"],
+            'params': {},
+            'run': run_extract,
+        },
+        {
+            'name': 'chunk',
+            'deps': ['extract'],
+            'inputs': ["extracted.txt", "extracted_metadata.json"],
+            'outputs': ["final_chunks.json"],
+            'params': {'chunk_size': CHUNK_SIZE, 'overlap': OVERLAP, 'encoding': "cl100k_base"},
+            'run': run_chunk,
+        },
+        {
+            'name': 'embed',
+            'deps': ['chunk'],
+            'inputs': ["final_chunks.json"],
+            'outputs': [EMBEDDINGS_FILE, RECORDS_FILE, META_FILE],
+            'params': {'model': EMBEDDING_MODEL, 'dtype': dtype},
+            'run': run_embed,
+        },
+        {
+            'name': 'store',
+            'deps': ['embed'],
+            'inputs': [EMBEDDINGS_FILE, RECORDS_FILE, META_FILE],
+            # The Chroma database changes on its own, so only its presence is checked
+            'outputs': [],
+            'markers': [os.path.join("chroma_db", "chroma.sqlite3")],
+            'params': {'collection': os.path.basename(directory)},
+            'run': run_store,
+        },
+    ]
+
+
+def topological_order(stages):
+    """Order stages so every stage comes after the stages it depends on."""
+    by_name = {stage['name']: stage for stage in stages}
+    ordered, visiting, done = [], set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Pipeline has a dependency cycle at stage '{name}'")
+        visiting.add(name)
+        for dep in by_name[name]['deps']:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+        ordered.append(by_name[name])
+
+    for stage in stages:
+        visit(stage['name'])
+    return ordered
+
+
+def load_manifest(directory: str) -> dict:
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'version': PIPELINE_VERSION, 'stages': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != PIPELINE_VERSION:
+        return {'version': PIPELINE_VERSION, 'stages': {}}
+    return manifest
+
+
+def save_manifest(directory: str, manifest: dict) -> None:
+    """Write the manifest atomically so a crash never leaves it half-written."""
+    path = os.path.join(directory, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def hash_files(directory: str, names):
+    """Return {name: sha256}, or None if any file is missing."""
+    hashes = {}
+    for name in names:
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            return None
+        hashes[name] = file_sha256(path)
+    return hashes
+
+
+def stage_is_current(directory: str, stage: dict, entry: dict, input_hashes) -> bool:
+    """True if the manifest entry was completed with these inputs and params and its outputs are intact."""
+    if not entry or entry.get('status') != 'done':
+        return False
+    if input_hashes is None or entry.get('inputs') != input_hashes:
+        return False
+    if entry.get('params') != stage['params']:
+        return False
+    if any(not os.path.exists(os.path.join(directory, m)) for m in stage.get('markers', [])):
+        return False
+    return hash_files(directory, stage['outputs']) == entry.get('outputs')
+
+
+def run_pipeline(pdf_path: str, force: bool = False, workers: int = None, dtype: str = "float32",
+                 model=None) -> list:
+    """
+    Run every out-of-date stage for the book at pdf_path.
+
+    Args:
+        force (bool): Re-run every stage even if it is up to date.
+        workers (int): Worker processes for PDF extraction.
+        model (SentenceTransformer): Preloaded embedding model, shared across books.
+
+    Returns:
+        list: One report dict per stage with 'stage', 'status' ('ran' or
+        'skipped'), 'seconds', 'items' and 'unit'.
+    """
+    directory, stages = build_stages(pdf_path, workers=workers, dtype=dtype, model=model)
+    manifest = load_manifest(directory)
+    reports = []
+
+    for stage in topological_order(stages):
+        name = stage['name']
+        entry = manifest['stages'].get(name)
+        input_hashes = hash_files(directory, stage['inputs'])
+        if input_hashes is None:
+            raise FileNotFoundError(f"Stage '{name}' is missing inputs {stage['inputs']} in {directory}")
+
+        if not force and stage_is_current(directory, stage, entry, input_hashes):
+            print(f"[{name}] up to date, skipping")
+            reports.append({'stage': name, 'status': 'skipped', 'seconds': 0.0,
+                            'items': entry.get('items'), 'unit': entry.get('unit')})
+            continue
+
+        if entry and entry.get('status') == 'running':
+            print(f"[{name}] resuming after an interrupted run")
+        print(f"[{name}] running")
+
+        manifest['stages'][name] = {'status': 'running', 'started_at': datetime.now().isoformat()}
+        save_manifest(directory, manifest)
+
+        started = time.perf_counter()
+        items, unit = stage['run']()
+        seconds = time.perf_counter() - started
+
+        manifest['stages'][name] = {
+            'status': 'done',
+            'inputs': input_hashes,
+            'params': stage['params'],
+            'outputs': hash_files(directory, stage['outputs']),
+            'items': items,
+            'unit': unit,
+            'seconds': seconds,
+            'completed_at': datetime.now().isoformat(),
+        }
+        save_manifest(directory, manifest)
+        reports.append({'stage': name, 'status': 'ran', 'seconds': seconds, 'items': items, 'unit': unit})
+
+    # Point the book_indexes registry at the finished index, so the chat API can use it
+    store = manifest['stages']['store']
+    try:
+        book_ids = register_book_index(pdf_path, store.get('items') or 0, embedding_model=EMBEDDING_MODEL,
+                                       pipeline_version=PIPELINE_VERSION, ingested_at=store.get('completed_at'))
+    except OperationalError as e:
+        print(f"Warning - Could not update the book index registry: {e}")
+    else:
+        if not book_ids:
+            print(f"Warning - No catalog book has file_path {pdf_path}; chat will not find this index")
+    return reports
+
+
+def print_report(reports) -> None:
+    print("\nStage      Status    Wall time   Throughput")
+    for report in reports:
+        if report['status'] == 'ran' and report['seconds'] > 0 and report['items'] is not None:
+            throughput = f"{report['items'] / report['seconds']:.1f} {report['unit']}/s ({report['items']} {report['unit']})"
+        else:
+            throughput = "-"
+        print(f"{report['stage']:<10} {report['status']:<9} {report['seconds']:>8.2f}s   {throughput}")
+    total = sum(report['seconds'] for report in reports)
+    print(f"Total wall time: {total:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.ingest_pipeline",
+        description="Extract, chunk, embed and store a book, skipping stages that are up to date."
+    )
+    parser.add_argument("pdf_path", help="path to the book's PDF")
+    parser.add_argument("--force", action="store_true", help="re-run every stage")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for PDF extraction (default: CPU count)")
+    parser.add_argument("--dtype", choices=DTYPES, default="float32",
+                        help="storage precision of the embedding vectors")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.pdf_path):
+        print(f"Error: PDF file not found at {args.pdf_path}")
+        sys.exit(1)
+
+    print_report(run_pipeline(args.pdf_path, force=args.force, workers=args.workers, dtype=args.dtype))
@@ -0,0 +1,57 @@
+"""
+Chat LLM backends.
+
+LLM_BACKEND selects the chat model the QA chains are built with:
+
+- 'openai': ChatOpenAI, with OPENAI_API_KEY (the default);
+- 'fake': FakeStreamingChatModel (fake_llm.py), a local stand-in that
+  streams a deterministic made-up answer at a configurable latency and
+  token rate, so the chat stack can be load-tested (scripts/loadtest_chat.py)
+  without calling OpenAI or having a key.
+
+Retrieval (embeddings and Chroma) is the same with either backend. Neither
+backend's module is imported until a chain is built.
+"""
+
+LLM_BACKENDS = ('openai', 'fake')
+
+
+def llm_settings(config) -> dict:
+    """The backend settings in config, as part of a QA chain's cache key."""
+    settings = {'llm_backend': config.get('LLM_BACKEND', 'openai')}
+    if settings['llm_backend'] == 'fake':
+        settings.update(
+            fake_latency=config.get('FAKE_LLM_LATENCY', 0.5),
+            fake_tokens_per_second=config.get('FAKE_LLM_TOKENS_PER_SECOND', 50.0),
+            fake_answer_tokens=config.get('FAKE_LLM_ANSWER_TOKENS', 60),
+        )
+    return settings
+
+
+def make_chat_model(settings: dict, openai_api_key: str = None):
+    """
+    Build the chat model for a QA chain.
+
+    Args:
+        settings (dict): get_qa_chain's settings: llm_settings() plus
+            'chat_model', 'temperature' and 'max_tokens'.
+        openai_api_key (str): Used by the 'openai' backend only.
+    """
+    backend = settings['llm_backend']
+    if backend == 'fake':
+        from app.services.fake_llm import FakeStreamingChatModel
+        return FakeStreamingChatModel(
+            latency=settings['fake_latency'],
+            tokens_per_second=settings['fake_tokens_per_second'],
+            answer_tokens=min(settings['fake_answer_tokens'], settings['max_tokens'])
+        )
+    if backend == 'openai':
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            api_key=openai_api_key,
+            model_name=settings['chat_model'],
+            temperature=settings['temperature'],
+            max_tokens=settings['max_tokens'],
+            streaming=True
+        )
+    raise ValueError(f"Unknown LLM_BACKEND '{backend}', expected one of {LLM_BACKENDS}")
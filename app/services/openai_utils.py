@@ -1,9 +1,12 @@
 # openai_utils.py
 import os
-from langchain.chains import RetrievalQA
+from typing import TYPE_CHECKING
 from flask import current_app
 
-def get_chat_response(query: str, qa_chain: RetrievalQA) -> str:
+if TYPE_CHECKING:
+    from langchain.chains import RetrievalQA
+
+def get_chat_response(query: str, qa_chain: "RetrievalQA") -> str:
     """
     Given a user query and a RetrievalQA chain, get a response from the LLM.
     
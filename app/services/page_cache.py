@@ -0,0 +1,91 @@
+"""
+Rendered-page cache for the catalog homepage.
+
+The homepage is a pure function of its normalized filters, the catalog
+version (see catalog_version.py) and the cover files, so rendered HTML is
+cached under a key that contains all three. A Book write bumps the
+version, which makes every old key unreachable; those entries then age
+out of the LRU. The same key also yields the page's ETag, so a repeat
+visit can be answered with 304 Not Modified before any query runs.
+"""
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from config import PAGE_CACHE_MAX_ENTRIES, PAGE_CACHE_MAX_BYTES
+
+
+def page_etag(key) -> str:
+    """
+    ETag value for a cache key.
+
+    The same in every worker process only if the key is: build keys from
+    shared state (catalog version, file digests), never from per-process
+    counters.
+    """
+    raw = json.dumps(key, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()
+
+
+class PageCache:
+    """
+    LRU cache of rendered pages, bounded by entry count and total size.
+
+    Attributes:
+        max_entries (int): Pages kept at most.
+        max_bytes (int): Total size of the cached bodies kept at most.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Cached body for key, or None."""
+        with self._lock:
+            body = self._pages.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._pages[key] = body
+            self._bytes += len(body)
+            while len(self._pages) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._pages.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._pages),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+# Shared by all requests in this process
+page_cache = PageCache(PAGE_CACHE_MAX_ENTRIES, PAGE_CACHE_MAX_BYTES)
@@ -0,0 +1,193 @@
+"""
+Popularity counters and leaderboards.
+
+Downloads and chat questions are counted per book in memory and added to
+books.top_downloads and books.most_discussed in periodic batches, one
+short transaction every POPULARITY_FLUSH_INTERVAL seconds instead of one
+write per request. Whatever is still pending when the process exits is
+flushed by an atexit hook. Several workers can flush independently, since
+each only adds its own increments.
+
+Leaderboards are kept per counter as an in-memory top-N, loaded by walking
+the counter's index from the top (never by sorting books) and updated
+from the new totals that each flush's UPDATE ... RETURNING gives back.
+Counters only grow, so a book can only enter the top-N by being
+incremented, which is exactly when its new total is seen. Other workers'
+increments are picked up when the top-N is reloaded after
+POPULARITY_TOP_TTL seconds.
+"""
+import atexit
+import threading
+import time
+from collections import defaultdict
+from config import POPULARITY_FLUSH_INTERVAL, POPULARITY_TOP_SIZE, POPULARITY_TOP_TTL
+
+# Counter columns of books, by the name used in URLs
+COUNTERS = {'downloads': 'top_downloads', 'discussed': 'most_discussed'}
+
+
+class Leaderboard:
+    """
+    Top-N books by one counter column.
+
+    Attributes:
+        column (str): books column ranked.
+        size (int): Books kept.
+        ttl (float): Seconds before the top-N is reloaded from the database.
+    """
+
+    def __init__(self, column: str, size: int = 50, ttl: float = 60.0):
+        self.column = column
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._loaded_at = None
+
+    def _load(self, connection) -> None:
+        # ORDER BY matches ix_books_<column> read backwards, so SQLite stops after size rows
+        rows = connection.exec_driver_sql(
+            f"SELECT id, {self.column} FROM books WHERE {self.column} > 0 "
+            f"ORDER BY {self.column} DESC, id DESC LIMIT ?", (self.size,)
+        ).all()
+        self._counts = dict(rows)
+        self._loaded_at = time.monotonic()
+
+    def top(self, connection, limit: int) -> list:
+        """
+        Highest-ranked books as [(book_id, count)], at most min(limit, size).
+
+        Args:
+            connection: SQLAlchemy connection, used only when a reload is due.
+        """
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._load(connection)
+            ranked = sorted(self._counts.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return ranked[:min(limit, self.size)]
+
+    def update(self, totals: list) -> None:
+        """Merge [(book_id, new total)] written by a flush."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for book_id, count in totals:
+                self._counts[book_id] = count
+            if len(self._counts) > self.size:
+                ranked = sorted(self._counts.items(), key=lambda item: (item[1], item[0]), reverse=True)
+                self._counts = dict(ranked[:self.size])
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+
+class PopularityCounters:
+    """
+    Per-book event counts waiting to be written, plus the leaderboards they feed.
+
+    Attributes:
+        flushes (int): Flushes that wrote at least one book.
+        written (int): Book counters updated by those flushes.
+    """
+
+    def __init__(self, top_size: int = 50, top_ttl: float = 60.0):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {column: defaultdict(int) for column in COUNTERS.values()}
+        self.leaderboards = {column: Leaderboard(column, top_size, top_ttl) for column in COUNTERS.values()}
+        self._engine = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.flushes = 0
+        self.written = 0
+
+    def record(self, column: str, book_id: int, count: int = 1) -> None:
+        """Count an event for book_id; nothing is written until the next flush."""
+        with self._lock:
+            self._pending[column][book_id] += count
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(counts) for counts in self._pending.values())
+
+    def flush(self, engine=None) -> int:
+        """
+        Add the pending counts to books in one transaction.
+
+        On failure the counts are put back and retried by the next flush.
+
+        Returns:
+            int: Book counters updated.
+        """
+        engine = engine or self._engine
+        if engine is None:
+            return 0
+        # One flush at a time, so a failed batch is restored before the next is taken
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = {column: defaultdict(int) for column in COUNTERS.values()}
+            if not any(batch.values()):
+                return 0
+
+            totals = {}
+            try:
+                with engine.begin() as conn:
+                    for column, counts in batch.items():
+                        statement = (f"UPDATE books SET {column} = COALESCE({column}, 0) + ? "
+                                     f"WHERE id = ? RETURNING id, {column}")
+                        # Sorted ids keep page access sequential
+                        totals[column] = [
+                            tuple(row) for book_id in sorted(counts)
+                            for row in conn.exec_driver_sql(statement, (counts[book_id], book_id))
+                        ]
+            except Exception:
+                with self._lock:
+                    for column, counts in batch.items():
+                        for book_id, count in counts.items():
+                            self._pending[column][book_id] += count
+                raise
+
+            for column, written in totals.items():
+                self.leaderboards[column].update(written)
+            written = sum(len(rows) for rows in totals.values())
+            self.flushes += 1
+            self.written += written
+            return written
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Debug - Popularity flush failed, will retry: {e}")
+
+    def start(self, engine, interval: float = 10.0) -> None:
+        """Flush to engine every interval seconds in a daemon thread, and once more at exit."""
+        self._engine = engine
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval,),
+                                        name="popularity-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self._shutdown)
+
+    def _shutdown(self) -> None:
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Debug - Final popularity flush failed: {e}")
+
+    def stats(self) -> dict:
+        return {'pending': self.pending(), 'flushes': self.flushes, 'written': self.written}
+
+
+# Shared by all requests in this process
+popularity = PopularityCounters(POPULARITY_TOP_SIZE, POPULARITY_TOP_TTL)
+
+
+def start_flusher(engine) -> None:
+    """Start the periodic flush of the shared counters (idempotent)."""
+    popularity.start(engine, POPULARITY_FLUSH_INTERVAL)
@@ -7,7 +7,9 @@ Reads:
 
 Performs:
 - Sentence-based token-limited chunking with overlapping tokens.
-- Uses nltk and tiktoken for token counting and sentence segmentation.
+- Uses nltk and tiktoken for token counting and sentence segmentation
+  (imported by prepare_chunks, so the chunker itself needs neither).
+  Each sentence is tokenized once and chunking runs in linear time.
 - Outputs final_chunks.json containing the resulting chunks with minimal metadata.
 
 This script assumes 'extracted.txt' and 'extracted_metadata.json' are present
@@ -17,9 +19,7 @@ in the provided directory. It will read these files, chunk the text, and write '
 import sys
 import os
 import json
-import nltk
-from nltk.tokenize import sent_tokenize
-import tiktoken
+from bisect import bisect_right
 from tqdm import tqdm
 
 # Hardcoded settings for now
@@ -28,6 +28,7 @@ OVERLAP = 50
 
 def ensure_nltk_punkt():
     """Ensure NLTK punkt tokenizer is downloaded."""
+    import nltk
     try:
         nltk.data.find('tokenizers/punkt')
     except LookupError:
@@ -39,82 +40,89 @@ def load_metadata(json_path: str):
     with open(json_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+def count_sentence_tokens(sentences, encoder):
+    """
+    Count tokens for every sentence in one batched call.
+
+    encode_ordinary_batch tokenizes on tiktoken's thread pool; encoders
+    without it fall back to one encode() call per sentence.
+    """
+    encode_batch = getattr(encoder, "encode_ordinary_batch", None)
+    if encode_batch is not None:
+        return [len(tokens) for tokens in encode_batch(sentences)]
+    return [len(encoder.encode(s)) for s in sentences]
+
 def chunk_with_overlap_indexed(sentences, encoder, chunk_size=500, overlap=50):
     """
     Similar to previous chunk_with_overlap but returns sentence indexes.
     Also includes a progress bar for monitoring chunking progress.
+
+    Each sentence is tokenized once. Because a chunk is always a contiguous
+    run of sentences, it is tracked as a start index and its token count is
+    a difference of prefix sums; the overlap carried into the next chunk is
+    found by binary search over the same prefix sums.
     """
+    token_counts = count_sentence_tokens(sentences, encoder)
+    prefix = [0]
+    for count in token_counts:
+        prefix.append(prefix[-1] + count)
+
     indexed_chunks = []
-    current_sentence_idxs = []
-    current_tokens_count = 0
+    # The current chunk is sentences[start:i]; None means it is empty
+    start = None
 
     # Initialize progress bar for sentence processing
     pbar = tqdm(total=len(sentences), desc="Chunking Sentences", unit="sent")
 
-    i = 0
-    while i < len(sentences):
-        sent = sentences[i]
-        sent_tokens = len(encoder.encode(sent))
-        if current_tokens_count + sent_tokens > chunk_size:
+    for i, sent_tokens in enumerate(token_counts):
+        current_start = i if start is None else start
+        if prefix[i] - prefix[current_start] + sent_tokens > chunk_size:
             # finalize chunk
-            indexed_chunks.append(current_sentence_idxs[:])
-
-            # overlap
-            overlap_sents = []
-            tokens_count_for_overlap = 0
-            for idx in reversed(current_sentence_idxs):
-                t_count = len(encoder.encode(sentences[idx]))
-                if tokens_count_for_overlap + t_count < overlap:
-                    overlap_sents.insert(0, idx)
-                    tokens_count_for_overlap += t_count
-                else:
-                    break
-
-            current_sentence_idxs = overlap_sents[:]
-            current_tokens_count = sum(len(encoder.encode(sentences[s_idx])) for s_idx in current_sentence_idxs)
+            indexed_chunks.append(list(range(current_start, i)))
+
+            # overlap: the longest suffix of the chunk holding fewer than
+            # `overlap` tokens
+            overlap_start = bisect_right(prefix, prefix[i] - overlap, current_start, i)
+            start = overlap_start if overlap_start < i else None
 
             if sent_tokens > chunk_size:
                 # large sentence alone
-                if current_sentence_idxs:
-                    indexed_chunks.append(current_sentence_idxs[:])
-                    current_sentence_idxs = []
-                    current_tokens_count = 0
+                if start is not None:
+                    indexed_chunks.append(list(range(start, i)))
+                    start = None
                 indexed_chunks.append([i])
-                i += 1
-            else:
-                current_sentence_idxs.append(i)
-                current_tokens_count += sent_tokens
-                i += 1
-        else:
-            current_sentence_idxs.append(i)
-            current_tokens_count += sent_tokens
-            i += 1
+                pbar.update(1)
+                continue
 
+        if start is None:
+            start = i
         pbar.update(1)
 
-    if current_sentence_idxs:
-        indexed_chunks.append(current_sentence_idxs)
+    if start is not None:
+        indexed_chunks.append(list(range(start, len(sentences))))
 
     pbar.close()
     return indexed_chunks
 
-if __name__ == "__main__":
-    ensure_nltk_punkt()
+def prepare_chunks(directory: str, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP) -> int:
+    """
+    Chunk extracted.txt of directory into final_chunks.json.
 
-    if len(sys.argv) != 2:
-        print("Usage: python -m app.services.prepare_for_chunking <directory_path>")
-        sys.exit(1)
+    Returns:
+        int: Number of chunks written.
+    """
+    from nltk.tokenize import sent_tokenize
+    import tiktoken
+
+    ensure_nltk_punkt()
 
-    directory = sys.argv[1]
     txt_path = os.path.join(directory, "extracted.txt")
     json_path = os.path.join(directory, "extracted_metadata.json")
 
     if not os.path.exists(txt_path):
-        print(f"Error: extracted.txt not found in {directory}")
-        sys.exit(1)
+        raise FileNotFoundError(f"extracted.txt not found in {directory}")
     if not os.path.exists(json_path):
-        print(f"Error: extracted_metadata.json not found in {directory}")
-        sys.exit(1)
+        raise FileNotFoundError(f"extracted_metadata.json not found in {directory}")
 
     metadata = load_metadata(json_path)
     doc_title = metadata["doc_title"]
@@ -143,7 +151,7 @@ if __name__ == "__main__":
             all_sentences.append((page_idx, s))
 
     just_sentences = [s for (_, s) in all_sentences]
-    indexed_chunks = chunk_with_overlap_indexed(just_sentences, encoder, chunk_size=CHUNK_SIZE, overlap=OVERLAP)
+    indexed_chunks = chunk_with_overlap_indexed(just_sentences, encoder, chunk_size=chunk_size, overlap=overlap)
 
     final_chunks = []
     for ch in indexed_chunks:
@@ -173,3 +181,15 @@ if __name__ == "__main__":
     with open(out_json_path, 'w', encoding='utf-8') as out_f:
         json.dump(final_chunks, out_f, ensure_ascii=False, indent=2)
     print(f"All chunks saved to {out_json_path}")
+    return len(final_chunks)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m app.services.prepare_for_chunking <directory_path>")
+        sys.exit(1)
+
+    try:
+        prepare_chunks(sys.argv[1])
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
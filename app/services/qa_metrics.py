@@ -0,0 +1,111 @@
+"""
+Per-strategy metrics for QA chains.
+
+Every chain returned by get_qa_chain is wrapped in a MeteredQAChain, which
+counts the LLM calls made while answering and times the whole invoke. The
+totals are grouped by chain strategy (refine, stuff, map_reduce) so the
+strategies can be compared on a running deployment via /chat/stats.
+"""
+import threading
+import time
+from langchain.callbacks.base import BaseCallbackHandler
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Count LLM calls started during one chain invocation."""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        with self._lock:
+            self.calls += 1
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        with self._lock:
+            self.calls += 1
+
+
+class ChainStats:
+    """Thread-safe accumulator of call counts and latency per chain strategy."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._modes = {}
+
+    def record(self, mode: str, llm_calls: int, latency: float, failed: bool = False) -> None:
+        with self._lock:
+            stats = self._modes.setdefault(mode, {
+                'requests': 0,
+                'failures': 0,
+                'llm_calls': 0,
+                'total_latency': 0.0,
+                'max_latency': 0.0,
+                'last_latency': 0.0,
+            })
+            stats['requests'] += 1
+            stats['failures'] += int(failed)
+            stats['llm_calls'] += llm_calls
+            stats['total_latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+            stats['last_latency'] = latency
+
+    def snapshot(self) -> dict:
+        """Return totals plus per-request averages for every strategy seen so far."""
+        with self._lock:
+            result = {}
+            for mode, stats in self._modes.items():
+                requests = stats['requests'] or 1
+                result[mode] = dict(
+                    stats,
+                    avg_llm_calls=stats['llm_calls'] / requests,
+                    avg_latency=stats['total_latency'] / requests,
+                )
+            return result
+
+
+chain_stats = ChainStats()
+
+
+class MeteredQAChain:
+    """
+    Wrap a QA chain so each invoke records its LLM call count and latency.
+
+    Exposes the same invoke(inputs, config=None) and ainvoke(inputs,
+    config=None) interface as RetrievalQA.
+    """
+
+    def __init__(self, chain, mode: str, stats: ChainStats = chain_stats):
+        self.chain = chain
+        self.mode = mode
+        self.stats = stats
+
+    def _metered_config(self, config):
+        counter = LLMCallCounter()
+        config = dict(config or {})
+        config['callbacks'] = list(config.get('callbacks') or []) + [counter]
+        return counter, config
+
+    def invoke(self, inputs, config=None):
+        counter, config = self._metered_config(config)
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = self.chain.invoke(inputs, config=config)
+            failed = False
+            return result
+        finally:
+            self.stats.record(self.mode, counter.calls, time.perf_counter() - start, failed=failed)
+
+    async def ainvoke(self, inputs, config=None):
+        counter, config = self._metered_config(config)
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = await self.chain.ainvoke(inputs, config=config)
+            failed = False
+            return result
+        finally:
+            # Cancelled runs (timeouts, disconnects) count as failures
+            self.stats.record(self.mode, counter.calls, time.perf_counter() - start, failed=failed)
@@ -0,0 +1,149 @@
+"""
+Process-wide registry of warm QA chains and vector stores.
+
+Building a RetrievalQA chain means opening a Chroma persistent store and
+creating a ChatOpenAI client. Doing that on every /chat request is slow, so
+chains are kept here, keyed by (chroma_db_path, collection_name, settings),
+and evicted least-recently-used once the entry cap is reached.
+
+Re-ingesting a book touches a stamp file inside its chroma_db directory (see
+touch_index_stamp). The registry compares that stamp on every lookup, so a
+chain built against an older index is dropped and rebuilt, even when the
+ingestion ran in another process.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+INDEX_STAMP_FILE = ".ingest_stamp"
+
+
+def index_stamp(chroma_db_path: str):
+    """Return a token that changes whenever the index at chroma_db_path is rebuilt."""
+    try:
+        st = os.stat(os.path.join(chroma_db_path, INDEX_STAMP_FILE))
+    except OSError:
+        return None
+    return st.st_mtime_ns
+
+
+def touch_index_stamp(chroma_db_path: str) -> None:
+    """Mark the index at chroma_db_path as rebuilt. Called by the ingestion scripts."""
+    os.makedirs(chroma_db_path, exist_ok=True)
+    stamp_path = os.path.join(chroma_db_path, INDEX_STAMP_FILE)
+    with open(stamp_path, 'w', encoding='utf-8') as f:
+        f.write(str(time.time()))
+    # Guarantee a new token even on filesystems with coarse mtimes
+    now_ns = time.time_ns()
+    os.utime(stamp_path, ns=(now_ns, now_ns))
+
+
+class QAChainRegistry:
+    """
+    Thread-safe LRU cache of built QA chains.
+
+    Attributes:
+        max_entries (int): Maximum number of chains kept open at once.
+        hits (int): Lookups served from the cache.
+        misses (int): Lookups that had to build a new chain.
+        evictions (int): Chains dropped because the cap was reached.
+        invalidations (int): Chains dropped because their index was rebuilt.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_build(self, key, chroma_db_path: str, builder):
+        """
+        Return the chain cached under key, calling builder() to create it on a miss.
+
+        Concurrent misses for the same key wait for a single build instead of
+        each loading their own copy.
+        """
+        stamp = index_stamp(chroma_db_path)
+        with self._lock:
+            chain = self._lookup(key, stamp)
+            if chain is not None:
+                return chain
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                chain = self._lookup(key, stamp, count_miss=True)
+                if chain is not None:
+                    return chain
+            chain = builder()
+            with self._lock:
+                self._entries[key] = (stamp, chain)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+                self._build_locks.pop(key, None)
+            return chain
+
+    def _lookup(self, key, stamp, count_miss=False):
+        """Return a fresh cached chain for key or None. Caller must hold self._lock."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            cached_stamp, chain = entry
+            if cached_stamp == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return chain
+            del self._entries[key]
+            self.invalidations += 1
+        if count_miss:
+            self.misses += 1
+        return None
+
+    def invalidate(self, chroma_db_path: str = None) -> int:
+        """
+        Drop cached chains for one index, or every chain if no path is given.
+
+        Returns:
+            int: Number of chains dropped.
+        """
+        with self._lock:
+            if chroma_db_path is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                target = os.path.abspath(chroma_db_path)
+                stale = [k for k in self._entries if os.path.abspath(k[0]) == target]
+                for k in stale:
+                    del self._entries[k]
+                dropped = len(stale)
+            self.invalidations += dropped
+            return dropped
+
+    def resize(self, max_entries: int) -> None:
+        """Change the entry cap, evicting the oldest chains if needed."""
+        with self._lock:
+            self.max_entries = max(1, int(max_entries))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """Return counters and current size for monitoring."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+registry = QAChainRegistry()
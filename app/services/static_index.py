@@ -0,0 +1,151 @@
+"""
+In-memory index of the files under app/static.
+
+home() needs to know which cover images exist. Instead of calling
+os.path.isfile() per book on every request, StaticFileIndex walks the
+directory tree once and answers from a set. The index is rebuilt when any
+indexed directory's mtime changes (a file was added, removed or renamed),
+checked at most every check_interval seconds, or when refresh() is called.
+
+generation counts this process's scans and only serves to invalidate
+in-process caches. Anything sent to clients (ETags, Last-Modified) uses
+images_state() instead, which is derived from the files themselves and
+therefore the same in every worker process that sees the same files.
+"""
+import os
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+
+# Files whose presence can change a rendered page (book covers)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+
+class StaticFileIndex:
+    """
+    Set of file paths under root, relative to root with '/' separators.
+
+    Attributes:
+        root (str): Directory being indexed.
+        check_interval (float): Minimum seconds between mtime checks.
+    """
+
+    def __init__(self, root: str, check_interval: float = 5.0):
+        self.root = os.path.abspath(root)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._files = frozenset()
+        self._dir_mtimes = {}
+        self._checked_at = None
+        self._generation = 0
+        self._images_state = (None, None)
+
+    def _scan(self) -> None:
+        files = set()
+        dir_mtimes = {}
+        image_mtime = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            try:
+                dir_mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+            rel_dir = os.path.relpath(dirpath, self.root)
+            has_images = False
+            for filename in filenames:
+                rel_path = filename if rel_dir == '.' else os.path.join(rel_dir, filename)
+                files.add(rel_path.replace(os.sep, '/'))
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    has_images = True
+                    try:
+                        image_mtime = max(image_mtime, os.stat(os.path.join(dirpath, filename)).st_mtime_ns)
+                    except OSError:
+                        pass
+            if has_images:
+                # A removed image shows up as a newer directory mtime
+                image_mtime = max(image_mtime, dir_mtimes[dirpath])
+        self._files = frozenset(files)
+        self._dir_mtimes = dir_mtimes
+        images = sorted(path for path in files if path.lower().endswith(IMAGE_EXTENSIONS))
+        self._images_state = (
+            hashlib.sha1("\n".join(images).encode('utf-8')).hexdigest(),
+            datetime.fromtimestamp(image_mtime / 1e9, tz=timezone.utc),
+        )
+        self._generation += 1
+
+    def _is_stale(self) -> bool:
+        for dirpath, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(dirpath).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            if self._checked_at is None or self._is_stale():
+                self._scan()
+            self._checked_at = now
+
+    def refresh(self) -> None:
+        """Rebuild the index now, e.g. after writing new files under root."""
+        with self._lock:
+            self._scan()
+            self._checked_at = time.monotonic()
+
+    @property
+    def generation(self) -> int:
+        """
+        Number of scans so far in this process; changes whenever the indexed
+        files may have changed. Differs between processes.
+        """
+        self._ensure_fresh()
+        return self._generation
+
+    def images_state(self) -> tuple:
+        """
+        (digest, last_modified) of the image files under root.
+
+        digest hashes their paths, so it changes when an image is added or
+        removed; last_modified is the newest mtime of an image or of a
+        directory holding images, as an aware UTC datetime.
+        """
+        self._ensure_fresh()
+        return self._images_state
+
+    def exists(self, rel_path: str) -> bool:
+        """True if rel_path (relative to root) is an indexed file."""
+        self._ensure_fresh()
+        return rel_path.replace('\\', '/').lstrip('/') in self._files
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_static_index(root: str) -> StaticFileIndex:
+    """Return the process-wide index for root, creating it on first use."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = StaticFileIndex(root)
+            _indexes[root] = index
+        return index
+
+
+def resolve_cover(image_path: str, static_dir: str):
+    """
+    Return the static-relative path of a book cover if the file exists, else None.
+
+    Accepts paths stored with or without a leading 'static/'.
+    """
+    if not image_path:
+        return None
+    if image_path.startswith('static/'):
+        image_path = image_path[len('static/'):]
+    return image_path if get_static_index(static_dir).exists(image_path) else None
@@ -1,72 +1,145 @@
 import sys
 import os
-import json
 import shutil
+import argparse
 import chromadb
 from tqdm import tqdm
-
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python -m app.services.store_in_chroma <directory_path>")
-        sys.exit(1)
-
-    directory = sys.argv[1]
-    chroma_input_path = os.path.join(directory, "chroma_input.json")
-
-    if not os.path.exists(chroma_input_path):
-        print(f"Error: chroma_input.json not found in {directory}")
-        sys.exit(1)
-
-    # Load the data from chroma_input.json
-    with open(chroma_input_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    documents = data["documents"]
-    metadatas = data["metadatas"]
-    ids = data["ids"]
-    embeddings = data["embeddings"]  # list of lists of floats
+from app.services.qa_registry import touch_index_stamp
+from app.services.answer_cache import remove_persisted_answers
+from app.services.book_index import register_directory
+from app.services.embedding_artifact import (
+    artifact_exists, read_artifact_meta, count_records, iter_ids, iter_artifact_batches,
+    iter_legacy_json_batches, LEGACY_JSON_FILE
+)
+
+def store_in_chroma(directory: str, batch_size: int = 100, rebuild: bool = False) -> dict:
+    """
+    Sync the Chroma collection of directory with its chroma_input artifact.
+
+    Chunk ids are content-addressed, so the collection is diffed against
+    the artifact: ids missing from the collection are added, ids whose
+    metadata changed are rewritten, ids no longer in the artifact are
+    deleted, and everything else is left untouched.
+
+    Ids do not depend on the embedding model, so the collection records the
+    model and dtype of the artifact it was built from. When they differ
+    from the artifact's (e.g. after an EMBEDDING_MODEL change) every vector
+    is stale, and the collection is rebuilt.
+
+    Falls back to a chroma_input.json written by earlier versions.
+
+    Args:
+        rebuild (bool): Delete the existing database and store every chunk.
+
+    Returns:
+        dict: Chunk counts 'reused', 'added', 'updated' and 'removed'.
+    """
+    if artifact_exists(directory):
+        # Check the vectors and records belong together before touching the collection
+        meta = read_artifact_meta(directory)
+        embedding = {'embedding_model': meta.get('model', ''), 'embedding_dtype': meta.get('dtype', '')}
+        total = count_records(directory)
+        wanted_ids = set(iter_ids(directory))
+        batches = iter_artifact_batches(directory, batch_size)
+    elif os.path.exists(os.path.join(directory, LEGACY_JSON_FILE)):
+        print(f"Using legacy {LEGACY_JSON_FILE}; re-run generate_embeddings for the binary format.")
+        # The legacy format does not record its model
+        embedding = None
+        total = None
+        wanted_ids = set(chunk_id for batch in iter_legacy_json_batches(directory, batch_size)
+                         for chunk_id in batch[0])
+        batches = iter_legacy_json_batches(directory, batch_size)
+    else:
+        raise FileNotFoundError(f"chroma_input artifact not found in {directory}")
 
     # Directory for Chroma's local database
     persist_dir = os.path.join(directory, "chroma_db")
 
-    # Check if there's an existing database and overwrite it if yes
-    if os.path.exists(persist_dir):
-        print("Existing Chroma database found. Removing it to overwrite...")
+    if rebuild and os.path.exists(persist_dir):
+        print("Existing Chroma database found. Removing it to rebuild...")
         shutil.rmtree(persist_dir)
 
-    # Initialize a new PersistentClient
     client = chromadb.PersistentClient(path=persist_dir)
 
     # Create or get a collection for this book
     collection_name = os.path.basename(os.path.normpath(directory))
-    collection = client.get_or_create_collection(collection_name)
-
-    print(f"Storing data in Chroma collection '{collection_name}'...")
-
-    # Insert data in batches with a progress bar
-    batch_size = 100
-    total = len(documents)
-
-    pbar = tqdm(total=total, desc="Inserting Embeddings into Chroma", unit="doc")
-
-    for start_idx in range(0, total, batch_size):
-        end_idx = min(start_idx + batch_size, total)
-        batch_docs = documents[start_idx:end_idx]
-        batch_meta = metadatas[start_idx:end_idx]
-        batch_ids = ids[start_idx:end_idx]
-        batch_embs = embeddings[start_idx:end_idx]
-
-        collection.add(
-            documents=batch_docs,
-            metadatas=batch_meta,
-            ids=batch_ids,
-            embeddings=batch_embs
-        )
-
-        pbar.update(len(batch_docs))
+    collection = client.get_or_create_collection(collection_name, metadata=embedding)
+
+    if embedding is not None:
+        built_with = {key: (collection.metadata or {}).get(key) for key in embedding}
+        if built_with != embedding:
+            if collection.count():
+                print(f"Collection was built with {built_with}, the artifact with {embedding}. "
+                      "Rebuilding it...")
+                client.delete_collection(collection_name)
+                collection = client.create_collection(collection_name, metadata=embedding)
+                rebuild = True
+            else:
+                collection.modify(metadata=embedding)
+
+    existing = collection.get(include=["metadatas"])
+    existing_metadata = dict(zip(existing["ids"], existing["metadatas"]))
+    existing_ids = set(existing_metadata)
+    stale_ids = existing_ids - wanted_ids
+
+    print(f"Syncing Chroma collection '{collection_name}'...")
+
+    # Write only the chunks the collection does not have yet, or has with other metadata
+    pbar = tqdm(total=total, desc="Syncing Embeddings into Chroma", unit="doc")
+
+    added = updated = 0
+    for batch_ids, batch_docs, batch_meta, batch_embs in batches:
+        new_rows = [i for i, chunk_id in enumerate(batch_ids) if chunk_id not in existing_ids]
+        changed_rows = [i for i, chunk_id in enumerate(batch_ids)
+                        if chunk_id in existing_ids and existing_metadata[chunk_id] != batch_meta[i]]
+        rows = new_rows + changed_rows
+        if rows:
+            collection.upsert(
+                documents=[batch_docs[i] for i in rows],
+                metadatas=[batch_meta[i] for i in rows],
+                ids=[batch_ids[i] for i in rows],
+                embeddings=[batch_embs[i] for i in rows]
+            )
+            added += len(new_rows)
+            updated += len(changed_rows)
+        pbar.update(len(batch_ids))
 
     pbar.close()
 
-    # Persistence is automatic with PersistentClient
-    print("Data added to Chroma successfully!")
+    # Drop chunks that disappeared from the book
+    stale_ids = sorted(stale_ids)
+    for start_idx in range(0, len(stale_ids), batch_size):
+        collection.delete(ids=stale_ids[start_idx:start_idx + batch_size])
+
+    # Persistence is automatic with PersistentClient.
+    if added or updated or stale_ids or rebuild:
+        # Tell running web workers that cached chains and answers for this book are stale.
+        touch_index_stamp(persist_dir)
+        remove_persisted_answers(persist_dir)
+
+    reused = len(existing_ids & wanted_ids) - updated
+    report = {'reused': reused, 'added': added, 'updated': updated, 'removed': len(stale_ids)}
+    print(f"Chroma sync complete: {report['reused']} reused, {report['added']} added, "
+          f"{report['updated']} updated, {report['removed']} removed.")
     print(f"Chroma database stored at: {persist_dir}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.store_in_chroma",
+        description="Sync a book's Chroma collection with its chroma_input artifact."
+    )
+    parser.add_argument("directory", help="book directory containing the chroma_input artifact")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="delete the existing Chroma database and store every chunk")
+    args = parser.parse_args()
+
+    try:
+        store_in_chroma(args.directory, rebuild=args.rebuild)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    # ingest_pipeline registers books itself; a standalone sync does it here
+    book_ids = register_directory(args.directory)
+    print(f"Registered for chat: book(s) {book_ids}" if book_ids else
+          "No catalog book matched this directory's PDF; it is not available for chat.")
@@ -0,0 +1,278 @@
+"""
+Cover thumbnails for the catalog grid.
+
+Usage:
+    python -m app.services.thumbnails [--db instance/app.db] [--force] [--prune]
+
+Covers are stored at full resolution (often several hundred KB of PNG),
+while a grid card is about 250 CSS pixels wide. generate_thumbnails()
+writes WebP and JPEG variants of each cover at THUMB_WIDTHS into
+app/static/thumbs, named after a hash of the source image and the
+encoding settings, and records them in thumbs/manifest.json. A changed
+cover or changed settings therefore always get new file names, so the
+files can be served with far-future, immutable cache headers (see the
+/covers route). Covers whose file size and mtime still match the manifest
+are skipped.
+
+Thumbnails are generated after catalog imports (catalog_import and
+startup seeding). Pillow is optional: without it no thumbnails are made
+and the grid links to the original covers, as before.
+"""
+import io
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import create_engine
+from app.services.static_index import get_static_index
+from config import BASE_DIR, DATABASE_PATH
+
+STATIC_DIR = os.path.join(BASE_DIR, 'app', 'static')
+THUMBS_DIR = 'thumbs'
+MANIFEST_FILE = 'manifest.json'
+
+# Card width and its 2x for high-density screens
+THUMB_WIDTHS = (240, 480)
+# Output formats in order of preference, with their Pillow save options
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+# Part of every file name hash; bump to regenerate all thumbnails
+THUMBS_VERSION = 1
+_SETTINGS = json.dumps([THUMBS_VERSION, THUMB_WIDTHS, FORMATS], sort_keys=True).encode('utf-8')
+# Thumbnail file names, <digest>-<width>.<format>; the manifest and stray files never match
+THUMB_NAME = re.compile(rf"[0-9a-f]{{20}}-[0-9]+\.(?:{'|'.join(FORMATS)})")
+
+
+def _manifest_path(static_dir: str) -> str:
+    return os.path.join(static_dir, THUMBS_DIR, MANIFEST_FILE)
+
+
+def load_manifest(static_dir: str = STATIC_DIR) -> dict:
+    """{cover path relative to static: entry}, or {} if there is no manifest."""
+    try:
+        with open(_manifest_path(static_dir), 'r', encoding='utf-8') as f:
+            return json.load(f).get('covers', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(static_dir: str, covers: dict) -> None:
+    path = _manifest_path(static_dir)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': THUMBS_VERSION, 'covers': covers}, f, indent=1, sort_keys=True)
+    # Readers never see a half-written manifest
+    os.replace(tmp_path, path)
+
+
+def _make_variants(source: bytes, digest: str, out_dir: str) -> dict:
+    """
+    Encode the variants of one cover into out_dir.
+
+    Returns:
+        dict: 'width' and 'height' of the smallest variant, and 'variants'
+        as {format: [[width, file name], ...]} in increasing width.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(source)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            # JPEG has no alpha channel; flatten onto the card background
+            background = Image.new('RGB', image.size, (240, 240, 240))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        # Never upscale; a cover narrower than every width gets one variant at its own size
+        widths = sorted({min(width, image.width) for width in THUMB_WIDTHS})
+        entry = {'variants': {name: [] for name in FORMATS}}
+        for width in widths:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+            if 'width' not in entry:
+                entry['width'], entry['height'] = width, height
+            for name, options in FORMATS.items():
+                file_name = f"{digest}-{width}.{name}"
+                file_path = os.path.join(out_dir, file_name)
+                if not os.path.exists(file_path):
+                    resized.save(f"{file_path}.tmp", **options)
+                    os.replace(f"{file_path}.tmp", file_path)
+                entry['variants'][name].append([width, file_name])
+    return entry
+
+
+def generate_thumbnails(image_paths, static_dir: str = STATIC_DIR, force: bool = False,
+                        prune: bool = False) -> dict:
+    """
+    Make sure every cover in image_paths has up-to-date thumbnails.
+
+    Args:
+        image_paths: Cover paths as stored in books.image_path (relative
+            to static, with or without a leading 'static/').
+        force (bool): Re-read covers even if their size and mtime are unchanged.
+        prune (bool): Delete thumbnails no cover uses any more. Off by
+            default, since pages rendered earlier may still link to them.
+
+    Returns:
+        dict: 'generated', 'current', 'missing' and 'failed' cover counts,
+        'pruned' files, and 'errors' (cover path and message).
+    """
+    report = {'generated': 0, 'current': 0, 'missing': 0, 'failed': 0, 'pruned': 0, 'errors': []}
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("Debug - Pillow is not installed; skipping cover thumbnails")
+        return report
+
+    out_dir = os.path.join(static_dir, THUMBS_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    old = load_manifest(static_dir)
+    # Covers not in image_paths keep their entries unless pruning
+    covers = {} if prune else dict(old)
+    for image_path in sorted({p for p in image_paths if p}):
+        rel_path = image_path[len('static/'):] if image_path.startswith('static/') else image_path
+        source_path = os.path.join(static_dir, rel_path)
+        try:
+            st = os.stat(source_path)
+        except OSError:
+            covers.pop(rel_path, None)
+            report['missing'] += 1
+            continue
+        entry = old.get(rel_path)
+        if (not force and entry and entry.get('size') == st.st_size and entry.get('mtime_ns') == st.st_mtime_ns
+                and all(os.path.exists(os.path.join(out_dir, file_name))
+                        for variants in entry['variants'].values() for _, file_name in variants)):
+            covers[rel_path] = entry
+            report['current'] += 1
+            continue
+        try:
+            with open(source_path, 'rb') as f:
+                source = f.read()
+            digest = hashlib.sha256(source + _SETTINGS).hexdigest()[:20]
+            entry = _make_variants(source, digest, out_dir)
+        except Exception as e:
+            # An unreadable cover falls back to the original image (or the placeholder)
+            covers.pop(rel_path, None)
+            report['failed'] += 1
+            report['errors'].append((rel_path, str(e)))
+            continue
+        entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+        covers[rel_path] = entry
+        report['generated'] += 1
+
+    if prune:
+        used = {file_name for entry in covers.values()
+                for variants in entry['variants'].values() for _, file_name in variants}
+        for file_name in os.listdir(out_dir):
+            if file_name != MANIFEST_FILE and file_name not in used:
+                os.remove(os.path.join(out_dir, file_name))
+                report['pruned'] += 1
+
+    if covers != old or report['pruned']:
+        _save_manifest(static_dir, covers)
+        # Pick the new files up now rather than at the index's next mtime check
+        get_static_index(static_dir).refresh()
+    return report
+
+
+def generate_catalog_thumbnails(db_path: str = DATABASE_PATH, static_dir: str = STATIC_DIR,
+                                force: bool = False, prune: bool = False) -> dict:
+    """Generate thumbnails for every distinct books.image_path in db_path."""
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        with engine.connect() as conn:
+            image_paths = [row[0] for row in conn.exec_driver_sql(
+                "SELECT DISTINCT image_path FROM books WHERE image_path IS NOT NULL")]
+    finally:
+        engine.dispose()
+    return generate_thumbnails(image_paths, static_dir, force=force, prune=prune)
+
+
+class ThumbnailIndex:
+    """
+    The thumbnail manifest of one static directory, reloaded when it changes.
+
+    Reloads follow the static file index's generation, which changes when
+    a manifest is written (generate_thumbnails refreshes it), so lookups
+    cost no filesystem calls.
+    """
+
+    def __init__(self, static_dir: str):
+        self.static_dir = static_dir
+        self._lock = threading.Lock()
+        self._generation = None
+        self._covers = {}
+        self._state = (None, None)
+
+    def _load(self) -> None:
+        generation = get_static_index(self.static_dir).generation
+        if generation == self._generation:
+            return
+        self._covers = load_manifest(self.static_dir)
+        try:
+            mtime_ns = os.stat(_manifest_path(self.static_dir)).st_mtime_ns
+        except OSError:
+            mtime_ns = 0
+        raw = json.dumps(self._covers, sort_keys=True).encode('utf-8')
+        self._state = (hashlib.sha1(raw).hexdigest(), datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc))
+        self._generation = generation
+
+    def get(self, rel_path: str):
+        """Manifest entry for a cover path relative to static, or None."""
+        with self._lock:
+            self._load()
+            return self._covers.get(rel_path)
+
+    def state(self) -> tuple:
+        """
+        (digest, last_modified) of the manifest: a hash of its entries, the
+        same in every process, and its mtime as an aware UTC datetime.
+        """
+        with self._lock:
+            self._load()
+            return self._state
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_thumbnail_index(static_dir: str) -> ThumbnailIndex:
+    """Return the process-wide thumbnail index for static_dir."""
+    static_dir = os.path.abspath(static_dir)
+    with _indexes_lock:
+        index = _indexes.get(static_dir)
+        if index is None:
+            index = _indexes[static_dir] = ThumbnailIndex(static_dir)
+        return index
+
+
+def print_report(report: dict) -> None:
+    print(f"Generated: {report['generated']}, up to date: {report['current']}, "
+          f"missing cover: {report['missing']}, failed: {report['failed']}, pruned files: {report['pruned']}")
+    for rel_path, error in report['errors']:
+        print(f"- {rel_path}: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.thumbnails",
+        description="Generate WebP/JPEG cover thumbnails for every book in the catalog."
+    )
+    parser.add_argument("--db", default=DATABASE_PATH, help="SQLite database (default: instance/app.db)")
+    parser.add_argument("--force", action="store_true", help="re-encode covers even if unchanged")
+    parser.add_argument("--prune", action="store_true", help="delete thumbnails no cover uses any more")
+    args = parser.parse_args()
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("Error: Pillow is not installed (pip install Pillow)")
+        sys.exit(1)
+    print_report(generate_catalog_thumbnails(args.db, force=args.force, prune=args.prune))
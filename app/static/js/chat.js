@@ -57,6 +57,115 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         }
 
+        function setLoading(isLoading) {
+            sendBtn.disabled = isLoading;
+            sendBtn.style.opacity = isLoading ? '0.5' : '1';
+            sendBtn.style.cursor = isLoading ? 'not-allowed' : 'pointer';
+            sendText.style.display = isLoading ? 'none' : 'inline';
+            spinner.style.display = isLoading ? 'inline-block' : 'none';
+        }
+
+        function appendReferences(messageDiv, pages) {
+            if (pages && pages.length > 0) {
+                const refsDiv = document.createElement('div');
+                refsDiv.classList.add('references');
+                refsDiv.innerHTML = "<strong>References:</strong> " + 
+                    pages.map(page => 
+                        `<a href="#" class="ref-link" data-page="${page}">Page ${page}</a>`
+                    ).join(", ");
+                messageDiv.appendChild(refsDiv);
+            }
+        }
+
+        // Stream the answer from /chat/stream (Server-Sent Events over a POST
+        // response) and render tokens as they arrive. Resolves to false if the
+        // stream could not be opened, so the caller can fall back to /chat.
+        async function streamMessage(message) {
+            let response;
+            try {
+                response = await fetch('/chat/stream', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'Accept': 'text/event-stream',
+                    },
+                    body: JSON.stringify({ message }),
+                });
+            } catch (error) {
+                console.error('Error:', error);
+                return false;
+            }
+            if (!response.ok || !response.body) return false;
+
+            const messageDiv = document.createElement('div');
+            messageDiv.classList.add('message', 'ai-message');
+            messages.appendChild(messageDiv);
+
+            let answer = '';
+            let renderPending = false;
+
+            // Re-render Markdown at most once per animation frame
+            function scheduleRender() {
+                if (renderPending) return;
+                renderPending = true;
+                requestAnimationFrame(() => {
+                    renderPending = false;
+                    messageDiv.innerHTML = marked.parse(answer);
+                    messages.scrollTop = messages.scrollHeight;
+                });
+            }
+
+            function handleEvent(event, data) {
+                if (event === 'token') {
+                    answer += data.text;
+                    scheduleRender();
+                } else if (event === 'reset') {
+                    answer = '';
+                    scheduleRender();
+                } else if (event === 'pages') {
+                    messageDiv.innerHTML = marked.parse(answer);
+                    appendReferences(messageDiv, data.pages);
+                    messages.scrollTop = messages.scrollHeight;
+                } else if (event === 'done') {
+                    answer = data.response;
+                } else if (event === 'error') {
+                    messageDiv.textContent = 'Sorry, there was an error processing your message.';
+                }
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            try {
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    buffer += decoder.decode(value, { stream: true });
+
+                    // SSE frames are separated by a blank line
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        const frame = buffer.slice(0, boundary);
+                        buffer = buffer.slice(boundary + 2);
+
+                        let event = 'message';
+                        let data = '';
+                        frame.split('\n').forEach(line => {
+                            if (line.startsWith('event:')) event = line.slice(6).trim();
+                            else if (line.startsWith('data:')) data += line.slice(5).trim();
+                        });
+                        if (data) handleEvent(event, JSON.parse(data));
+                    }
+                }
+            } catch (error) {
+                console.error('Error:', error);
+                if (!answer) {
+                    messageDiv.textContent = 'Sorry, there was an error processing your message.';
+                }
+            }
+            return true;
+        }
+
         function simulateTypingEffect(aiMessage, pages = [], options = {speed: 1, batchSize: 10}) {
             const messageDiv = document.createElement('div');
             messageDiv.classList.add('message', 'ai-message');
@@ -75,15 +184,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 messageDiv.innerHTML = html;
                 
                 // Add references if available
-                if (pages && pages.length > 0) {
-                    const refsDiv = document.createElement('div');
-                    refsDiv.classList.add('references');
-                    refsDiv.innerHTML = "<strong>References:</strong> " + 
-                        pages.map(page => 
-                            `<a href="#" class="ref-link" data-page="${page}">Page ${page}</a>`
-                        ).join(", ");
-                    messageDiv.appendChild(refsDiv);
-                }
+                appendReferences(messageDiv, pages);
                 
                 messages.scrollTop = messages.scrollHeight;
                 return;
@@ -106,15 +207,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     messageDiv.innerHTML = html;
 
                     // Add references if available
-                    if (pages && pages.length > 0) {
-                        const refsDiv = document.createElement('div');
-                        refsDiv.classList.add('references');
-                        refsDiv.innerHTML = "<strong>References:</strong> " + 
-                            pages.map(page => 
-                                `<a href="#" class="ref-link" data-page="${page}">Page ${page}</a>`
-                            ).join(", ");
-                        messageDiv.appendChild(refsDiv);
-                    }
+                    appendReferences(messageDiv, pages);
                 }
             }
             typeChar();
@@ -137,8 +230,13 @@ document.addEventListener('DOMContentLoaded', function() {
             appendMessageAsUser(message);
             chatInput.value = '';
 
-            const response = await sendMessage(message);
-            simulateTypingEffect(response.response, response.pages);
+            setLoading(true);
+            const streamed = await streamMessage(message);
+            setLoading(false);
+            if (!streamed) {
+                const response = await sendMessage(message);
+                simulateTypingEffect(response.response, response.pages);
+            }
         });
 
         chatInput.addEventListener('keypress', (e) => {
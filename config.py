@@ -1,4 +1,80 @@
 import os
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-STORAGE_DIR = os.path.join(BASE_DIR, 'app/static') 
\ No newline at end of file
+STORAGE_DIR = os.path.join(BASE_DIR, 'app/static')
+# SQLite database used by the app and by the command-line tools
+DATABASE_PATH = os.environ.get('DATABASE_PATH', os.path.join(BASE_DIR, 'instance', 'app.db'))
+
+# Chat: seconds a book's entry in the book_indexes registry is reused by the
+# chat API before it is read again (so a newly ingested book becomes
+# chattable within this delay).
+BOOK_INDEX_CACHE_TTL = float(os.environ.get('BOOK_INDEX_CACHE_TTL', 30))
+
+# Chat stack: maximum number of warm QA chains (open Chroma stores + LLM clients)
+# kept per process before the least recently used one is evicted.
+QA_CACHE_MAX_ENTRIES = int(os.environ.get('QA_CACHE_MAX_ENTRIES', 8))
+
+# Import the chat stack and load the embedding model in a background thread
+# at startup. Off by default: the stack is then imported on the first chat
+# request, which keeps web workers that only serve the catalog fast to start.
+CHAT_WARMUP = os.environ.get('CHAT_WARMUP', '0') == '1'
+
+# Chat LLM backend: 'openai' (ChatOpenAI, needs OPENAI_API_KEY) or 'fake', a
+# local deterministic stand-in for load tests that streams FAKE_LLM_ANSWER_TOKENS
+# tokens at FAKE_LLM_TOKENS_PER_SECOND after FAKE_LLM_LATENCY seconds.
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'openai')
+FAKE_LLM_LATENCY = float(os.environ.get('FAKE_LLM_LATENCY', 0.5))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.environ.get('FAKE_LLM_TOKENS_PER_SECOND', 50))
+FAKE_LLM_ANSWER_TOKENS = int(os.environ.get('FAKE_LLM_ANSWER_TOKENS', 60))
+
+# Async chat (app/asgi.py): chains running at once per process, seconds a
+# request may wait for one before getting 503, and seconds a chain may run
+# before it is cancelled (0 for no limit). ASGI_WSGI_THREADS threads serve
+# the other (Flask) routes.
+CHAT_MAX_CONCURRENCY = int(os.environ.get('CHAT_MAX_CONCURRENCY', 32))
+CHAT_QUEUE_TIMEOUT = float(os.environ.get('CHAT_QUEUE_TIMEOUT', 10))
+CHAT_TIMEOUT = float(os.environ.get('CHAT_TIMEOUT', 120))
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 10))
+
+# QA chain strategy: 'refine' (one sequential LLM call per retrieved chunk),
+# 'stuff' (a single call over the chunks that fit in QA_STUFF_TOKEN_BUDGET)
+# or 'map_reduce' (concurrent per-chunk calls, then one answering call).
+QA_CHAIN_TYPE = os.environ.get('QA_CHAIN_TYPE', 'refine')
+QA_STUFF_TOKEN_BUDGET = int(os.environ.get('QA_STUFF_TOKEN_BUDGET', 3000))
+QA_MAP_CONCURRENCY = int(os.environ.get('QA_MAP_CONCURRENCY', 5))
+
+# Semantic answer cache: questions whose embedding has at least this cosine
+# similarity to a previous question about the same book reuse its answer.
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', '1') == '1'
+ANSWER_CACHE_THRESHOLD = float(os.environ.get('ANSWER_CACHE_THRESHOLD', 0.92))
+ANSWER_CACHE_TTL = float(os.environ.get('ANSWER_CACHE_TTL', 86400))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', 256))
+ANSWER_CACHE_PERSIST = os.environ.get('ANSWER_CACHE_PERSIST', '0') == '1'
+# Seconds between writes of persisted answer caches (they are also written at exit).
+ANSWER_CACHE_FLUSH_INTERVAL = float(os.environ.get('ANSWER_CACHE_FLUSH_INTERVAL', 30))
+
+# Catalog listing: seconds a filtered result count is reused before COUNT(*) runs again.
+CATALOG_COUNT_TTL = float(os.environ.get('CATALOG_COUNT_TTL', 60))
+
+# Rendered homepage cache, keyed by catalog version and normalized filters.
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 256))
+PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Popularity counters (downloads, chat questions): seconds between batched
+# writes to books, and size/refresh interval of the in-memory leaderboards.
+POPULARITY_FLUSH_INTERVAL = float(os.environ.get('POPULARITY_FLUSH_INTERVAL', 10))
+POPULARITY_TOP_SIZE = int(os.environ.get('POPULARITY_TOP_SIZE', 50))
+POPULARITY_TOP_TTL = float(os.environ.get('POPULARITY_TOP_TTL', 60))
+
+# Book PDFs (/book/<id>/pdf and /book/<id>/download): seconds a resolved
+# book id -> file path is reused. Behind Apache/lighttpd, USE_X_SENDFILE=1 hands
+# the file to the server via X-Sendfile (a Flask setting). Behind nginx, set
+# X_ACCEL_REDIRECT_PREFIX to an internal location aliased to STORAGE_DIR
+# (e.g. /protected-books/) to send X-Accel-Redirect instead.
+BOOK_FILE_CACHE_TTL = float(os.environ.get('BOOK_FILE_CACHE_TTL', 300))
+USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '0') == '1'
+X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '')
+
+# JSON catalog API (/api/books): default and maximum books per page.
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
@@ -1,7 +1,5 @@
 from app import create_app
-from app.db import db
 
+# create_app() applies any pending schema migrations (app/migrations.py)
 app = create_app()
-
-with app.app_context():
-    db.create_all()  # This will create the Book table as defined in your updated model
+print("Database schema is up to date.")
@@ -0,0 +1,139 @@
+"""
+Benchmark chat concurrency: sync workers vs. the async chat path.
+
+Usage:
+    python -m scripts.bench_async_chat [--requests 400] [--clients 1 10 50 200]
+        [--latency 2.0] [--tokens 40] [--workers 4] [--max-concurrency 32]
+
+A fake QA chain stands in for retrieval and the LLM: each answer takes
+--latency seconds, spent waiting for --tokens tokens like a remote LLM
+streaming them. With N clients sending questions back to back:
+
+- sync: --workers threads each block in chain.invoke, as gunicorn sync
+  workers do, so at most --workers chats make progress at a time;
+- async: AsyncChat.answer() (slot semaphore, timeout and disconnect watch
+  included) awaits chain.ainvoke on one event loop, with at most
+  --max-concurrency chains running at once.
+
+For each client count the script reports throughput and p50/p95 latency.
+"""
+import time
+import asyncio
+import argparse
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.routes.chat_routes import PreparedChat
+from app.services.async_chat import AsyncChat
+
+
+class FakeChain:
+    """A QA chain whose answers take latency seconds, spread over tokens steps."""
+
+    def __init__(self, latency: float, tokens: int):
+        self.step = latency / max(1, tokens)
+        self.tokens = max(1, tokens)
+
+    def _result(self, inputs) -> dict:
+        return {"query": inputs["query"], "result": "fake answer", "source_documents": []}
+
+    def invoke(self, inputs, config=None):
+        for _ in range(self.tokens):
+            time.sleep(self.step)
+        return self._result(inputs)
+
+    async def ainvoke(self, inputs, config=None):
+        for _ in range(self.tokens):
+            await asyncio.sleep(self.step)
+        return self._result(inputs)
+
+
+def _summary(latencies: list, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        'throughput': len(latencies) / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        'mean': statistics.fmean(latencies),
+    }
+
+
+def run_sync(chain: FakeChain, requests: int, clients: int, workers: int) -> dict:
+    """Clients queue their questions for a pool of workers threads."""
+    remaining = [requests]
+    lock = threading.Lock()
+    latencies = []
+
+    def client(pool):
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            pool.submit(chain.invoke, {"query": "question"}).result()
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        threads = [threading.Thread(target=client, args=(pool,)) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return _summary(latencies, time.perf_counter() - started)
+
+
+async def run_async(chain: FakeChain, requests: int, clients: int, max_concurrency: int) -> dict:
+    """Clients send their questions to AsyncChat.answer() on this event loop."""
+    chat = AsyncChat(None, max_concurrency=max_concurrency, timeout=0, queue_timeout=3600)
+    prepared = PreparedChat(query="question", cached=None, qa_chain=chain, cache=None, embedding=None)
+    never = asyncio.Event()
+    remaining = [requests]
+    latencies = []
+
+    async def receive():
+        # The client stays connected
+        await never.wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start' and message['status'] != 200:
+            raise RuntimeError(f"unexpected status {message['status']}")
+
+    async def client():
+        while remaining[0]:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            await chat.answer(prepared, receive, send)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return _summary(latencies, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.bench_async_chat",
+        description="Compare chat throughput of sync workers and the async chat path with a fake LLM."
+    )
+    parser.add_argument("--requests", type=int, default=400, help="questions per run")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50, 200],
+                        help="concurrent clients (one run per value)")
+    parser.add_argument("--latency", type=float, default=2.0, help="seconds per fake answer")
+    parser.add_argument("--tokens", type=int, default=40, help="streamed tokens per fake answer")
+    parser.add_argument("--workers", type=int, default=4, help="sync workers")
+    parser.add_argument("--max-concurrency", type=int, default=32,
+                        help="async chains running at once (CHAT_MAX_CONCURRENCY)")
+    args = parser.parse_args()
+
+    chain = FakeChain(args.latency, args.tokens)
+    print(f"{args.requests} questions per run, {args.latency:.2f}s per answer; "
+          f"{args.workers} sync workers vs. async with {args.max_concurrency} slots")
+    print(f"{'clients':>7} {'sync req/s':>11} {'p50 s':>7} {'p95 s':>7} {'async req/s':>12} {'p50 s':>7} {'p95 s':>7}")
+    for clients in args.clients:
+        sync = run_sync(chain, args.requests, clients, args.workers)
+        concurrent = asyncio.run(run_async(chain, args.requests, clients, args.max_concurrency))
+        print(f"{clients:>7} {sync['throughput']:>11.2f} {sync['p50']:>7.2f} {sync['p95']:>7.2f} "
+              f"{concurrent['throughput']:>12.2f} {concurrent['p50']:>7.2f} {concurrent['p95']:>7.2f}")
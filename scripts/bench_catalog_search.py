@@ -0,0 +1,144 @@
+"""
+Benchmark catalog search: ILIKE substring matching vs. the FTS5 index.
+
+Usage:
+    python -m scripts.bench_catalog_search [--books 100000] [--queries 200]
+
+Builds a synthetic catalog in a temporary SQLite database, then times the
+query home() used to run (ILIKE on title/author, COUNT + first page) against
+the FTS5 query (BM25-ranked, with snippets, COUNT + first page).
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from sqlalchemy import create_engine, select, func, or_
+from app.models import Book
+from app.services.catalog_search import ensure_search_index, match_expression, search_subquery
+
+SYLLABLES = "ka ri to mu se na lo vi de pa ro su te mi gu la fo ne bi zo".split()
+VOCABULARY_SIZE = 5000
+FIRST_NAMES = "Ahmed Maria John Fatima Li Sara Omar Anna David Layla Chen Noor".split()
+LAST_NAMES = "Hassan Smith Garcia Khan Wang Ali Brown Rossi Ibrahim Kim Nasser Silva".split()
+LANGUAGES = ("English", "Arabic", "Spanish")
+PER_PAGE = 12
+
+
+def make_vocabulary(rng) -> list:
+    """Distinct pseudo-words of 2-4 syllables."""
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def build_catalog(engine, n_books: int, vocabulary: list, seed: int = 42) -> None:
+    """
+    Create the schema and insert n_books synthetic books through the FTS triggers.
+
+    Words are drawn with Zipf-like frequencies (weight 1/rank), as in real
+    text, so common words match many books and rare words only a few.
+    """
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+
+    def words(k):
+        return rng.choices(vocabulary, weights=weights, k=k)
+
+    Book.metadata.create_all(engine)
+    with engine.begin() as connection:
+        ensure_search_index(connection)
+    rows = []
+    for _ in range(n_books):
+        rows.append({
+            'title': " ".join(word.capitalize() for word in words(rng.randint(2, 5))),
+            'author': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'category': words(1)[0].capitalize(),
+            'language': rng.choice(LANGUAGES),
+            'description': " ".join(words(rng.randint(20, 60))),
+            'rating': round(rng.uniform(1, 5), 1),
+            'reviews_count': rng.randint(0, 5000),
+        })
+    with engine.begin() as connection:
+        connection.execute(Book.__table__.insert(), rows)
+
+
+def ilike_page(connection, search_query: str):
+    condition = or_(Book.title.ilike(f'%{search_query}%'), Book.author.ilike(f'%{search_query}%'))
+    total = connection.execute(select(func.count()).select_from(Book).where(condition)).scalar()
+    rows = connection.execute(select(Book.id).where(condition).limit(PER_PAGE)).all()
+    return total, rows
+
+
+def fts_page(connection, search_query: str):
+    fts_results = search_subquery(match_expression(search_query))
+    total = connection.execute(select(func.count()).select_from(fts_results)).scalar()
+    rows = connection.execute(
+        select(Book.id, Book.title, fts_results.c.snippet)
+        .join(fts_results, fts_results.c.id == Book.id)
+        .order_by(fts_results.c.score, Book.id)
+        .limit(PER_PAGE)
+    ).all()
+    return total, rows
+
+
+def time_queries(connection, fn, queries):
+    timings = []
+    for search_query in queries:
+        started = time.perf_counter()
+        fn(connection, search_query)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'mean': statistics.fmean(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.bench_catalog_search",
+        description="Compare ILIKE and FTS5 catalog search on a synthetic catalog."
+    )
+    parser.add_argument("--books", type=int, default=100_000, help="synthetic catalog size")
+    parser.add_argument("--queries", type=int, default=200, help="queries per method")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    vocabulary = make_vocabulary(random.Random(1))
+    queries = []
+    for _ in range(args.queries):
+        kind = rng.random()
+        word = rng.choice(vocabulary)
+        if kind < 0.4:
+            queries.append(word)                                           # whole word
+        elif kind < 0.7:
+            queries.append(word[:5])                                       # prefix
+        elif kind < 0.9:
+            queries.append(f"{word} {rng.choice(vocabulary)[:3]}")         # two terms
+        else:
+            queries.append(rng.choice(LAST_NAMES))                         # author
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        started = time.perf_counter()
+        build_catalog(engine, args.books, vocabulary)
+        print(f"Built a catalog of {args.books} books in {time.perf_counter() - started:.1f}s")
+
+        with engine.connect() as connection:
+            # Warm the page cache for both paths before timing
+            ilike_page(connection, queries[0])
+            fts_page(connection, queries[0])
+            results = {
+                'ILIKE (title/author)': time_queries(connection, ilike_page, queries),
+                'FTS5 BM25 + snippet': time_queries(connection, fts_page, queries),
+            }
+        engine.dispose()
+
+    print(f"\n{len(queries)} queries, COUNT + first page of {PER_PAGE}")
+    print(f"{'Method':<22} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, stats in results.items():
+        print(f"{name:<22} {stats['mean']:>9.2f} {stats['p50']:>9.2f} {stats['p95']:>9.2f}")
@@ -0,0 +1,114 @@
+"""
+Benchmark cold-start import time of the web app.
+
+Usage:
+    python -m scripts.bench_import_time [--target run] [--runs 5] [--top 15] [--check]
+
+Imports the target module (run.py by default) in fresh interpreters with
+`python -X importtime` and reports the median wall time of the import,
+the median cumulative time of the slowest modules, and whether any module
+of the chat stack was loaded. Web workers should not import the chat stack
+at startup (it is imported on the first chat request), so --check exits
+with status 1 if one does, which makes the script usable in CI.
+"""
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+from config import BASE_DIR
+
+# Top-level packages that belong to the chat stack and are slow to import
+CHAT_STACK = ('langchain', 'langchain_core', 'langchain_openai', 'langchain_chroma', 'chromadb',
+              'sentence_transformers', 'torch', 'transformers', 'tiktoken', 'openai')
+
+# import time:      self [us] |      cumulative | imported package
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$")
+
+
+def import_profile(target: str) -> dict:
+    """
+    Import target in a fresh interpreter and parse its -X importtime output.
+
+    Returns:
+        dict: {module: (self_us, cumulative_us)} for every module imported.
+
+    Raises:
+        RuntimeError: If the import fails.
+    """
+    code = f"import {target}"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BASE_DIR, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"'{code}' failed:\n{completed.stderr[-2000:]}")
+    modules = {}
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, module = match.groups()
+            modules[module] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_benchmark(target: str, runs: int, top: int) -> dict:
+    """
+    Profile target runs times and summarize.
+
+    Returns:
+        dict: 'total_ms' (median import time of target), 'slowest'
+        ([(module, median cumulative ms)]), 'chat_stack' (sorted chat
+        stack packages that were imported).
+    """
+    totals = []
+    cumulative = defaultdict(list)
+    chat_stack = set()
+    for _ in range(runs):
+        modules = import_profile(target)
+        totals.append(modules[target][1] / 1000)
+        for module, (_, cumulative_us) in modules.items():
+            cumulative[module].append(cumulative_us / 1000)
+            if module.split('.')[0] in CHAT_STACK:
+                chat_stack.add(module.split('.')[0])
+
+    # The target itself is reported as the total
+    medians = {module: statistics.median(times) for module, times in cumulative.items()
+               if module != target}
+    slowest = sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'total_ms': statistics.median(totals),
+        'slowest': slowest,
+        'chat_stack': sorted(chat_stack),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.bench_import_time",
+        description="Measure cold-start import time of the web app with -X importtime."
+    )
+    parser.add_argument("--target", default="run", help="module to import (default: run)")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to average over")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 if the chat stack is imported at startup")
+    args = parser.parse_args()
+
+    try:
+        result = run_benchmark(args.target, max(1, args.runs), args.top)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"import {args.target}: {result['total_ms']:.0f} ms (median of {args.runs} runs)")
+    print("\nSlowest modules (cumulative, ms):")
+    for module, ms in result['slowest']:
+        print(f"  {ms:8.1f}  {module}")
+    if result['chat_stack']:
+        print(f"\nChat stack imported at startup: {', '.join(result['chat_stack'])}")
+        if args.check:
+            sys.exit(1)
+    else:
+        print("\nChat stack imported at startup: none")
@@ -0,0 +1,251 @@
+"""
+Load test for the catalog and chat endpoints.
+
+Usage:
+    python -m scripts.loadtest_chat [--url http://localhost:5000 | --serve | --serve-asgi]
+        [--readers 20] [--duration 60] [--book 1] [--questions 3] [--think 1.0] [--no-stream]
+
+Each simulated reader browses the catalog (GET /), opens a book
+(GET /chat/<id>, which selects it in the session) and asks --questions
+questions about it through /chat/stream (or /chat with --no-stream),
+pausing up to --think seconds between steps, over and over until
+--duration seconds have passed. The script then reports requests,
+throughput and p50/p95/p99 latency per endpoint, time to first token for
+streamed answers, and errors by cause: the HTTP status (409 for a book
+that is not indexed, 503 when no chat slot frees up in time, 504 for a
+chat that timed out), 'error event' for a stream that ended in an error
+event, 'incomplete' for one that ended without a done event, and
+'exception' when the request itself failed.
+
+Before starting the readers the script opens the book and asks it one
+question through POST /chat, and stops if either returns anything but 200,
+so a misconfigured server (no index, no OpenAI key, ...) fails fast rather
+than producing a report made of errors.
+
+Run the server with LLM_BACKEND=fake to make no OpenAI calls (see
+FAKE_LLM_* in config.py for its timing), and with ANSWER_CACHE_ENABLED=0
+unless answers from the semantic cache are what you want to measure.
+--serve starts the app in this process on a threaded Werkzeug server,
+which serves chat synchronously, and --serve-asgi starts app.asgi:application
+on uvicorn instead, which serves it asynchronously (see Chat.md). To test a
+separately started ASGI server, point --url at it, for example at
+`uvicorn app.asgi:application --port 8000` with --url http://localhost:8000.
+"""
+import sys
+import math
+import socket
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+import requests
+
+QUESTIONS = (
+    "What is this book about?",
+    "Summarize the main ideas of the first chapter.",
+    "What are the key recommendations?",
+    "Which risks does the author discuss?",
+    "Explain the most important definitions in the book.",
+    "What examples does the book give?",
+    "How does the book suggest getting started?",
+    "What are the common mistakes mentioned?",
+    "Who is the intended audience?",
+    "What does the conclusion say?",
+)
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile of values (which must not be empty)."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Recorder:
+    """Latency samples and error counts by cause per endpoint, shared by the reader threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.first_token = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, latency: float, error: str = None, first_token: float = None) -> None:
+        with self._lock:
+            if error is not None:
+                self.errors[endpoint][error] += 1
+                return
+            self.latencies[endpoint].append(latency)
+            if first_token is not None:
+                self.first_token[endpoint].append(first_token)
+
+
+def status_error(response) -> str:
+    """None for a 200 response, else its status code as the error cause."""
+    return None if response.status_code == 200 else str(response.status_code)
+
+
+def ask_streaming(session, base_url: str, question: str, timeout: float):
+    """POST /chat/stream; returns (error cause or None, time to first token or None)."""
+    started = time.perf_counter()
+    first_token = None
+    done = False
+    with session.post(f"{base_url}/chat/stream", json={'message': question}, stream=True,
+                      timeout=timeout) as response:
+        if response.status_code != 200:
+            return status_error(response), None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('event: '):
+                continue
+            event = line[len('event: '):]
+            if event == 'token' and first_token is None:
+                first_token = time.perf_counter() - started
+            elif event == 'error':
+                return 'error event', first_token
+            elif event == 'done':
+                done = True
+    return (None if done else 'incomplete'), first_token
+
+
+def run_reader(base_url: str, args, recorder: Recorder, deadline: float, seed: int) -> None:
+    rng = random.Random(seed)
+    session = requests.Session()
+    chat_endpoint = 'POST /chat/stream' if args.stream else 'POST /chat'
+
+    def timed(endpoint, request):
+        started = time.perf_counter()
+        try:
+            error, first_token = request()
+        except requests.RequestException:
+            error, first_token = 'exception', None
+        recorder.record(endpoint, time.perf_counter() - started, error, first_token)
+
+    def think():
+        time.sleep(rng.uniform(0, args.think))
+
+    # Spread the readers' first requests
+    think()
+    while time.monotonic() < deadline:
+        timed('GET /', lambda: (status_error(session.get(f"{base_url}/", timeout=args.timeout)), None))
+        think()
+        timed(f'GET /chat/{args.book}',
+              lambda: (status_error(session.get(f"{base_url}/chat/{args.book}", timeout=args.timeout)), None))
+        for question in rng.sample(QUESTIONS, min(args.questions, len(QUESTIONS))):
+            if time.monotonic() >= deadline:
+                break
+            think()
+            if args.stream:
+                timed(chat_endpoint, lambda: ask_streaming(session, base_url, question, args.timeout))
+            else:
+                timed(chat_endpoint, lambda: (status_error(session.post(f"{base_url}/chat", json={'message': question},
+                                                                        timeout=args.timeout)), None))
+        think()
+
+
+def serve_in_process() -> str:
+    """Start the app on a free local port in a daemon thread; returns its base URL."""
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, name="loadtest-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def serve_asgi_in_process() -> str:
+    """Start app.asgi:application on uvicorn on a free local port in a daemon thread; returns its base URL."""
+    import uvicorn
+    from app.asgi import application
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    # uvicorn installs no signal handlers outside the main thread
+    server = uvicorn.Server(uvicorn.Config(application, log_level='warning'))
+    threading.Thread(target=server.run, kwargs={'sockets': [sock]}, name="loadtest-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def print_report(recorder: Recorder, elapsed: float) -> None:
+    print(f"\n{'endpoint':<20} {'ok':>6} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'ttft p50':>9} {'ttft p95':>9} {'ttft p99':>9}")
+    endpoints = sorted(set(recorder.latencies) | set(recorder.errors))
+    for endpoint in endpoints:
+        latencies = recorder.latencies[endpoint]
+        errors = sum(recorder.errors[endpoint].values())
+        line = f"{endpoint:<20} {len(latencies):>6} {errors:>6} {len(latencies) / elapsed:>7.2f}"
+        if latencies:
+            line += "".join(f" {percentile(latencies, p) * 1000:>8.0f}" for p in (50, 95, 99))
+        else:
+            line += f" {'-':>8}" * 3
+        first_token = recorder.first_token[endpoint]
+        if first_token:
+            line += "".join(f" {percentile(first_token, p) * 1000:>9.0f}" for p in (50, 95, 99))
+        else:
+            line += f" {'-':>9}" * 3
+        print(line)
+    failing = [endpoint for endpoint in endpoints if recorder.errors[endpoint]]
+    if failing:
+        print("\nerrors by cause:")
+        for endpoint in failing:
+            causes = sorted(recorder.errors[endpoint].items(), key=lambda item: -item[1])
+            print(f"  {endpoint:<20} " + ", ".join(f"{cause}: {count}" for cause, count in causes))
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    print(f"\n{total} successful requests in {elapsed:.1f}s ({total / elapsed:.2f} req/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.loadtest_chat",
+        description="Drive / and /chat with concurrent simulated readers and report latency percentiles."
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://localhost:5000", help="base URL of a running server")
+    target.add_argument("--serve", action="store_true",
+                        help="start the app in this process on Werkzeug (synchronous chat) instead")
+    target.add_argument("--serve-asgi", action="store_true",
+                        help="start app.asgi:application in this process on uvicorn (asynchronous chat) instead")
+    parser.add_argument("--readers", type=int, default=20, help="concurrent simulated readers")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run")
+    parser.add_argument("--book", type=int, default=1, help="book id the readers chat about")
+    parser.add_argument("--questions", type=int, default=3, help="questions per book visit")
+    parser.add_argument("--think", type=float, default=1.0, help="maximum pause between steps, in seconds")
+    parser.add_argument("--timeout", type=float, default=120, help="request timeout, in seconds")
+    parser.add_argument("--no-stream", dest="stream", action="store_false",
+                        help="ask through /chat instead of /chat/stream")
+    args = parser.parse_args()
+
+    if args.serve:
+        base_url = serve_in_process()
+    elif args.serve_asgi:
+        base_url = serve_asgi_in_process()
+    else:
+        base_url = args.url.rstrip('/')
+
+    # One real chat before the run, in the session the book was opened in
+    preflight = requests.Session()
+    try:
+        response = preflight.get(f"{base_url}/chat/{args.book}", timeout=args.timeout)
+        if response.status_code != 200:
+            print(f"Error: GET /chat/{args.book} returned {response.status_code}")
+            sys.exit(1)
+        response = preflight.post(f"{base_url}/chat", json={'message': QUESTIONS[0]}, timeout=args.timeout)
+    except requests.RequestException as e:
+        print(f"Error: cannot reach {base_url}: {e}")
+        sys.exit(1)
+    if response.status_code != 200:
+        print(f"Error: POST /chat returned {response.status_code}: {response.text[:200]}")
+        sys.exit(1)
+
+    print(f"{args.readers} readers for {args.duration:.0f}s against {base_url} (book {args.book})")
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + args.duration
+    readers = [threading.Thread(target=run_reader, args=(base_url, args, recorder, deadline, seed), daemon=True)
+               for seed in range(args.readers)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    print_report(recorder, time.monotonic() - started)
@@ -0,0 +1,127 @@
+"""
+Regression tests for prepare_for_chunking.chunk_with_overlap_indexed.
+
+The prefix-sum chunker must produce exactly the chunk boundaries of the
+original sentence loop, kept below as reference_chunk_with_overlap_indexed.
+A whitespace tokenizer stands in for tiktoken and a regex sentence splitter
+for nltk, so the tests need neither.
+"""
+import os
+import re
+import random
+import pytest
+from app.services.prepare_for_chunking import chunk_with_overlap_indexed
+
+EXTRACTED_TEXT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'app', 'static', 'storage', 'books', 'Cybersecurity', 'extracted.txt')
+
+
+class WordEncoder:
+    """One token per whitespace-separated word."""
+
+    def encode(self, text):
+        return text.split()
+
+
+class BatchWordEncoder(WordEncoder):
+    """WordEncoder with tiktoken's batched API, which the chunker prefers."""
+
+    def encode_ordinary_batch(self, texts):
+        return [self.encode(text) for text in texts]
+
+
+def reference_chunk_with_overlap_indexed(sentences, encoder, chunk_size=500, overlap=50):
+    """The chunker as it was before the prefix-sum rewrite (progress bar removed)."""
+    indexed_chunks = []
+    current_sentence_idxs = []
+    current_tokens_count = 0
+
+    i = 0
+    while i < len(sentences):
+        sent = sentences[i]
+        sent_tokens = len(encoder.encode(sent))
+        if current_tokens_count + sent_tokens > chunk_size:
+            # finalize chunk
+            indexed_chunks.append(current_sentence_idxs[:])
+
+            # overlap
+            overlap_sents = []
+            tokens_count_for_overlap = 0
+            for idx in reversed(current_sentence_idxs):
+                t_count = len(encoder.encode(sentences[idx]))
+                if tokens_count_for_overlap + t_count < overlap:
+                    overlap_sents.insert(0, idx)
+                    tokens_count_for_overlap += t_count
+                else:
+                    break
+
+            current_sentence_idxs = overlap_sents[:]
+            current_tokens_count = sum(len(encoder.encode(sentences[s_idx])) for s_idx in current_sentence_idxs)
+
+            if sent_tokens > chunk_size:
+                # large sentence alone
+                if current_sentence_idxs:
+                    indexed_chunks.append(current_sentence_idxs[:])
+                    current_sentence_idxs = []
+                    current_tokens_count = 0
+                indexed_chunks.append([i])
+                i += 1
+            else:
+                current_sentence_idxs.append(i)
+                current_tokens_count += sent_tokens
+                i += 1
+        else:
+            current_sentence_idxs.append(i)
+            current_tokens_count += sent_tokens
+            i += 1
+
+    if current_sentence_idxs:
+        indexed_chunks.append(current_sentence_idxs)
+
+    return indexed_chunks
+
+
+def random_sentences(rng, count, max_words):
+    return [" ".join("w" for _ in range(rng.randint(0, max_words))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("encoder", [WordEncoder(), BatchWordEncoder()], ids=["encode", "batch"])
+def test_matches_reference_on_random_sentences(encoder):
+    rng = random.Random(6)
+    for _ in range(500):
+        chunk_size = rng.randint(1, 60)
+        overlap = rng.randint(0, chunk_size + 5)
+        sentences = random_sentences(rng, rng.randint(0, 80), rng.choice((3, 10, 30)))
+        expected = reference_chunk_with_overlap_indexed(sentences, encoder, chunk_size, overlap)
+        assert chunk_with_overlap_indexed(sentences, encoder, chunk_size, overlap) == expected
+
+
+def test_matches_reference_with_sentences_longer_than_chunk_size():
+    rng = random.Random(7)
+    encoder = WordEncoder()
+    for _ in range(200):
+        chunk_size = rng.randint(2, 20)
+        overlap = rng.randint(0, chunk_size)
+        # Mostly short sentences, with runs of oversized ones in between
+        sentences = [" ".join("w" for _ in range(rng.choice((1, 2, 3, chunk_size, chunk_size + 1,
+                                                              3 * chunk_size))))
+                     for _ in range(rng.randint(1, 40))]
+        expected = reference_chunk_with_overlap_indexed(sentences, encoder, chunk_size, overlap)
+        assert chunk_with_overlap_indexed(sentences, encoder, chunk_size, overlap) == expected
+
+
+def test_oversized_sentence_is_a_chunk_of_its_own():
+    sentences = ["a b", "c d e f g h i j k l", "m"]
+    chunks = chunk_with_overlap_indexed(sentences, WordEncoder(), chunk_size=5, overlap=3)
+    assert [1] in chunks
+    assert chunks == reference_chunk_with_overlap_indexed(sentences, WordEncoder(), 5, 3)
+
+
+@pytest.mark.skipif(not os.path.exists(EXTRACTED_TEXT), reason="sample book text not present")
+@pytest.mark.parametrize("chunk_size, overlap", [(500, 50), (200, 20), (64, 63), (30, 0)])
+def test_matches_reference_on_extracted_book(chunk_size, overlap):
+    with open(EXTRACTED_TEXT, 'r', encoding='utf-8') as f:
+        sentences = [s for line in f for s in re.split(r'(?<=[.!?])\s+', line.strip()) if s]
+    encoder = BatchWordEncoder()
+    expected = reference_chunk_with_overlap_indexed(sentences, encoder, chunk_size, overlap)
+    assert chunk_with_overlap_indexed(sentences, encoder, chunk_size, overlap) == expected
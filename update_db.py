@@ -1,10 +1,24 @@
+"""
+Reset the database: drop every table and rebuild the schema from the
+migrations. All data is lost; the app reseeds from books_data.csv on the
+next start.
+"""
 from app import create_app
 from app.db import db
+from app.migrations import migrate
+from app.services.catalog_search import FTS_TABLE
 
 app = create_app()
 
 with app.app_context():
-    # Drop all tables and recreate them with the new schema
-    db.drop_all()
-    db.create_all()
+    with db.engine.begin() as connection:
+        # The FTS table owns shadow tables, so it goes first
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        tables = connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ).scalars().all()
+        for table in tables:
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {table}")
+        connection.exec_driver_sql("PRAGMA user_version = 0")
+    migrate(db.engine)
     print("Database schema updated successfully!")